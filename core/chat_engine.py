@@ -12,6 +12,8 @@ import logging
 import os
 import base64
 import mimetypes
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from functools import lru_cache
 from dotenv import load_dotenv
@@ -23,6 +25,7 @@ from .sandbox_bridge import SandboxBridge
 from .mcp_bridge import mcp_bridge
 from .image_engine import ImageEngine
 from .utils import retry
+from .context_compressor import compress as compress_context
 from .config_manager import config
 
 
@@ -50,6 +53,9 @@ RECALL_PATTERN = re.compile(r'\[RECALL\s*:\s*(.*?)(?:\s*\|\s*(.*?))?\]', re.IGNO
 MUSIC_PATTERN = re.compile(r'\[MUSIC\s*:\s*(.*?)\]', re.IGNORECASE)
 BIO_REGISTER_PATTERN = re.compile(r'\[BIO_REGISTER\]', re.IGNORECASE)
 
+# Background LLM jobs wait for this many seconds without chat traffic
+LLM_IDLE_GRACE = 20.0
+
 # Connection pool - shared across all instances
 _session_pool = None
 
@@ -79,6 +85,48 @@ async def close_session():
         _session_pool = None
 
 
+class LLMPriorityGate:
+    """
+    Foreground/background arbitration for the LLM.
+    Chat calls always go straight through; background jobs (summaries,
+    consolidation) take a single slot and only start once no foreground call
+    has been running for `idle_grace` seconds.
+    """
+
+    def __init__(self, idle_grace: float = LLM_IDLE_GRACE):
+        self.idle_grace = idle_grace
+        self._active = 0
+        self._last_active = 0.0
+        self._background_lock = None
+
+    def is_idle(self) -> bool:
+        return self._active == 0 and time.monotonic() - self._last_active >= self.idle_grace
+
+    async def wait_for_idle(self):
+        while not self.is_idle():
+            await asyncio.sleep(self.idle_grace / 2)
+
+    @asynccontextmanager
+    async def foreground(self):
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._last_active = time.monotonic()
+
+    @asynccontextmanager
+    async def background(self):
+        if self._background_lock is None:
+            self._background_lock = asyncio.Lock()
+        async with self._background_lock:
+            await self.wait_for_idle()
+            yield
+
+
+llm_gate = LLMPriorityGate()
+
+
 class AikoBrain:
     """Aiko's AI brain with Tool Feedback Loop - Optimized."""
 
@@ -147,10 +195,12 @@ class AikoBrain:
                 logger.error(f"Sentence Callback Error: {e}")
 
     async def chat(self, message: str, user_id: str = "omax", input_role: str = "user",
-                   save_input: bool = True, initial_images: list = None) -> tuple:
+                   save_input: bool = True, initial_images: list = None, emit=None) -> tuple:
         """
         Send message to LLM and get response with ReAct loop.
         Optimized for: Fewer allocations, batched streaming, connection reuse.
+        `emit(sentence)` receives this turn's streamed sentences instead of the
+        shared on_sentence callback (UI + TTS), so concurrent turns don't mix.
         """
         # Process Attachments
         processed_images = []
@@ -178,18 +228,18 @@ class AikoBrain:
         if self.rag and self.rag.is_available():
             try:
                 loop = asyncio.get_running_loop()
-                results = await loop.run_in_executor(None, self.rag.search_memory, message, 5)
+                results = await loop.run_in_executor(None, self.rag.search_memory, message, 5, None, str(user_id))
                 if results:
-                    rag_context = "\n[RECALLED MEMORIES]:\n"
-                    for i, res in enumerate(results, 1):
-                        meta = res.get('meta', {})
-                        source = meta.get('source', 'unknown')
-                        room = meta.get('room', 'general')
-                        rag_context += f"({i}) [{room} / {source}]: {res['text']}\n"
+                    # Best sentences of the recalled chunks within a token budget (no mid-sentence cuts)
+                    compressed = compress_context(message, results, config.get("RAG_CONTEXT_TOKENS", 300))
+                    if compressed:
+                        rag_context = f"\n[RECALLED MEMORIES]:\n{compressed}\n"
             except Exception as e:
                 logger.warning(f"RAG Async Search Error: {e}")
 
         history = self.memory.get_history(user_id)
+        # Older turns arrive as a bounded rolling summary instead of raw messages
+        summary_context = self.memory.get_summary_context(user_id)
 
         # Main Thinking Loop (Max 5 turns)
         observations = []
@@ -208,8 +258,11 @@ class AikoBrain:
             if self.pc:
                 system_prompt += self._get_tools_prompt()
 
+            if summary_context:
+                system_prompt += f"\n\n<conversation_so_far>\n{summary_context}\n</conversation_so_far>"
+
             if rag_context:
-                system_prompt += f"\n\n<relevant_memory_context>\n{rag_context[:1000]}\n</relevant_memory_context>"
+                system_prompt += f"\n\n<relevant_memory_context>\n{rag_context}\n</relevant_memory_context>"
 
             messages = [{"role": "system", "content": system_prompt}]
 
@@ -224,7 +277,7 @@ class AikoBrain:
 
             # Call LLM
             orchestrator.emit_reasoning_step("AI_THINKING", "Core Engine Reasoning...", 0.90)
-            text = await self._call_llm(messages, self.model, images=images_data if images_data else None)
+            text = await self._call_llm(messages, self.model, images=images_data if images_data else None, emit=emit)
 
             preview = text[:40].replace('\n', ' ') + "..." if len(text) > 40 else text
             orchestrator.emit_reasoning_step("TEXT_GENERATION", f"Drafted: {preview}", 0.95)
@@ -239,7 +292,7 @@ class AikoBrain:
                 # --- 2. CONTROLLER (SELF-CHECK LAYER) ---
                 orchestrator.emit_reasoning_step("SELF_CHECK", "Checking draft for errors...", 0.96)
                 review_prompt = f"Check the following draft for factual errors, hallucinations, or broken logic. Output 'OK' if fine, or 'ERROR:' followed by the issue.\n\nDraft:\n{text}"
-                review = await self._call_llm([{"role": "user", "content": review_prompt}], self.model)
+                review = await self._call_llm([{"role": "user", "content": review_prompt}], self.model, emit=emit)
                 
                 if "error" in review.lower() or "incorrect" in review.lower():
                     orchestrator.emit_reasoning_step("SELF_CHECK", "Fixing errors in draft...", 0.97)
@@ -247,7 +300,7 @@ class AikoBrain:
                     text = await self._call_llm([
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": fix_prompt}
-                    ], self.model)
+                    ], self.model, emit=emit)
 
                 # --- 3. PERSONALITY LAYER (AIKO OVERLAY) ---
                 orchestrator.emit_reasoning_step("PERSONA", "Applying emotional matrix...", 0.98)
@@ -260,7 +313,7 @@ class AikoBrain:
                     overlay_history.append({"role": role, "content": h["content"]})
                 overlay_history.append({"role": "user", "content": overlay_msg})
 
-                final_response = await self._call_llm(overlay_history, self.model, apply_neuromodulators=True)
+                final_response = await self._call_llm(overlay_history, self.model, apply_neuromodulators=True, emit=emit)
                 
                 orchestrator.emit_tool_result("Text_Reply", "Message complete.")
                 break
@@ -492,12 +545,13 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
             for match in RECALL_PATTERN.finditer(text):
                 query = match.group(1).strip()
                 room = match.group(2).strip() if match.group(2) else None
-                if self.rag and hasattr(self.rag, 'mempalace'):
-                    res = self.rag.mempalace.search_memory(query, n_results=5, room=room)
+                if self.rag and self.rag.is_available():
+                    loop = asyncio.get_running_loop()
+                    res = await loop.run_in_executor(None, self.rag.search_memory, query, 5, room, str(user_id))
                     if res:
                         obs = f"\n[RECALL RESULT for '{query}']:\n"
                         for i, r in enumerate(res, 1):
-                            obs += f"({i}) [{r['meta']['room']}]: {r['text']}\n"
+                            obs += f"({i}) [{r['meta'].get('room', 'general')}]: {r['text']}\n"
                         observations.append(obs)
                     else:
                         observations.append(f"[System: No specific memories found for '{query}']")
@@ -553,11 +607,23 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
 
         return images, "\n".join(context_parts)
 
-    async def _call_llm(self, messages, model=None, images=None, apply_neuromodulators=False):
+    async def _call_llm(self, messages, model=None, images=None, apply_neuromodulators=False,
+                        background=False, emit=None):
         """
         Call LLM with automatic fallback and connection pooling.
         Optimized for streaming with sentence-level emission.
+        Background calls wait for an idle LLM slot, are never spoken, and return
+        None instead of a user-facing error message when the LLM fails.
         """
+        if background:
+            async with llm_gate.background():
+                return await self._stream_llm(messages, model, images, apply_neuromodulators,
+                                              emit=lambda _sentence: None, error_text=False)
+        async with llm_gate.foreground():
+            return await self._stream_llm(messages, model, images, apply_neuromodulators,
+                                          emit=emit or self._emit_sentence)
+
+    async def _stream_llm(self, messages, model, images, apply_neuromodulators, emit, error_text=True):
         PROVIDER = config.get("PROVIDER", "Ollama")
         MODEL = config.get("MODEL_NAME", model or "qwen3.5:cloud")
         FALLBACK_URL = config.get("FALLBACK_URL", "http://127.0.0.1:1234/v1/chat/completions")
@@ -636,11 +702,11 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
                         full += tok
                         cur += tok
                         if any(cur.endswith(p) for p in [".", "!", "?", "\n", "。", "！", "？"]):
-                            self._emit_sentence(cur.strip())
+                            emit(cur.strip())
                             cur = ""
 
                     if cur.strip():
-                        self._emit_sentence(cur.strip())
+                        emit(cur.strip())
                     return full, 200
 
             except asyncio.TimeoutError:
@@ -729,11 +795,11 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
                             cur += tok
                             
                             if any(cur.endswith(p) for p in [".", "!", "?", "\n", "。", "！", "？"]):
-                                self._emit_sentence(cur.strip())
+                                emit(cur.strip())
                                 cur = ""
 
                     if cur.strip():
-                        self._emit_sentence(cur.strip())
+                        emit(cur.strip())
                     return full, 200
 
             except asyncio.TimeoutError:
@@ -772,6 +838,8 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
 
         if content:
             return content
+        if not error_text:
+            return None
 
         # Error messages - Strictly Ollama focused
         if status == 408:
@@ -783,6 +851,17 @@ Use MCP tools whenever Master asks about his PC state, files, or wants you to re
         return f"Ollama is unreachable or returned an error. (Error {status})"
 
 
+    async def ask_background(self, prompt: str, system: str = "You are a concise summarization assistant."):
+        """
+        Low-priority call for maintenance jobs; waits until chat traffic is idle.
+        Returns None when the LLM produced nothing, so callers never persist an error message.
+        """
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        return await self._call_llm(messages, self.model, background=True)
+
     async def ask_raw(self, prompt: str) -> str:
         """Lightweight direct call — bypasses tools, uses current model."""
         messages = [
@@ -35,6 +35,12 @@ class ConfigManager:
             "STT_MODEL": os.getenv("STT_MODEL", "moonshine"),
             "TTS_PROVIDER": os.getenv("TTS_PROVIDER", "Pocket"),
             "TTS_ENABLED": os.getenv("TTS_ENABLED", "true").lower() == "true",
+            "EMBEDDING_BACKEND": os.getenv("EMBEDDING_BACKEND", "ollama"),
+            "EMBEDDING_MODEL": os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            "EMBEDDING_ONNX": os.getenv("EMBEDDING_ONNX", "false").lower() == "true",
+            "EMBEDDING_WORKERS": int(os.getenv("EMBEDDING_WORKERS", "2")),
+            "HISTORY_SEARCH": os.getenv("HISTORY_SEARCH", "false").lower() == "true",
+            "THOUGHT_RETENTION_DAYS": int(os.getenv("THOUGHT_RETENTION_DAYS", "0")),
         }
         self.load()
 
@@ -0,0 +1,113 @@
+"""
+AIKO CONTEXT COMPRESSOR
+═══════════════════════
+Extractive compression of recalled memories before they enter the prompt.
+
+Retrieved chunks are split into sentences, each sentence is scored against
+the query (BM25-style term overlap, IDF over the candidate sentences, a small
+bonus for better-ranked hits), near-identical sentences are dropped, and the
+best ones fill a token budget. Kept sentences are printed back in their
+original order under their source header, so the model never sees a chunk cut
+mid-sentence and irrelevant filler does not crowd out the useful lines.
+"""
+
+import re
+import math
+from typing import Dict, List, Sequence
+
+from core.lexical_index import tokenize
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+|\n+")
+DEFAULT_TOKEN_BUDGET = 300
+CHARS_PER_TOKEN = 4          # Cheap estimate, good enough for budgeting
+MIN_SENTENCE_CHARS = 12
+MAX_SENTENCE_CHARS = 400     # Longer "sentences" (code, tables) are clipped at a word boundary
+DUPLICATE_OVERLAP = 0.8      # Token-set Jaccard above which two sentences count as the same
+RANK_DECAY = 0.1             # Score bonus lost per retrieval rank
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Too few candidate sentences for IDF to tame function words, so drop them from the query
+STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have he her him his how i if in is
+it its me my no not of on or our she so than that the their them then there these they this to was we
+were what when where which who why will with would you your
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of `text`; short fragments are dropped only when the text has longer sentences to keep."""
+    sentences = [s.strip() for s in SENTENCE_SPLIT.split(text or "") if s.strip()]
+    if any(len(s) >= MIN_SENTENCE_CHARS for s in sentences):
+        sentences = [s for s in sentences if len(s) >= MIN_SENTENCE_CHARS]
+    out = []
+    for sentence in sentences:
+        if len(sentence) > MAX_SENTENCE_CHARS:
+            sentence = sentence[:MAX_SENTENCE_CHARS].rsplit(" ", 1)[0] + " …"
+        out.append(sentence)
+    return out
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def compress(query: str, hits: Sequence[Dict], max_tokens: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """
+    Render `hits` ({"text", "meta"} dicts, best first) as a recalled-memory
+    block of at most ~max_tokens, keeping the sentences most relevant to `query`.
+    """
+    candidates = []  # (hit index, position, sentence, tokens)
+    for h, hit in enumerate(hits):
+        for pos, sentence in enumerate(split_sentences(hit.get("text", ""))):
+            candidates.append((h, pos, sentence, tokenize(sentence)))
+    if not candidates:
+        return ""
+
+    # BM25 over the candidate sentences themselves
+    query_terms = set(tokenize(query)) - STOPWORDS
+    n = len(candidates)
+    avg_len = sum(len(c[3]) for c in candidates) / n or 1.0
+    df: Dict[str, int] = {}
+    for c in candidates:
+        for term in set(c[3]) & query_terms:
+            df[term] = df.get(term, 0) + 1
+
+    scored = []
+    for h, pos, sentence, tokens in candidates:
+        score = 0.0
+        for term in query_terms:
+            tf = tokens.count(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avg_len))
+        # Retrieval rank breaks ties and keeps some context when nothing overlaps lexically
+        score += max(0.0, 1.0 - RANK_DECAY * h) * 0.5
+        scored.append((score, h, pos, sentence, set(tokens)))
+    scored.sort(key=lambda x: (-x[0], x[1], x[2]))
+
+    kept, kept_sets, used = [], [], 0
+    for score, h, pos, sentence, token_set in scored:
+        if any(_jaccard(token_set, other) >= DUPLICATE_OVERLAP for other in kept_sets):
+            continue
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            continue
+        kept.append((h, pos, sentence))
+        kept_sets.append(token_set)
+        used += cost
+
+    by_hit: Dict[int, List] = {}
+    for h, pos, sentence in sorted(kept):
+        by_hit.setdefault(h, []).append(sentence)
+
+    lines = []
+    for i, h in enumerate(sorted(by_hit), 1):
+        meta = hits[h].get("meta", {}) or {}
+        lines.append(f"({i}) [{meta.get('room', 'general')} / {meta.get('source', 'unknown')}]: {' '.join(by_hit[h])}")
+    return "\n".join(lines)
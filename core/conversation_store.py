@@ -0,0 +1,457 @@
+"""
+AIKO CONVERSATION STORE
+═══════════════════════
+The single storage engine for conversation history.
+
+Each session is a tree of messages (stable ids, parent pointers) with a
+`head` pointer. The linear `history` every caller reads is the path from the
+root to the head; it is derived in memory and never persisted, so branches
+share their common prefix and checking out another branch is a pointer move.
+
+MemoryManager (sessions, affection, sidebar) and UnifiedMemoryManager
+(thoughts, palace filing, summaries) are both views over this store, so
+every message is serialized, encrypted and flushed exactly once, and one
+truncation/summarization policy applies to every session:
+
+- the newest KEEP_RAW turns are always kept verbatim
+- older turns are dropped only after the background summarizer folded them
+  into the session's summary pyramid (archive hooks see them first)
+- HISTORY_HARD_CAP bounds a session if summarization falls behind; turns
+  dropped that way are first folded in extractively (no LLM)
+
+Sessions idle for longer than the archive threshold move to the cold tier
+(see session_archive.py) and are restored transparently when opened.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from core.security import memory_cipher
+from core.conversation_summarizer import get_summarizer, KEEP_RAW, CHUNK_SIZE
+from core.session_archive import SessionArchive
+
+logger = logging.getLogger("ConversationStore")
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+STORE_FILE = DATA_DIR / "shared_memory.json"
+LEGACY_UNIFIED_HISTORY = DATA_DIR / "conversation_history.json"
+DEFAULT_AFFECTION = 30  # Start at 'Acquaintance' level
+HISTORY_HARD_CAP = 400  # Raw turns kept when summaries lag behind (LLM offline or never idle)
+FLUSH_INTERVAL = 10     # seconds between disk writes
+
+
+def new_message_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def session_meta(session_id: str, session: Dict) -> Dict:
+    """Sidebar metadata for a session (also what the archive catalog keeps)."""
+    history = session.get("history", [])
+    last_msg = history[-1] if history else None
+    return {
+        "id": session_id,
+        "title": session.get("name", f"Session_{session_id[:4]}"),
+        "preview": last_msg["content"][:60].replace("\n", " ") + "..." if last_msg else "Empty Storage Node",
+        "pinned": session.get("pinned", False),
+        "lastActive": last_msg["timestamp"] if last_msg else 0,
+        "count": len(history)
+    }
+
+
+class ConversationStore:
+    """Encrypted, batched-flush store of sessions -> {history, affection, name, pinned, ...}."""
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or STORE_FILE)
+        self.summarizer = get_summarizer()
+        self.archive = SessionArchive()
+        self.on_archive: List[Callable[[str, List[Dict]], None]] = []  # (session_id, dropped turns)
+        self.on_change: List[Callable[[str], None]] = []               # (session_id)
+        self.on_messages: List[Callable[[str, List[Dict], bool], None]] = []  # (session_id, new turns, replaced)
+        self._data: Optional[Dict[str, Dict]] = None
+        self._children: Dict[str, Dict[Optional[str], List[str]]] = {}  # per-session parent -> child ids
+        self._dirty = False
+        self._last_flush = 0
+        self._lock = threading.RLock()
+
+    # --- Loading & persistence ---
+
+    def load(self) -> Dict[str, Dict]:
+        """All sessions (cached after the first read)."""
+        if self._data is not None:
+            return self._data
+        with self._lock:
+            if self._data is not None:
+                return self._data
+            self._data = self._read()
+            if self._migrate_unified_history():
+                self.mark_dirty()
+        return self._data
+
+    def _read(self) -> Dict[str, Dict]:
+        if not self.path.exists():
+            return self._normalize_all({
+                "global": {"history": [], "affection": 0},
+                "omax404": {"history": [], "affection": 100}
+            })
+        try:
+            encrypted_data = self.path.read_bytes()
+            try:
+                data = json.loads(memory_cipher.decrypt(encrypted_data))
+            except Exception:
+                # Fallback to plain JSON if not encrypted yet
+                logger.info("[Store] Decryption skipped/failed, trying plain JSON.")
+                data = json.loads(encrypted_data.decode('utf-8'))
+        except Exception as e:
+            logger.error(f"[Store] Load error: {e}")
+            return self._normalize_all({"global": {"history": [], "affection": 0}})
+
+        # Migration: Convert old list format to new dict format
+        for uid, content in list(data.items()):
+            if isinstance(content, list):
+                data[uid] = {
+                    "history": content,
+                    "affection": 100 if uid in ["omax404", "master"] else DEFAULT_AFFECTION
+                }
+                self._dirty = True
+        return self._normalize_all(data)
+
+    # --- Tree ---
+
+    def _normalize_all(self, data: Dict[str, Dict]) -> Dict[str, Dict]:
+        self._children.clear()
+        for session in data.values():
+            if isinstance(session, dict):
+                self._normalize(session)
+        return data
+
+    def _normalize(self, session: Dict):
+        """Ensure tree fields exist (migrating a flat history) and derive the head path."""
+        if "nodes" not in session:
+            nodes, parent = {}, None
+            for m in session.get("history", []):
+                m.setdefault("id", new_message_id())
+                m["parent"] = parent
+                nodes[m["id"]] = m
+                parent = m["id"]
+            session["nodes"] = nodes
+            session["head"] = parent
+        session["history"] = self._path(session, session.get("head"))
+
+    @staticmethod
+    def _path(session: Dict, head: Optional[str]) -> List[Dict]:
+        """Root -> head, following parent pointers (O(depth))."""
+        nodes, path, seen = session["nodes"], [], set()
+        while head and head in nodes and head not in seen:
+            seen.add(head)
+            path.append(nodes[head])
+            head = nodes[head].get("parent")
+        path.reverse()
+        return path
+
+    def _kids(self, session_id: str) -> Dict[Optional[str], List[str]]:
+        if session_id not in self._children:
+            index: Dict[Optional[str], List[str]] = {}
+            session = self.session(session_id, create=False) or {"nodes": {}}
+            for node in sorted(session["nodes"].values(), key=lambda n: n.get("timestamp", 0)):
+                index.setdefault(node.get("parent"), []).append(node["id"])
+            self._children[session_id] = index
+        return self._children[session_id]
+
+    def siblings(self, session_id: str, message_id: str) -> List[str]:
+        """Alternative versions of a message (children of its parent), oldest first."""
+        session = self.session(session_id, create=False)
+        if not session or message_id not in session["nodes"]:
+            return []
+        return list(self._kids(str(session_id)).get(session["nodes"][message_id].get("parent"), []))
+
+    def checkout(self, session_id: str, message_id: Optional[str], to_leaf: bool = False) -> bool:
+        """
+        Move the session head. With `to_leaf`, follow the newest child down to
+        the tip of that branch (what the UI wants when switching regenerations).
+        """
+        sid = str(session_id)
+        with self._lock:
+            session = self.session(sid, create=False)
+            if session is None or (message_id is not None and message_id not in session["nodes"]):
+                return False
+            if to_leaf and message_id is not None:
+                kids = self._kids(sid)
+                while kids.get(message_id):
+                    message_id = kids[message_id][-1]
+            session["head"] = message_id
+            session["history"] = self._path(session, message_id)
+        self._changed(sid)
+        self.mark_dirty()
+        return True
+
+    def fork_before(self, session_id: str, message_id: str) -> bool:
+        """Point the head at a message's parent so the next append becomes its sibling."""
+        session = self.session(session_id, create=False)
+        if not session or message_id not in session["nodes"]:
+            return False
+        return self.checkout(session_id, session["nodes"][message_id].get("parent"))
+
+    def rewind(self, session_id: str, index: int) -> bool:
+        """Keep the first `index` turns of the current path; later turns stay reachable as a branch."""
+        history = self.messages(session_id)
+        if not 0 <= index < len(history):
+            return False
+        return self.checkout(session_id, history[index - 1]["id"] if index > 0 else None)
+
+    def _migrate_unified_history(self) -> bool:
+        """Fold UnifiedMemoryManager's old conversation_history.json into the store once."""
+        if not LEGACY_UNIFIED_HISTORY.exists():
+            return False
+        try:
+            legacy = json.loads(LEGACY_UNIFIED_HISTORY.read_text(encoding='utf-8'))
+        except Exception as e:
+            logger.error(f"[Store] Could not read legacy history: {e}")
+            return False
+
+        for uid, messages in legacy.items():
+            session = self.session(uid)
+            seen = {(m.get("role"), m.get("content"), m.get("timestamp")) for m in session["history"]}
+            extra = [m for m in messages if (m.get("role"), m.get("content"), m.get("timestamp")) not in seen]
+            if extra:
+                session["history"] = sorted(session["history"] + extra, key=lambda m: m.get("timestamp", 0))
+                session.pop("nodes", None)
+                self._normalize(session)
+                self._children.pop(str(uid), None)
+        LEGACY_UNIFIED_HISTORY.rename(LEGACY_UNIFIED_HISTORY.with_suffix(".json.migrated"))
+        logger.info(f"[Store] Migrated {len(legacy)} conversations from conversation_history.json")
+        return True
+
+    def replace_all(self, data: Dict[str, Dict]):
+        with self._lock:
+            removed = set(self._data or {}) - set(data)
+            self._data = self._normalize_all(data)
+        self.mark_dirty()
+        for sid in removed:
+            self._changed(sid)
+
+    def mark_dirty(self):
+        """Schedule a write; disk writes are batched to one per FLUSH_INTERVAL."""
+        self._dirty = True
+        if time.time() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Actually write to disk (called periodically or on shutdown)."""
+        with self._lock:
+            if not self._dirty or self._data is None:
+                return
+            # `history` is derived from nodes + head; only the tree is persisted
+            snapshot = {sid: {k: v for k, v in s.items() if k != "history"} if isinstance(s, dict) else s
+                        for sid, s in self._data.items()}
+            raw_json = json.dumps(snapshot, indent=2, ensure_ascii=False)
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_bytes(memory_cipher.encrypt(raw_json))
+            os.replace(tmp_path, self.path)
+            self._last_flush = time.time()
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"[Store] Save error: {e}")
+
+    # --- Sessions ---
+
+    def session(self, session_id: str, create: bool = True) -> Optional[Dict]:
+        data = self.load()
+        sid = str(session_id)
+        session = data.get(sid)
+        if not isinstance(session, dict) or "history" not in session:
+            if sid in self.archive:
+                session = self._restore(sid)
+                if session is not None:
+                    return session
+            if not create:
+                return None
+            session = data[sid] = {"history": [], "nodes": {}, "head": None, "affection": DEFAULT_AFFECTION}
+            self._children.pop(sid, None)
+            self._changed(sid)
+        return session
+
+    def messages(self, session_id: str) -> List[Dict]:
+        session = self.session(session_id, create=False)
+        return session["history"] if session else []
+
+    def histories(self) -> Dict[str, List[Dict]]:
+        return {sid: s["history"] for sid, s in self.load().items()
+                if sid != "global" and isinstance(s, dict) and "history" in s}
+
+    def append(self, session_id: str, role: str, content: str, metadata: dict = None) -> Dict:
+        """The one write path for new turns: a new child of the current head."""
+        sid = str(session_id)
+        with self._lock:
+            session = self.session(sid)
+            entry = {
+                "id": new_message_id(),
+                "parent": session["head"],
+                "role": role,
+                "content": content,
+                "timestamp": time.time()
+            }
+            if metadata:
+                entry["metadata"] = metadata
+            session["nodes"][entry["id"]] = entry
+            session["head"] = entry["id"]
+            session["history"].append(entry)
+            if sid in self._children:
+                self._children[sid].setdefault(entry["parent"], []).append(entry["id"])
+            if len(session["history"]) > KEEP_RAW + CHUNK_SIZE:
+                self._apply_policy(str(session_id))
+        self._messages_written(sid, [entry], replaced=False)
+        self._changed(sid)
+        self.mark_dirty()
+        return entry
+
+    def set_history(self, session_id: str, history: List[Dict]):
+        """Replace the whole tree of a session with a single linear history."""
+        with self._lock:
+            session = self.session(session_id)
+            session["history"] = history
+            session.pop("nodes", None)
+            self._normalize(session)
+            self._children.pop(str(session_id), None)
+        self._messages_written(str(session_id), session["history"], replaced=True)
+        self._changed(str(session_id))
+        self.mark_dirty()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self.load().pop(str(session_id), None) is not None
+            removed = self.archive.forget(session_id) or removed
+            if session_id in self.archive:
+                removed = False  # Its archived copy could not be erased, so the session is not gone
+            self._children.pop(str(session_id), None)
+        if removed:
+            self.summarizer.forget(session_id)
+            self._changed(str(session_id))
+            self.mark_dirty()
+        return removed
+
+    def _messages_written(self, session_id: str, messages: List[Dict], replaced: bool):
+        for callback in self.on_messages:
+            try:
+                callback(session_id, messages, replaced)
+            except Exception as e:
+                logger.error(f"[Store] on_messages error: {e}")
+
+    def _changed(self, session_id: str):
+        for callback in self.on_change:
+            try:
+                callback(session_id)
+            except Exception as e:
+                logger.error(f"[Store] on_change error: {e}")
+
+    # --- Cold tier ---
+
+    def archive_idle(self, days: float) -> int:
+        """Move unpinned sessions with no activity for `days` into the compressed archive."""
+        cutoff = time.time() - days * 86400
+        with self._lock:
+            data = self.load()
+            idle = {sid: s for sid, s in data.items()
+                    if sid != "global" and isinstance(s, dict) and s.get("history")
+                    and not s.get("pinned") and s["history"][-1].get("timestamp", 0) < cutoff}
+            if not idle:
+                return 0
+            metas = {sid: session_meta(sid, s) for sid, s in idle.items()}
+            try:
+                self.archive.archive({sid: {k: v for k, v in s.items() if k != "history"}
+                                      for sid, s in idle.items()}, metas)
+            except Exception as e:
+                logger.error(f"[Store] Archive error: {e}")
+                return 0
+            for sid in idle:
+                del data[sid]
+                self._children.pop(sid, None)
+            self._dirty = True
+        self.flush()
+        for sid in idle:
+            self._changed(sid)
+        return len(idle)
+
+    def clear_archive(self):
+        """Delete the whole cold tier; archived sessions are reported as changed like deleted ones."""
+        for sid in self.archive.clear():
+            self._changed(sid)
+
+    def _restore(self, session_id: str) -> Optional[Dict]:
+        """Bring an archived session back into the hot store (persisted before the catalog forgets it)."""
+        with self._lock:
+            session = self.archive.read(session_id)
+            if session is None:
+                return None
+            self._normalize(session)
+            self.load()[session_id] = session
+            self._children.pop(session_id, None)
+            self._dirty = True
+            self.flush()
+            if not self._dirty:  # Hot copy is on disk; a stale catalog entry is harmless otherwise
+                self.archive.forget(session_id)
+        self._changed(session_id)
+        return session
+
+    # --- Truncation / summarization policy ---
+
+    def _apply_policy(self, session_id: str):
+        """Drop turns that are already summarized (or, folded in first, beyond the hard cap), keeping KEEP_RAW verbatim."""
+        session = self.load()[session_id]
+        history = session["history"]
+        folded_until = self.summarizer.folded_until(session_id)
+        to_drop = [m for m in history[:-KEEP_RAW] if m.get("timestamp", 0) <= folded_until]
+        if len(history) - len(to_drop) > HISTORY_HARD_CAP:
+            to_drop = history[:len(history) - HISTORY_HARD_CAP]
+            # Summaries lag behind: fold the turns about to go in without the LLM rather than lose them
+            self.summarizer.fold_extract(session_id, to_drop)
+        if not to_drop:
+            return
+
+        for callback in self.on_archive:
+            try:
+                callback(session_id, to_drop)
+            except Exception as e:
+                logger.error(f"[Store] Archive hook error: {e}")
+        del history[:len(to_drop)]
+        # Prune the archived prefix from the tree; branches hanging off it become roots
+        dropped = {m["id"] for m in to_drop}
+        for node_id in dropped:
+            session["nodes"].pop(node_id, None)
+        for node in session["nodes"].values():
+            if node.get("parent") in dropped:
+                node["parent"] = None
+        self._children.pop(session_id, None)
+        logger.info(f"[Store] Archived {len(to_drop)} turns for {session_id}.")
+
+    async def summarize_pending(self) -> int:
+        """Fold old turns into rolling summaries, then apply the retention policy."""
+        written = await self.summarizer.fold_all(self.histories())
+        if written:
+            with self._lock:
+                for sid, history in self.histories().items():
+                    if len(history) > KEEP_RAW:
+                        self._apply_policy(sid)
+            self.mark_dirty()
+        return written
+
+
+# Global instance
+_store = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get the process-wide conversation store."""
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
@@ -0,0 +1,230 @@
+"""
+AIKO CONVERSATION SUMMARIZER
+════════════════════════════
+Hierarchical rolling summaries of long conversations.
+
+Raw turns older than the live window are folded, CHUNK_SIZE at a time, into
+level-0 summaries. Whenever a level holds more than FANOUT summaries, the
+oldest FANOUT are folded into one summary on the next level, so months of
+history collapse into a handful of paragraphs with a bounded prompt cost.
+Turns that must leave the raw history before the LLM got to them are folded
+in extractively (clipped lines, no LLM) so nothing is dropped unsummarized.
+
+Summaries are stored per user in data/conversation_summaries.json, next to
+the raw conversation history. LLM work only runs on the idle-priority slot.
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("Summarizer")
+
+SUMMARY_FILE = Path(__file__).parent.parent / "data" / "conversation_summaries.json"
+KEEP_RAW = 20          # Most recent turns always kept verbatim
+CHUNK_SIZE = 20        # Raw turns per level-0 summary
+FANOUT = 4             # Summaries per level before folding into the next one
+MAX_LEVELS = 5
+MAX_SUMMARY_CHARS = 1200
+EXTRACT_LINE_CHARS = 120  # Per-turn budget of an extractive (no-LLM) summary
+
+TURNS_PROMPT = (
+    "Summarize this stretch of conversation between {user} and Aiko in at most 6 sentences. "
+    "Keep names, facts learned about the user, promises, decisions and emotional moments. "
+    "Write in third person, past tense. No preamble.\n\n{body}"
+)
+SUMMARIES_PROMPT = (
+    "Merge these consecutive summaries of conversations between {user} and Aiko into one summary "
+    "of at most 6 sentences. Keep long-lived facts, running jokes and unresolved threads; "
+    "drop small talk. No preamble.\n\n{body}"
+)
+
+
+def _span(start: float, end: float) -> str:
+    a, b = datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+    if a.date() == b.date():
+        return a.strftime("%b %d, %Y")
+    return f"{a.strftime('%b %d')} – {b.strftime('%b %d, %Y')}"
+
+
+class ConversationSummarizer:
+    """Per-user summary pyramid over a raw message history."""
+
+    def __init__(self, llm: Callable[[str], Awaitable[str]] = None, store_path: Path = None):
+        self.llm = llm
+        self.store_path = Path(store_path or SUMMARY_FILE)
+        self.state: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if self.store_path.exists():
+            try:
+                self.state = json.loads(self.store_path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.error(f" [Summarizer] Failed to load summaries: {e}")
+                self.state = {}
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self.state, indent=2, ensure_ascii=False)
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.store_path.with_suffix(".tmp")
+        tmp.write_text(payload, encoding="utf-8")
+        os.replace(tmp, self.store_path)
+
+    def _user(self, user_id: str) -> Dict:
+        return self.state.setdefault(str(user_id), {"levels": [], "folded_until": 0.0})
+
+    def folded_until(self, user_id: str) -> float:
+        """Timestamp of the newest raw turn already covered by a summary."""
+        return self.state.get(str(user_id), {}).get("folded_until", 0.0)
+
+    def pending(self, user_id: str, history: List[Dict]) -> List[Dict]:
+        """Turns outside the live window that are not summarized yet."""
+        cutoff = self.folded_until(user_id)
+        older = history[:-KEEP_RAW] if len(history) > KEEP_RAW else []
+        return [m for m in older if m.get("timestamp", 0) > cutoff]
+
+    # --- Folding ---
+
+    async def fold(self, user_id: str, history: List[Dict]) -> int:
+        """Summarize every full chunk of pending turns, then cascade levels. Returns summaries written."""
+        if self.llm is None:
+            return 0
+        written = 0
+        pending = self.pending(user_id, history)
+        while len(pending) >= CHUNK_SIZE:
+            chunk, pending = pending[:CHUNK_SIZE], pending[CHUNK_SIZE:]
+            body = "\n".join(f"{m['role']}: {m['content'][:600]}" for m in chunk)
+            text = await self._summarize(TURNS_PROMPT.format(user=user_id, body=body))
+            if not text:
+                break
+            with self._lock:
+                entry = self._user(user_id)
+                if not entry["levels"]:
+                    entry["levels"].append([])
+                entry["levels"][0].append({
+                    "text": text,
+                    "start": chunk[0].get("timestamp", 0),
+                    "end": chunk[-1].get("timestamp", 0),
+                    "turns": len(chunk),
+                })
+                entry["folded_until"] = chunk[-1].get("timestamp", 0)
+            written += 1
+            written += await self._cascade(user_id)
+            self.save()
+        return written
+
+    def fold_extract(self, user_id: str, turns: List[Dict]) -> int:
+        """
+        Fold turns into level-0 summaries without the LLM: each turn is clipped
+        to one line. Used when turns must be dropped before they were summarized;
+        a later LLM cascade merges these like any other summary.
+        """
+        cutoff = self.folded_until(user_id)
+        turns = [m for m in turns if m.get("timestamp", 0) > cutoff]
+        written = 0
+        for i in range(0, len(turns), CHUNK_SIZE):
+            chunk = turns[i:i + CHUNK_SIZE]
+            lines = [f"{m['role']}: {' '.join(str(m.get('content', '')).split())[:EXTRACT_LINE_CHARS]}" for m in chunk]
+            with self._lock:
+                entry = self._user(user_id)
+                if not entry["levels"]:
+                    entry["levels"].append([])
+                entry["levels"][0].append({
+                    "text": "\n".join(lines)[:MAX_SUMMARY_CHARS],
+                    "start": chunk[0].get("timestamp", 0),
+                    "end": chunk[-1].get("timestamp", 0),
+                    "turns": len(chunk),
+                    "extractive": True,
+                })
+                entry["folded_until"] = chunk[-1].get("timestamp", 0)
+            written += 1
+        if written:
+            self.save()
+        return written
+
+    async def _cascade(self, user_id: str) -> int:
+        written = 0
+        levels = self._user(user_id)["levels"]
+        for depth in range(MAX_LEVELS):
+            if depth >= len(levels) or len(levels[depth]) <= FANOUT:
+                break
+            group = levels[depth][:FANOUT]
+            body = "\n\n".join(f"[{_span(s['start'], s['end'])}] {s['text']}" for s in group)
+            text = await self._summarize(SUMMARIES_PROMPT.format(user=user_id, body=body))
+            if not text:
+                break
+            with self._lock:
+                if depth + 1 == len(levels):
+                    levels.append([])
+                levels[depth + 1].append({
+                    "text": text,
+                    "start": group[0]["start"],
+                    "end": group[-1]["end"],
+                    "turns": sum(s.get("turns", 0) for s in group),
+                })
+                del levels[depth][:FANOUT]
+            written += 1
+        return written
+
+    async def _summarize(self, prompt: str) -> Optional[str]:
+        try:
+            text = (await self.llm(prompt) or "").strip()
+        except Exception as e:
+            logger.error(f" [Summarizer] LLM error: {e}")
+            return None
+        return text[:MAX_SUMMARY_CHARS] or None
+
+    async def fold_all(self, histories: Dict[str, List[Dict]]) -> int:
+        """Background entry point: fold every user with enough pending turns."""
+        total = 0
+        for user_id, history in list(histories.items()):
+            if len(self.pending(user_id, history)) >= CHUNK_SIZE:
+                total += await self.fold(user_id, history)
+        if total:
+            logger.info(f" [Summarizer] 📜 Wrote {total} conversation summaries.")
+        return total
+
+    # --- Reading ---
+
+    def get_summaries(self, user_id: str) -> List[Dict]:
+        """All summaries for a user, oldest span first (coarse levels before fine ones)."""
+        levels = self.state.get(str(user_id), {}).get("levels", [])
+        return [s for level in reversed(levels) for s in level]
+
+    def get_context(self, user_id: str, max_chars: int = 2000) -> str:
+        """Compact 'story so far' block for prompts, bounded by max_chars."""
+        parts = [f"[{_span(s['start'], s['end'])}] {s['text']}" for s in self.get_summaries(user_id)]
+        out: List[str] = []
+        used = 0
+        for part in reversed(parts):  # Prefer the most recent periods when over budget
+            if used + len(part) > max_chars:
+                break
+            out.append(part)
+            used += len(part) + 1
+        return "\n".join(reversed(out))
+
+    def forget(self, user_id: str = None):
+        with self._lock:
+            if user_id is None:
+                self.state.clear()
+            else:
+                self.state.pop(str(user_id), None)
+        self.save()
+
+
+# Global instance
+_summarizer = None
+
+
+def get_summarizer() -> ConversationSummarizer:
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = ConversationSummarizer()
+    return _summarizer
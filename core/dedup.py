@@ -0,0 +1,189 @@
+"""
+AIKO NEAR-DUPLICATE INDEX
+═════════════════════════
+SimHash fingerprints of every free-form memory, checked before a new vector
+is written.
+
+Texts are shingled into word trigrams and folded into a 64-bit SimHash. The
+fingerprint is split into DEDUP_BANDS bands stored in indexed columns, so a
+lookup only compares fingerprints sharing at least one band (by pigeonhole
+this finds every match within DEDUP_BANDS - 1 differing bits; looser
+thresholds are best effort). A hit bumps `seen_count` / `last_seen` and the
+caller refreshes the existing vector's metadata instead of adding a copy.
+"""
+
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.lexical_index import tokenize
+
+logger = logging.getLogger("Dedup")
+
+DEDUP_PATH = Path(__file__).parent.parent / "data" / "dedup_index.db"
+DEFAULT_THRESHOLD = 0.95   # Fraction of equal SimHash bits that counts as "same memory"
+HASH_BITS = 64
+DEDUP_BANDS = 4
+BAND_BITS = HASH_BITS // DEDUP_BANDS
+SHINGLE = 3
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word trigrams (single words for very short texts)."""
+    tokens = tokenize(text)
+    if len(tokens) >= SHINGLE:
+        shingles = [" ".join(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)]
+    else:
+        shingles = tokens or [text.strip()]
+    votes = [0] * HASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(HASH_BITS):
+            votes[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(HASH_BITS) if votes[bit] > 0)
+
+
+def similarity(a: int, b: int) -> float:
+    return 1.0 - bin(a ^ b).count("1") / HASH_BITS
+
+
+def _bands(h: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(h >> (i * BAND_BITS)) & mask for i in range(DEDUP_BANDS)]
+
+
+def _signed(h: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def dedup_scope(meta: Dict = None, room: str = None) -> str:
+    """Duplicates are only collapsed within one room of one user."""
+    meta = meta or {}
+    return f"{room or meta.get('room') or 'general'}|{meta.get('user_id') or ''}"
+
+
+class NearDuplicateIndex:
+    """SQLite table of (scope, simhash bands) -> vector ids of the stored copy."""
+
+    def __init__(self, db_path: str = None, threshold: float = None):
+        self.db_path = str(db_path or DEDUP_PATH)
+        if threshold is None:
+            try:
+                from core.config_manager import config
+                threshold = config.get("DEDUP_THRESHOLD", DEFAULT_THRESHOLD)
+            except Exception:
+                threshold = DEFAULT_THRESHOLD
+        self.threshold = float(threshold)
+        self._local = threading.local()
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get thread-local database connection."""
+        if getattr(self._local, "conn", None) is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _init_db(self):
+        band_cols = ", ".join(f"b{i} INTEGER" for i in range(DEDUP_BANDS))
+        band_idx = "\n".join(f"CREATE INDEX IF NOT EXISTS idx_sigs_b{i} ON sigs (scope, b{i});"
+                             for i in range(DEDUP_BANDS))
+        conn = self._get_conn()
+        conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS sigs (
+                id INTEGER PRIMARY KEY,
+                scope TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                {band_cols},
+                refs TEXT,
+                seen_count INTEGER DEFAULT 1,
+                first_seen REAL,
+                last_seen REAL
+            );
+            {band_idx}
+        """)
+        conn.commit()
+
+    def check(self, text: str, scope: str) -> Optional[Dict]:
+        """
+        Closest stored near-duplicate of `text` in `scope`, with its counters
+        already bumped, or None when the text is new.
+        """
+        if self.threshold > 1.0 or not text.strip():  # DEDUP_THRESHOLD above 1 disables dedup
+            return None
+        h = simhash(text)
+        bands = _bands(h)
+        where = " OR ".join(f"b{i} = ?" for i in range(DEDUP_BANDS))
+        conn = self._get_conn()
+        try:
+            rows = conn.execute(f"SELECT id, simhash, refs, seen_count FROM sigs WHERE scope = ? AND ({where})",
+                                [scope, *bands]).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f" [Dedup] Lookup error: {e}")
+            return None
+
+        best, best_sim = None, self.threshold
+        for row in rows:
+            sim = similarity(h, row["simhash"] & ((1 << 64) - 1))
+            if sim >= best_sim:
+                best, best_sim = row, sim
+        if best is None:
+            return None
+
+        now = time.time()
+        conn.execute("UPDATE sigs SET seen_count = seen_count + 1, last_seen = ? WHERE id = ?", (now, best["id"]))
+        conn.commit()
+        return {
+            "id": best["id"],
+            "refs": json.loads(best["refs"] or "[]"),
+            "seen_count": best["seen_count"] + 1,
+            "last_seen": now,
+            "similarity": best_sim,
+        }
+
+    def add(self, text: str, scope: str, refs: List[str] = None) -> Optional[int]:
+        """Remember the fingerprint of a memory that was just stored under `refs`."""
+        if not text.strip():
+            return None
+        h = simhash(text)
+        now = time.time()
+        conn = self._get_conn()
+        try:
+            cur = conn.execute(
+                f"INSERT INTO sigs (scope, simhash, {', '.join(f'b{i}' for i in range(DEDUP_BANDS))}, "
+                f"refs, first_seen, last_seen) VALUES (?, ?, {', '.join('?' * DEDUP_BANDS)}, ?, ?, ?)",
+                [scope, _signed(h), *_bands(h), json.dumps(list(refs or [])), now, now]
+            )
+            conn.commit()
+            return cur.lastrowid
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f" [Dedup] Index error: {e}")
+            return None
+
+    def forget(self, entry_id: int):
+        """Drop a fingerprint whose vectors no longer exist (evicted or deleted)."""
+        conn = self._get_conn()
+        conn.execute("DELETE FROM sigs WHERE id = ?", (entry_id,))
+        conn.commit()
+
+
+# Global instance
+_dedup_index = None
+
+
+def get_dedup_index() -> NearDuplicateIndex:
+    global _dedup_index
+    if _dedup_index is None:
+        _dedup_index = NearDuplicateIndex()
+    return _dedup_index
@@ -0,0 +1,158 @@
+"""
+AIKO EMBEDDINGS
+═══════════════
+Text -> vector backends shared by the local memory tiers.
+
+EMBEDDING_BACKEND selects the backend per deployment:
+- "ollama" (default): Ollama's HTTP API, shared with chat generation
+- "local": in-process sentence-transformers model on CPU, so recalls do not
+  queue behind a reply Ollama is still generating
+"""
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List
+
+import requests
+
+logger = logging.getLogger("Embeddings")
+
+EMBEDDING_MODEL_NAME = "nomic-embed-text"
+OLLAMA_BASE_URL = "http://127.0.0.1:11434"
+LOCAL_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+LOCAL_BATCH_MAX = 64        # Texts per forward pass
+LOCAL_BATCH_WINDOW = 0.01   # Seconds a request waits for others to share its forward pass
+
+
+class OllamaEmbedder:
+    """Embeds through Ollama's HTTP API (batched /api/embed, legacy /api/embeddings fallback)."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL_NAME, base_url: str = OLLAMA_BASE_URL, timeout: float = 30):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._batch_api = True
+        self._session = requests.Session()  # keep-alive across calls
+
+    @property
+    def name(self) -> str:
+        return f"ollama:{self.model}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if self._batch_api:
+            resp = self._session.post(f"{self.base_url}/api/embed",
+                                      json={"model": self.model, "input": texts}, timeout=self.timeout)
+            if resp.status_code == 404:
+                self._batch_api = False  # Older Ollama: one prompt per call
+            else:
+                resp.raise_for_status()
+                return resp.json()["embeddings"]
+        vectors = []
+        for text in texts:
+            resp = self._session.post(f"{self.base_url}/api/embeddings",
+                                      json={"model": self.model, "prompt": text}, timeout=self.timeout)
+            resp.raise_for_status()
+            vectors.append(resp.json()["embedding"])
+        return vectors
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        """ChromaDB EmbeddingFunction protocol."""
+        return self.embed(list(input))
+
+
+class LocalEmbedder:
+    """
+    In-process CPU embeddings (sentence-transformers, ONNX when supported).
+
+    Concurrent embed() calls are coalesced: worker threads drain the request
+    queue for up to LOCAL_BATCH_WINDOW and run one forward pass for everything
+    they collected, so many small recalls cost one batch instead of many.
+    """
+
+    def __init__(self, model: str = LOCAL_MODEL_NAME, workers: int = 2, onnx: bool = False):
+        from sentence_transformers import SentenceTransformer  # Optional dependency
+        kwargs = {"device": "cpu"}
+        if onnx:
+            kwargs["backend"] = "onnx"
+        try:
+            self._model = SentenceTransformer(model, **kwargs)
+        except Exception as e:
+            if not onnx:
+                raise
+            logger.warning(f" [Embeddings] ONNX backend unavailable ({e}), using PyTorch.")
+            self._model = SentenceTransformer(model, device="cpu")
+        self.model = model
+        self._requests: "queue.Queue[tuple]" = queue.Queue()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._worker, daemon=True, name=f"LocalEmbed-{i}").start()
+        logger.info(f" [Embeddings] 🧮 Local model {model} loaded ({workers} workers).")
+
+    @property
+    def name(self) -> str:
+        return f"local:{self.model}"
+
+    def _worker(self):
+        while True:
+            jobs = [self._requests.get()]
+            size = len(jobs[0][0])
+            while size < LOCAL_BATCH_MAX:
+                try:
+                    job = self._requests.get(timeout=LOCAL_BATCH_WINDOW)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                size += len(job[0])
+            texts = [t for batch, _ in jobs for t in batch]
+            try:
+                vectors = self._model.encode(texts, batch_size=LOCAL_BATCH_MAX, convert_to_numpy=True).tolist()
+            except Exception as e:
+                for _, future in jobs:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for batch, future in jobs:
+                future.set_result(vectors[start:start + len(batch)])
+                start += len(batch)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        """ChromaDB EmbeddingFunction protocol."""
+        return self.embed(list(input))
+
+
+_local_embedder = None
+_local_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Embedding backend for local stores, chosen by EMBEDDING_BACKEND.
+    The local model is loaded once and shared; if sentence-transformers is
+    missing or the model cannot load, Ollama is used instead.
+    """
+    global _local_embedder
+    from core.config_manager import config
+    if str(config.get("EMBEDDING_BACKEND", "ollama")).lower() != "local":
+        return OllamaEmbedder()
+    with _local_lock:
+        if _local_embedder is None:
+            try:
+                _local_embedder = LocalEmbedder(
+                    model=config.get("EMBEDDING_MODEL", LOCAL_MODEL_NAME),
+                    workers=int(config.get("EMBEDDING_WORKERS", 2)),
+                    onnx=str(config.get("EMBEDDING_ONNX", False)).lower() == "true",
+                )
+            except Exception as e:
+                logger.error(f" [Embeddings] Local backend unavailable, using Ollama: {e}")
+                return OllamaEmbedder()
+    return _local_embedder
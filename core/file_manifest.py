@@ -0,0 +1,139 @@
+"""
+AIKO FILE MANIFEST
+══════════════════
+Remembers what a watched folder looked like the last time it was processed.
+Entries are keyed by path and store size, mtime and a content hash, so a
+rescan only hashes files whose stat changed and only re-processes files whose
+content actually changed.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("FileManifest")
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path) -> Optional[str]:
+    """SHA-256 of a file's content, streamed in blocks. None if unreadable."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """Persistent path -> {size, mtime, hash} map with an mtime shortcut."""
+
+    def __init__(self, manifest_path, root=None):
+        self.manifest_path = Path(manifest_path)
+        self.root = Path(root).resolve() if root else None
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.manifest_path.exists():
+            return
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            self.entries = data.get("files", {}) if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.error(f" [Manifest] Failed to load {self.manifest_path.name}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically, only if something changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps({"version": 1, "files": self.entries}, ensure_ascii=False)
+            self._dirty = False
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_suffix(self.manifest_path.suffix + ".tmp")
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, self.manifest_path)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f" [Manifest] Save error: {e}")
+
+    def key(self, path) -> str:
+        """Stable manifest key: root-relative POSIX path when a root is set."""
+        p = Path(path)
+        if self.root:
+            try:
+                return p.resolve().relative_to(self.root).as_posix()
+            except ValueError:
+                pass
+        return p.as_posix()
+
+    def get(self, path) -> Optional[Dict]:
+        return self.entries.get(self.key(path))
+
+    def check(self, path) -> Tuple[bool, Optional[str]]:
+        """
+        Return (changed, digest) for a file on disk.
+        Unchanged size+mtime short-circuits without reading the file.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False, None
+
+        entry = self.entries.get(self.key(path))
+        if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+            return False, entry.get("hash")
+
+        digest = hash_file(path)
+        if digest is None:
+            return False, None
+        if entry and entry.get("hash") == digest:
+            # Touched but not edited: refresh the stat shortcut only
+            self.record(path, digest)
+            return False, digest
+        return True, digest
+
+    def record(self, path, digest: str = None, **extra):
+        """Store the current stat and hash of a processed file."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        if digest is None:
+            digest = hash_file(path)
+        key = self.key(path)
+        with self._lock:
+            entry = dict(self.entries.get(key, {}))
+            entry.update(extra)
+            entry.update({"size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest})
+            self.entries[key] = entry
+            self._dirty = True
+
+    def forget(self, path) -> Optional[Dict]:
+        """Drop a file from the manifest (e.g. after it was deleted)."""
+        with self._lock:
+            entry = self.entries.pop(self.key(path), None)
+            if entry is not None:
+                self._dirty = True
+        return entry
+
+    def keys(self):
+        return list(self.entries.keys())
+
+    def __contains__(self, path) -> bool:
+        return self.key(path) in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,182 @@
+"""
+AIKO FILESYSTEM WATCHER
+═══════════════════════
+Event-driven directory watcher with debounce.
+Uses watchdog (inotify on Linux, ReadDirectoryChangesW on Windows, FSEvents on
+macOS) when it is installed and falls back to cheap stat polling otherwise.
+Bursts of events for the same path (editor save = create + modify + rename)
+are coalesced and delivered once the path has been quiet for `debounce` seconds.
+"""
+
+import os
+import time
+import fnmatch
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Set
+
+logger = logging.getLogger("FSWatcher")
+
+DEFAULT_IGNORE_DIRS = {'.git', '.venv', 'venv', 'node_modules', '__pycache__', '.obsidian', '.trash'}
+
+
+class DirectoryWatcher:
+    """
+    Watches a directory tree and calls `on_change(paths)` with debounced batches.
+
+    `on_change` runs on the watcher's own thread; it receives absolute path
+    strings for created, modified, moved and deleted files (callers check
+    existence to tell deletions apart).
+    """
+
+    def __init__(self, root, on_change: Callable[[Set[str]], None], debounce: float = 1.5,
+                 recursive: bool = True, poll_interval: float = 5.0,
+                 patterns: Iterable[str] = None, ignore_dirs: Iterable[str] = None):
+        self.root = Path(root).resolve()
+        self.on_change = on_change
+        self.debounce = debounce
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.patterns = list(patterns) if patterns else None
+        self.ignore_dirs = set(ignore_dirs) if ignore_dirs is not None else set(DEFAULT_IGNORE_DIRS)
+        self.backend = None
+
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads = []
+        self._snapshot: Dict[str, tuple] = {}
+
+    # --- Filtering ---
+
+    def _wanted(self, path: str) -> bool:
+        p = Path(path)
+        try:
+            rel_parts = p.relative_to(self.root).parts
+        except ValueError:
+            return False
+        if not self.recursive and len(rel_parts) > 1:
+            return False
+        if any(part in self.ignore_dirs for part in rel_parts[:-1]):
+            return False
+        if self.patterns and not any(fnmatch.fnmatch(p.name, pat) for pat in self.patterns):
+            return False
+        return True
+
+    def notify(self, path: str):
+        """Register a raw change event; it is delivered after the debounce window."""
+        if not self._wanted(path):
+            return
+        with self._lock:
+            self._pending[str(path)] = time.monotonic()
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start watching. Uses native events if available, else polling."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+
+        if not self._start_native():
+            self.backend = "polling"
+            self._snapshot = self._scan()
+            t = threading.Thread(target=self._poll_loop, daemon=True, name="FSWatcherPoll")
+            t.start()
+            self._threads.append(t)
+
+        t = threading.Thread(target=self._debounce_loop, daemon=True, name="FSWatcherDebounce")
+        t.start()
+        self._threads.append(t)
+        logger.info(f" [Watcher] 👁️ Watching {self.root} ({self.backend})")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=2)
+            except Exception:
+                pass
+            self._observer = None
+
+    def _start_native(self) -> bool:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                watcher.notify(event.src_path)
+                dest = getattr(event, "dest_path", None)
+                if dest:
+                    watcher.notify(dest)
+
+        try:
+            observer = Observer()
+            observer.schedule(_Handler(), str(self.root), recursive=self.recursive)
+            observer.start()
+        except Exception as e:
+            logger.warning(f" [Watcher] Native watcher unavailable ({e}), falling back to polling.")
+            return False
+
+        self._observer = observer
+        self.backend = type(observer).__name__.replace("Observer", "").lower() or "native"
+        return True
+
+    # --- Debounce ---
+
+    def _debounce_loop(self):
+        tick = min(0.25, self.debounce / 2) if self.debounce > 0 else 0.1
+        while not self._stop.wait(tick):
+            now = time.monotonic()
+            with self._lock:
+                ready = {p for p, t in self._pending.items() if now - t >= self.debounce}
+                for p in ready:
+                    del self._pending[p]
+            if ready:
+                try:
+                    self.on_change(ready)
+                except Exception as e:
+                    logger.error(f" [Watcher] on_change error: {e}")
+
+    # --- Polling fallback ---
+
+    def _scan(self) -> Dict[str, tuple]:
+        """Stat snapshot of every wanted file under root."""
+        snapshot = {}
+        stack = [str(self.root)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if self.recursive and entry.name not in self.ignore_dirs:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False) and self._wanted(entry.path):
+                                st = entry.stat(follow_symlinks=False)
+                                snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snapshot
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            current = self._scan()
+            previous = self._snapshot
+            changed = [p for p, sig in current.items() if previous.get(p) != sig]
+            removed = [p for p in previous if p not in current]
+            self._snapshot = current
+            for p in changed + removed:
+                self.notify(p)
@@ -0,0 +1,227 @@
+"""
+AIKO HISTORY SEARCH
+═══════════════════
+Full-text index over every chat message (SQLite FTS5).
+
+The index follows the ConversationStore: appended turns are indexed as they
+are written, replaced histories are re-indexed, and deleted or wiped
+sessions are dropped. Turns the store later folds into summaries or moves to
+the cold archive stay searchable, so a search never has to load (or decrypt)
+whole sessions and stays fast over years of history.
+
+The index holds message text in plaintext, outside the encrypted store, so it
+is opt-in: set HISTORY_SEARCH=true to enable it. While it is disabled no
+index is written, and one left over from an earlier run is deleted.
+"""
+
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.config_manager import config
+from core.lexical_index import tokenize
+
+logger = logging.getLogger("HistorySearch")
+
+INDEX_PATH = Path(__file__).parent.parent / "data" / "history_index.db"
+MAX_PAGE = 100
+SNIPPET_TOKENS = 12
+
+
+def match_expression(query: str) -> Optional[str]:
+    """All query words must appear; the last one also matches as a prefix (search-as-you-type)."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " AND ".join(quoted)
+
+
+class HistoryIndex:
+    """FTS5 message index kept in sync with a ConversationStore."""
+
+    def __init__(self, db_path: str = None, enabled: bool = True):
+        self.db_path = str(db_path or INDEX_PATH)
+        self._local = threading.local()
+        self._store = None
+        self.enabled = enabled
+        if not enabled:
+            self._remove_files()
+            return
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+        except sqlite3.OperationalError as e:
+            logger.warning(f" [History] FTS5 unavailable, history search disabled: {e}")
+            self.enabled = False
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get thread-local database connection."""
+        if getattr(self._local, "conn", None) is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _remove_files(self):
+        """Delete a plaintext index left behind by a run that had search enabled."""
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(self.db_path + suffix)
+            if path.exists():
+                path.unlink()
+                if not suffix:
+                    logger.info(" [History] 🗑️ History search is disabled; removed the old index.")
+
+    def _init_db(self):
+        conn = self._get_conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                rowid INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                role TEXT,
+                content TEXT NOT NULL,
+                timestamp REAL,
+                UNIQUE (session_id, message_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, content='messages', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.rowid, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END;
+            CREATE INDEX IF NOT EXISTS idx_messages_session_time ON messages (session_id, timestamp);
+        """)
+        conn.commit()
+
+    # --- Sync with the conversation store ---
+
+    def attach(self, store):
+        """Follow a ConversationStore's writes and deletions."""
+        if not self.enabled:
+            return
+        self._store = store
+        store.on_messages.append(self._on_messages)
+        store.on_change.append(self._on_change)
+
+    def _on_messages(self, session_id: str, messages: List[Dict], replaced: bool):
+        if replaced:
+            self.remove_session(session_id)
+        self.add_messages(session_id, messages)
+
+    def _on_change(self, session_id: str):
+        store = self._store
+        if session_id not in store.load() and session_id not in store.archive:
+            self.remove_session(session_id)
+
+    def backfill(self, store=None) -> int:
+        """Index every stored session (hot and archived) once, on the first run after the index is created."""
+        store = store or self._store
+        conn = self._get_conn() if self.enabled else None
+        if conn is None or store is None or conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return 0
+        indexed = 0
+        sessions = {sid: s for sid, s in store.load().items() if isinstance(s, dict)}
+        for sid in list(store.archive.catalog):
+            if sid not in sessions:
+                sessions[sid] = store.archive.read(sid) or {}
+        for sid, session in sessions.items():
+            # All nodes, not just the head path, so other branches are searchable too
+            nodes = list((session.get("nodes") or {}).values()) or session.get("history", [])
+            indexed += self.add_messages(sid, nodes)
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        logger.info(f" [History] 🔎 Indexed {indexed} messages from {len(sessions)} sessions.")
+        return indexed
+
+    # --- Writes ---
+
+    def add_messages(self, session_id: str, messages: List[Dict]) -> int:
+        if not self.enabled:
+            return 0
+        rows = [(str(session_id), str(m["id"]), m.get("role"), m["content"], m.get("timestamp", 0))
+                for m in messages if m.get("id") and isinstance(m.get("content"), str) and m["content"].strip()]
+        if not rows:
+            return 0
+        conn = self._get_conn()
+        try:
+            conn.executemany("""
+                INSERT OR IGNORE INTO messages (session_id, message_id, role, content, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f" [History] Index error: {e}")
+            return 0
+
+    def remove_session(self, session_id: str):
+        if not self.enabled: return
+        conn = self._get_conn()
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (str(session_id),))
+        conn.commit()
+
+    # --- Queries ---
+
+    def search(self, query: str, user_id: str = None, limit: int = 20, offset: int = 0) -> Dict:
+        """
+        BM25-ranked messages matching every word of `query`, newest first on
+        ties. `user_id` limits the search to that user's session.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE))
+        offset = max(0, int(offset))
+        page = {"results": [], "has_more": False, "next_offset": None}
+        match = match_expression(query)
+        if not self.enabled or not match:
+            return page
+
+        sql = f"""
+            SELECT m.session_id, m.message_id, m.role, m.timestamp,
+                   snippet(messages_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+        """
+        params: list = [match]
+        if user_id is not None:
+            sql += " AND m.session_id = ?"
+            params.append(str(user_id))
+        sql += " ORDER BY bm25(messages_fts), m.timestamp DESC LIMIT ? OFFSET ?"
+        params.extend([limit + 1, offset])
+
+        try:
+            rows = self._get_conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f" [History] Search error: {e}")
+            return page
+
+        page["results"] = [dict(row) for row in rows[:limit]]
+        if len(rows) > limit:
+            page["has_more"] = True
+            page["next_offset"] = offset + limit
+        return page
+
+    def count(self) -> int:
+        if not self.enabled: return 0
+        return self._get_conn().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+# Global instance
+_index = None
+
+
+def get_history_index() -> HistoryIndex:
+    """Get the process-wide history index."""
+    global _index
+    if _index is None:
+        _index = HistoryIndex(enabled=config.get("HISTORY_SEARCH", False))
+    return _index
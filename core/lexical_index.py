@@ -0,0 +1,213 @@
+"""
+AIKO LEXICAL INDEX
+══════════════════
+Local BM25 keyword index (SQLite FTS5) kept alongside the vector store.
+Catches what embeddings miss (exact identifiers, names, Darija words) and
+answers keyword recalls without an embedding round trip.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("LexicalIndex")
+
+INDEX_PATH = Path(__file__).parent.parent / "data" / "lexical_index.db"
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+RRF_K = 60  # Standard reciprocal-rank-fusion damping constant
+GLOBAL_USER = "global"  # Owner of shared memories (see memory_partitions)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in TOKEN_PATTERN.findall(text or "")]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], n_results: int, k: int = RRF_K) -> List[Dict]:
+    """
+    Merge ranked result lists ({"text", "meta"} dicts) with RRF.
+    Identical texts coming from different retrievers are fused into one hit.
+    """
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Dict] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results):
+            key = hashlib.md5(hit.get("text", "").strip().encode("utf-8")).hexdigest()
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            hits.setdefault(key, hit)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    return [hits[key] for key in ranked]
+
+
+class LexicalIndex:
+    """FTS5-backed inverted index of memory texts with room/user metadata."""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = str(db_path or INDEX_PATH)
+        self._local = threading.local()
+        self.enabled = True
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._init_db()
+        except sqlite3.OperationalError as e:
+            # Python builds without FTS5: stay silent and let vector search carry recall
+            logger.warning(f" [Lexical] FTS5 unavailable, keyword index disabled: {e}")
+            self.enabled = False
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get thread-local database connection."""
+        if getattr(self._local, "conn", None) is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _init_db(self):
+        conn = self._get_conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                rowid INTEGER PRIMARY KEY,
+                doc_id TEXT UNIQUE NOT NULL,
+                text TEXT NOT NULL,
+                room TEXT,
+                user_id TEXT,
+                meta TEXT,
+                created_at REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+                text, content='docs', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+                INSERT INTO docs_fts(rowid, text) VALUES (new.rowid, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+                INSERT INTO docs_fts(docs_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+            END;
+            CREATE INDEX IF NOT EXISTS idx_docs_room_user ON docs (room, user_id);
+        """)
+        conn.commit()
+
+    @staticmethod
+    def _row(text: str, meta: Dict, doc_id: str) -> tuple:
+        return (doc_id, text, meta.get("room"), str(meta["user_id"]) if meta.get("user_id") else None,
+                json.dumps(meta, ensure_ascii=False, default=str), meta.get("timestamp", time.time()))
+
+    def add(self, text: str, metadata: dict = None, doc_id: str = None) -> Optional[str]:
+        """Index a memory. Re-using a doc_id replaces the previous text."""
+        if not self.enabled or not text.strip():
+            return None
+        meta = dict(metadata or {})
+        doc_id = doc_id or hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        conn = self._get_conn()
+        try:
+            conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+            conn.execute(
+                "INSERT INTO docs (doc_id, text, room, user_id, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(text, meta, doc_id)
+            )
+            conn.commit()
+            return doc_id
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f" [Lexical] Index error: {e}")
+            return None
+
+    def add_document(self, source_id: str, chunks: List[str], metadata: dict = None) -> int:
+        """
+        Index a document as the same chunks its vectors were stored under
+        (doc ids `<source_id>#<chunk>`), replacing any previous version.
+        """
+        if not self.enabled:
+            return 0
+        meta = dict(metadata or {})
+        rows = [self._row(chunk, dict(meta, chunk_index=i), f"{source_id}#{i}")
+                for i, chunk in enumerate(chunks) if chunk.strip()]
+        conn = self._get_conn()
+        try:
+            self._delete_source(conn, source_id)
+            conn.executemany(
+                "INSERT INTO docs (doc_id, text, room, user_id, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f" [Lexical] Index error ({source_id}): {e}")
+            return 0
+
+    def delete(self, doc_id):
+        """Drop one doc id or a list of them."""
+        if not self.enabled: return
+        ids = [doc_id] if isinstance(doc_id, str) else list(doc_id or [])
+        conn = self._get_conn()
+        conn.executemany("DELETE FROM docs WHERE doc_id = ?", [(i,) for i in ids])
+        conn.commit()
+
+    def delete_source(self, source_id: str):
+        """Drop every chunk of a document (and an unchunked copy under the bare id)."""
+        if not self.enabled: return
+        conn = self._get_conn()
+        self._delete_source(conn, source_id)
+        conn.commit()
+
+    @staticmethod
+    def _delete_source(conn: sqlite3.Connection, source_id: str):
+        # '#' sorts right before '$': the range is exactly the ids starting with "<source_id>#"
+        conn.execute("DELETE FROM docs WHERE doc_id = ? OR (doc_id >= ? AND doc_id < ?)",
+                     (source_id, f"{source_id}#", f"{source_id}$"))
+
+    def search(self, query: str, n_results: int = 5, room=None, user_id: str = None) -> List[Dict]:
+        """
+        BM25-ranked keyword search. Terms are OR-ed so partial matches still rank.
+        `room` is one room or a list of rooms; `user_id` limits hits to that
+        user's memories plus shared (untagged / global) ones.
+        """
+        if not self.enabled:
+            return []
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+
+        sql = """
+            SELECT d.text, d.meta, bm25(docs_fts) AS score
+            FROM docs_fts JOIN docs d ON d.rowid = docs_fts.rowid
+            WHERE docs_fts MATCH ?
+        """
+        params: list = [match]
+        rooms = [room] if isinstance(room, str) else list(room or [])
+        if rooms:
+            sql += f" AND d.room IN ({', '.join('?' * len(rooms))})"
+            params.extend(rooms)
+        if user_id:
+            sql += " AND (d.user_id = ? OR d.user_id IS NULL OR d.user_id = ?)"
+            params.extend([str(user_id), GLOBAL_USER])
+        sql += " ORDER BY score LIMIT ?"
+        params.append(n_results)
+
+        try:
+            rows = self._get_conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f" [Lexical] Search error: {e}")
+            return []
+
+        results = []
+        for row in rows:
+            try:
+                meta = json.loads(row["meta"]) if row["meta"] else {}
+            except json.JSONDecodeError:
+                meta = {}
+            meta["bm25"] = -row["score"]
+            results.append({"text": row["text"], "meta": meta})
+        return results
+
+    def count(self) -> int:
+        if not self.enabled: return 0
+        return self._get_conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
@@ -1,152 +1,123 @@
 """
 AIKO MEMORY MANAGER
 Handles short-term conversation history and affection levels.
+A view over the shared ConversationStore (see conversation_store.py).
 """
 
-import json
-import os
 import time
 from typing import List, Dict
-from core.security import memory_cipher
+from core.conversation_store import (get_conversation_store, new_message_id as _new_message_id,
+                                     session_meta, STORE_FILE, DEFAULT_AFFECTION)
 
 # Configuration
-MEMORY_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "shared_memory.json")
-MAX_HISTORY = 20
-DEFAULT_AFFECTION = 30  # Start at 'Acquaintance' level
+MEMORY_FILE = str(STORE_FILE)
+MAX_HISTORY = 20  # Live window handed to the prompt; older turns live on as summaries
 
 
 class MemoryManager:
     """Manages conversation history and user affection levels."""
     
-    def __init__(self):
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(MEMORY_FILE), exist_ok=True)
-        self._cache = None
-        self._dirty = False
-        self._last_flush = 0
-        self._flush_interval = 10  # seconds between disk writes
+    def __init__(self, store=None):
+        self.store = store or get_conversation_store()
+        self._index = None  # session id -> sidebar metadata, maintained on write
+        self._ordered = None  # cached sidebar order (pinned, lastActive) desc
+        self.store.on_change.append(self._touch_session)
         
     def load_memory(self) -> Dict[str, Dict]:
         """Load the shared memory database."""
-        if self._cache is not None:
-            return self._cache
-            
-        if not os.path.exists(MEMORY_FILE):
-            self._cache = {
-                "global": {"history": [], "affection": 0},
-                "omax404": {"history": [], "affection": 100}
-            }
-            return self._cache
-            
-        try:
-            with open(MEMORY_FILE, 'rb') as f:
-                encrypted_data = f.read()
-                
-            try:
-                decrypted_json = memory_cipher.decrypt(encrypted_data)
-                data = json.loads(decrypted_json)
-            except Exception as e:
-                # Fallback to plain JSON if not encrypted yet
-                print(f"[Memory] Decryption skipped/failed, trying plain JSON.")
-                data = json.loads(encrypted_data.decode('utf-8'))
-                
-            # Migration: Convert old list format to new dict format
-            migrated = False
-            for uid, content in list(data.items()):
-                if isinstance(content, list):
-                    data[uid] = {
-                        "history": content,
-                        "affection": 100 if uid in ["omax404", "master"] else DEFAULT_AFFECTION
-                    }
-                    migrated = True
-                    
-            if migrated:
-                print("[Memory] Migrated database to new Affection Schema.")
-                self.save_memory(data)
-                
-            self._cache = data
-            return data
-            
-        except Exception as e:
-            print(f"[Memory] Load error: {e}")
-            self._cache = {"global": {"history": [], "affection": 0}}
-            return self._cache
+        return self.store.load()
             
     def save_memory(self, data: Dict[str, Dict] = None):
         """Mark memory as needing save. Actual disk write is batched."""
-        if data is not None:
-            self._cache = data
-        if self._cache is None:
+        if data is not None and data is not self.store.load():
+            self.store.replace_all(data)
+            self._index = None
             return
-        self._dirty = True
-        
-        # Auto-flush if enough time has passed
-        now = time.time()
-        if now - self._last_flush >= self._flush_interval:
-            self.flush()
+        self.store.mark_dirty()
     
     def flush(self):
         """Actually write to disk (called periodically or on shutdown)."""
-        if not self._dirty or self._cache is None:
-            return
-        try:
-            raw_json = json.dumps(self._cache, indent=2, ensure_ascii=False)
-            encrypted_data = memory_cipher.encrypt(raw_json)
-            
-            with open(MEMORY_FILE, 'wb') as f:
-                f.write(encrypted_data)
-            self._dirty = False
-            self._last_flush = time.time()
-        except Exception as e:
-            print(f"[Memory] Save error: {e}")
+        self.store.flush()
             
     def get_user_data(self, user_id: str) -> tuple:
         """Helper to get user object, initializing if missing."""
-        mem = self.load_memory()
         uid = str(user_id)
-        
-        if uid not in mem or not isinstance(mem[uid], dict) or "history" not in mem[uid]:
-            # Reset or initialize structure
-            mem[uid] = {
-                "history": [],
-                "affection": DEFAULT_AFFECTION
-            }
-            
-        return mem, uid
+        self.store.session(uid)
+        return self.store.load(), uid
         
     def add_message(self, user_id: str, role: str, content: str, session_id: str = None):
         """Add a message to the shared history."""
         target_id = session_id if session_id else user_id
-        mem, uid = self.get_user_data(target_id)
-        
-        entry = {
-            "role": role,
-            "content": content,
-            "timestamp": time.time()
-        }
-        
-        mem[uid]["history"].append(entry)
-        
-        # Prune old messages
-        if len(mem[uid]["history"]) > MAX_HISTORY:
-            mem[uid]["history"] = mem[uid]["history"][-MAX_HISTORY:]
-            
-        self.save_memory(mem)
+        self.store.append(target_id, role, content)
         
     def get_history(self, user_id: str, session_id: str = None) -> List[Dict]:
-        """Get conversation history formatted for LLM."""
+        """Get conversation history formatted for LLM (the live window)."""
         target_id = session_id if session_id else user_id
-        mem, uid = self.get_user_data(target_id)
-        history = mem[uid]["history"]
+        history = self.store.messages(target_id)[-MAX_HISTORY:]
         # Return only role/content for LLM
         return [{"role": m["role"], "content": m["content"]} for m in history]
 
-    def truncate_history(self, user_id: str, index: int):
-        """Trim history to first `index` entries (used for edit-branching)."""
-        mem, uid = self.get_user_data(user_id)
-        mem[uid]["history"] = mem[uid]["history"][:index]
-        self.save_memory(mem)
-        
+    def get_summary_context(self, user_id: str, max_chars: int = 2000) -> str:
+        """Rolling summary of the turns that scrolled out of the live window."""
+        return self.store.summarizer.get_context(str(user_id), max_chars)
+
+    def get_history_page(self, session_id: str, since: str = None, before: str = None,
+                         limit: int = None) -> Dict:
+        """
+        Incremental / paginated history for the UI.
+
+        since:  message id (or timestamp) -> only messages after it
+        before: message id -> the page of older messages preceding it
+        limit:  page size; without since/before the newest `limit` messages
+        """
+        mem, uid = self.get_user_data(session_id)
+        history = mem[uid]["history"]
+        self._ensure_ids(history)
+
+        start, end = 0, len(history)
+        if since:
+            start = self._position_after(history, since)
+        if before:
+            end = next((i for i, m in enumerate(history) if m["id"] == before), end)
+
+        if limit:
+            if since:
+                end = min(end, start + limit)
+            else:
+                start = max(start, end - limit)
+
+        page = [self._with_branches(uid, m) for m in history[start:end]]
+        return {
+            "history": page,
+            "has_more": start > 0 if not since else end < len(history),
+            "next_cursor": (page[-1]["id"] if since else page[0]["id"]) if page else None
+        }
+
+    def _with_branches(self, uid: str, message: Dict) -> Dict:
+        """Attach alternative versions so the UI can offer a branch switcher."""
+        siblings = self.store.siblings(uid, message["id"])
+        if len(siblings) < 2:
+            return message
+        return dict(message, branches=siblings, branch_index=siblings.index(message["id"]))
+
+    @staticmethod
+    def _position_after(history: List[Dict], since: str) -> int:
+        for i, m in enumerate(history):
+            if m.get("id") == since:
+                return i + 1
+        try:
+            ts = float(since)
+        except (TypeError, ValueError):
+            return 0  # Unknown cursor (e.g. pruned): resend the whole window
+        return next((i for i, m in enumerate(history) if m.get("timestamp", 0) > ts), len(history))
+
+    @staticmethod
+    def _ensure_ids(history: List[Dict]):
+        """Give legacy messages a stable id so cursors can point at them."""
+        for m in history:
+            if "id" not in m:
+                m["id"] = _new_message_id()
+
     def get_stats(self, user_id: str) -> Dict:
         """Get user stats (affection, etc)."""
         mem, uid = self.get_user_data(user_id)
@@ -166,16 +137,17 @@ class MemoryManager:
     def clear_memory(self, user_id: str = None) -> bool:
         """Clear memory for a specific user or all users."""
         if user_id:
-            mem = self.load_memory()
             uid = str(user_id)
-            if uid in mem:
-                mem[uid]["history"] = []
-                mem[uid]["affection"] = DEFAULT_AFFECTION
-                self.save_memory(mem)
+            session = self.store.session(uid, create=False)
+            if session is not None:
+                session["affection"] = DEFAULT_AFFECTION
+                self.store.summarizer.forget(uid)
+                self.store.set_history(uid, [])
                 return True
         else:
-            self._cache = {"global": {"history": [], "affection": 0}}
-            self.save_memory()
+            self.save_memory({"global": {"history": [], "affection": 0}})
+            self.store.clear_archive()
+            self.store.summarizer.forget()
             return True
         return False
         
@@ -187,71 +159,117 @@ class MemoryManager:
         clean_hist = []
         for m in new_history:
             clean_hist.append({
+                "id": m.get("id") or _new_message_id(),
                 "role": m["role"],
                 "content": m["content"],
                 "timestamp": time.time()
             })
             
-        mem[uid]["history"] = clean_hist[-MAX_HISTORY:]
-        self.save_memory(mem)
+        self.store.set_history(uid, clean_hist)
         return True
 
     def truncate_history(self, user_id: str, index: int):
-        """Remove history items starting from index."""
-        mem, uid = self.get_user_data(user_id)
-        if 0 <= index < len(mem[uid]["history"]):
-            mem[uid]["history"] = mem[uid]["history"][:index]
-            self.save_memory(mem)
+        """
+        Remove history items starting from index.
+        The removed turns stay in the conversation tree as an alternative branch.
+        """
+        return self.store.rewind(str(user_id), index)
 
-    def get_recent_sessions(self) -> List[Dict]:
-        """Get list of all chat sessions sorted by recency."""
-        mem = self.load_memory()
-        sessions = []
-        for uid, data in mem.items():
-            if uid == "global": continue # Skip global config session
-            
-            history = data.get("history", [])
-            last_msg = history[-1] if history else None
-            preview = last_msg["content"][:60].replace("\n", " ") + "..." if last_msg else "Empty Storage Node"
-            timestamp = last_msg["timestamp"] if last_msg else 0
-            
-            sessions.append({
-                "id": uid,
-                "title": data.get("name", f"Session_{uid[:4]}"),
-                "preview": preview,
-                "timestamp": time.strftime("%H:%M", time.localtime(timestamp)) if timestamp else "00:00",
-                "pinned": data.get("pinned", False),
-                "lastActive": timestamp
-            })
-            
-        # Sort by pinned first, then by timestamp newest first
-        sessions.sort(key=lambda x: (x["pinned"], x["lastActive"]), reverse=True)
-        return sessions
+    # --- Branching ---
+
+    def branch_from(self, session_id: str, message_id: str) -> bool:
+        """Edit/regenerate `message_id`: the next message becomes its sibling."""
+        return self.store.fork_before(str(session_id), message_id)
+
+    def checkout(self, session_id: str, message_id: str) -> bool:
+        """Switch to the branch containing `message_id` (down to its newest tip)."""
+        return self.store.checkout(str(session_id), message_id, to_leaf=True)
+
+    # --- Session index ---
+
+    def _session_meta(self, uid: str, data: Dict) -> Dict:
+        return session_meta(uid, data)
+
+    def _session_index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            mem = self.load_memory()
+            # Archived sessions stay listed from their catalog entry; opening one restores it
+            self._index = {uid: dict(meta, archived=True) for uid, meta in self.store.archive.catalog.items()}
+            self._index.update({uid: self._session_meta(uid, data) for uid, data in mem.items()
+                                if uid != "global" and isinstance(data, dict)})
+            self._ordered = None
+        return self._index
+
+    def _touch_session(self, uid: str):
+        """Refresh one session's sidebar entry after a write."""
+        if self._index is None or uid == "global":
+            return
+        data = self.load_memory().get(uid)
+        if data is not None:
+            self._index[uid] = self._session_meta(uid, data)
+        elif uid in self.store.archive:
+            self._index[uid] = dict(self.store.archive.catalog[uid], archived=True)
+        else:
+            self._index.pop(uid, None)
+        self._ordered = None
+
+    @staticmethod
+    def _sort_key(meta: Dict) -> tuple:
+        return (meta["pinned"], meta["lastActive"], meta["id"])
+
+    def get_recent_sessions(self, limit: int = None, cursor: str = None) -> List[Dict]:
+        """
+        Get chat sessions sorted by pinned first, then recency, from the session index.
+        `cursor` is the `next_cursor` of the previous page (see get_sessions_page).
+        """
+        return self.get_sessions_page(limit, cursor)["sessions"]
+
+    def get_sessions_page(self, limit: int = None, cursor: str = None) -> Dict:
+        """One page of the sidebar plus the cursor for the next one."""
+        index = self._session_index()
+        if self._ordered is None:
+            self._ordered = sorted(index.values(), key=self._sort_key, reverse=True)
+        ordered = self._ordered
+
+        start = 0
+        if cursor:
+            try:
+                pinned, last_active, sid = cursor.split("|", 2)
+                after = (pinned == "1", float(last_active), sid)
+                start = next((i for i, m in enumerate(ordered) if self._sort_key(m) < after), len(ordered))
+            except ValueError:
+                start = 0
+        page = ordered[start:start + limit] if limit else ordered[start:]
+        more = bool(limit) and start + len(page) < len(ordered)
+
+        sessions = [dict(m, timestamp=time.strftime("%H:%M", time.localtime(m["lastActive"])) if m["lastActive"] else "00:00")
+                    for m in page]
+        last = page[-1] if page else None
+        return {
+            "sessions": sessions,
+            "next_cursor": f"{int(last['pinned'])}|{last['lastActive']}|{last['id']}" if more else None
+        }
 
     def rename_session(self, session_id: str, new_name: str) -> bool:
         """Rename a chat session."""
-        mem = self.load_memory()
-        if session_id in mem:
-            mem[session_id]["name"] = new_name
-            self.save_memory(mem)
+        session = self.store.session(session_id, create=False)
+        if session is not None:
+            session["name"] = new_name
+            self._touch_session(session_id)
+            self.save_memory()
             return True
         return False
 
     def delete_session(self, session_id: str) -> bool:
         """Delete a chat session entirely."""
-        mem = self.load_memory()
-        if session_id in mem:
-            del mem[session_id]
-            self.save_memory(mem)
-            return True
-        return False
+        return self.store.delete(session_id)
 
     def pin_session(self, session_id: str) -> bool:
         """Toggle pin status of a session."""
-        mem = self.load_memory()
-        if session_id in mem:
-            current = mem[session_id].get("pinned", False)
-            mem[session_id]["pinned"] = not current
-            self.save_memory(mem)
+        session = self.store.session(session_id, create=False)
+        if session is not None:
+            session["pinned"] = not session.get("pinned", False)
+            self._touch_session(session_id)
+            self.save_memory()
             return True
         return False
@@ -1,23 +1,137 @@
 """
 AIKO MEMORY CONSOLIDATOR
 Distills short-term chat history into a permanent Master Profile.
+
+Consolidation is incremental: only messages newer than the per-user
+checkpoint are sent, in fixed-size chunks, together with a compact outline of
+the profile. The LLM answers with a small patch (add / update / remove facts)
+that is merged locally, and the checkpoint advances after every chunk so an
+interrupted run resumes where it stopped. A chunk whose patch cannot be
+obtained or parsed leaves the checkpoint alone and is retried on the next run;
+one whose patch stays unparseable for MAX_PATCH_FAILURES runs is skipped so it
+cannot block the user's consolidation for good.
 """
 
 import json
 import os
+import time
 import aiohttp
 import logging
-from typing import List, Dict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
 from core.config_manager import config
 
 logger = logging.getLogger("MemoryConsolidator")
 
 PROFILE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "master_profile.json")
+STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "consolidation_state.json")
+
+CHUNK_MESSAGES = 40         # Messages per LLM call
+OUTLINE_MAX_CHARS = 1500    # Budget for the profile outline sent with each chunk
+OUTLINE_VALUE_CHARS = 80
+OUTLINE_LIST_TAIL = 3       # Newest list items shown in the outline
+MAX_PATCH_FAILURES = 3      # Unparseable patches at one checkpoint before its chunk is skipped
+
+
+def _split_path(path: str) -> List[str]:
+    return [p for p in str(path).split(".") if p]
+
+
+def _outline(profile: Dict, max_chars: int = OUTLINE_MAX_CHARS) -> str:
+    """Flattened `dotted.path: value` view of the profile, bounded in size."""
+    lines = []
+
+    def walk(node, prefix):
+        for key, value in node.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, dict):
+                walk(value, path)
+            elif isinstance(value, list):
+                tail = ", ".join(json.dumps(v, ensure_ascii=False)[:OUTLINE_VALUE_CHARS]
+                                 for v in value[-OUTLINE_LIST_TAIL:])
+                more = f" (+{len(value) - OUTLINE_LIST_TAIL} older)" if len(value) > OUTLINE_LIST_TAIL else ""
+                lines.append(f"{path}: [{tail}]{more}")
+            else:
+                lines.append(f"{path}: {json.dumps(value, ensure_ascii=False)[:OUTLINE_VALUE_CHARS]}")
+
+    walk(profile, "")
+    out, used = [], 0
+    for line in lines:
+        if used + len(line) > max_chars:
+            out.append(f"... ({len(lines) - len(out)} more fields)")
+            break
+        out.append(line)
+        used += len(line) + 1
+    return "\n".join(out) or "(empty)"
+
+
+def apply_patch(profile: Dict, patch: Dict) -> int:
+    """
+    Merge a consolidation patch into the profile in place. Returns the number of changes.
+
+    patch = {
+        "add":    {"likes": ["matcha"]},                 # append to lists (deduplicated)
+        "update": {"relationship.score": 7.5},           # set values
+        "remove": {"likes": ["coffee"], "old_job": null}  # drop list items, or whole keys with null
+    }
+    """
+    changes = 0
+
+    def parent_of(path, create):
+        parts = _split_path(path)
+        node = profile
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                if not create:
+                    return None, None
+                node[part] = {}
+            node = node[part]
+        return node, parts[-1] if parts else None
+
+    for path, value in (patch.get("update") or {}).items():
+        node, key = parent_of(path, create=True)
+        if key and node.get(key) != value:
+            node[key] = value
+            changes += 1
+
+    for path, items in (patch.get("add") or {}).items():
+        node, key = parent_of(path, create=True)
+        if not key:
+            continue
+        items = items if isinstance(items, list) else [items]
+        current = node.get(key)
+        if current is None:
+            current = []
+        elif not isinstance(current, list):
+            current = [current]
+        for item in items:
+            if item not in current:
+                current.append(item)
+                changes += 1
+        node[key] = current
+
+    for path, items in (patch.get("remove") or {}).items():
+        node, key = parent_of(path, create=False)
+        if node is None or key not in node:
+            continue
+        if items is None:
+            del node[key]
+            changes += 1
+        elif isinstance(node[key], list):
+            items = items if isinstance(items, list) else [items]
+            before = len(node[key])
+            node[key] = [v for v in node[key] if v not in items]
+            changes += before - len(node[key])
+
+    return changes
+
 
 class MemoryConsolidator:
     def __init__(self):
         self.profile_cache = {}
+        self.state = {}
         self._load_profile()
+        self._load_state()
 
     def _load_profile(self):
         if os.path.exists(PROFILE_FILE):
@@ -30,42 +144,114 @@ class MemoryConsolidator:
     def _save_profile(self):
         try:
             os.makedirs(os.path.dirname(PROFILE_FILE), exist_ok=True)
-            with open(PROFILE_FILE, "w", encoding="utf-8") as f:
+            tmp_path = PROFILE_FILE + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 json.dump(self.profile_cache, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, PROFILE_FILE)
         except Exception as e:
             logger.error(f"Failed to save master_profile.json: {e}")
 
-    async def consolidate(self, history: List[Dict]):
+    def _load_state(self):
+        if os.path.exists(STATE_FILE):
+            try:
+                with open(STATE_FILE, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                logger.error(f"Failed to load consolidation_state.json: {e}")
+
+    def _save_state(self):
+        try:
+            with open(STATE_FILE, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+        except Exception as e:
+            logger.error(f"Failed to save consolidation_state.json: {e}")
+
+    def checkpoint(self, user_id: str) -> float:
+        """Timestamp of the newest message already consolidated for this user."""
+        return self.state.get(str(user_id), {}).get("checkpoint", 0.0)
+
+    async def consolidate(self, history: List[Dict], user_id: str = "omax",
+                          deadline: Optional[float] = None, max_chunks: Optional[int] = None) -> bool:
         """
-        Takes conversation history and updates the permanent Master Profile using the LLM.
+        Consolidate messages newer than the user's checkpoint into the Master Profile.
+
+        Runs chunk by chunk and stops early at `deadline` (epoch seconds) or
+        after `max_chunks`; the next run resumes from the saved checkpoint.
+        Returns True when the user is fully caught up.
         """
-        if not history:
-            return
+        since = self.checkpoint(user_id)
+        pending = [m for m in history if m.get("timestamp", float("inf")) > since]
+        if not pending:
+            return True
+
+        done = 0
+        while pending:
+            if deadline and time.time() >= deadline:
+                break
+            if max_chunks is not None and done >= max_chunks:
+                break
+            chunk, pending = pending[:CHUNK_MESSAGES], pending[CHUNK_MESSAGES:]
+            try:
+                patch = await self._request_patch(chunk)
+            except json.JSONDecodeError as e:
+                if not self._patch_failed(user_id, len(chunk), e):
+                    return False  # Retry from the same checkpoint on the next run
+                patch = {}
+            if patch is None:
+                return False  # LLM unavailable; retry from the same checkpoint later
 
-        # Format history for the summarizer
-        history_text = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in history[-50:]])
-        
-        current_profile_str = json.dumps(self.profile_cache, indent=2)
+            changes = apply_patch(self.profile_cache, patch)
+            if changes:
+                self._save_profile()
+            entry = self.state.setdefault(str(user_id), {})
+            entry.pop("failures", None)
+            entry.pop("failed_at", None)
+            entry["checkpoint"] = max((m["timestamp"] for m in chunk if "timestamp" in m), default=since)
+            entry["last_run"] = time.time()
+            entry["messages"] = entry.get("messages", 0) + len(chunk)
+            self._save_state()
+            done += 1
+            logger.info(f"Consolidated {len(chunk)} messages ({changes} profile changes).")
+
+        return not pending
+
+    def _patch_failed(self, user_id: str, size: int, error: Exception) -> bool:
+        """Count an unparseable patch at the current checkpoint. True once the chunk should be skipped."""
+        entry = self.state.setdefault(str(user_id), {})
+        at = entry.get("checkpoint", 0.0)
+        failures = entry.get("failures", 0) + 1 if entry.get("failed_at") == at else 1
+        if failures >= MAX_PATCH_FAILURES:
+            logger.warning(f"Skipping {size} messages for {user_id}: {failures} unparseable patches in a row ({error}).")
+            return True
+        entry["failed_at"], entry["failures"] = at, failures
+        self._save_state()
+        logger.warning(f"Consolidation patch was not valid JSON ({failures}/{MAX_PATCH_FAILURES}), "
+                       f"will retry the chunk next run: {error}")
+        return False
+
+    async def _request_patch(self, chunk: List[Dict]) -> Optional[Dict]:
+        history_text = "\n".join([f"{m['role'].upper()}: {m['content'][:800]}" for m in chunk])
 
         prompt = f"""You are Aiko's subconscious memory processor.
-Your task is to update the MASTER PROFILE based on recent conversations.
+Your task is to update the MASTER PROFILE based on new conversation messages.
 The Master Profile is how Aiko "remembers" her Master (omax) deeply, beyond just the current chat context.
 
-[CURRENT MASTER PROFILE]:
-{current_profile_str}
+[MASTER PROFILE OUTLINE] (dotted.path: value):
+{_outline(self.profile_cache)}
 
-[RECENT CONVERSATION HISTORY]:
+[NEW CONVERSATION MESSAGES] (SUMMARY lines condense older stretches of the chat):
 {history_text}
 
 [INSTRUCTIONS]:
-1. Find any new information about Master (likes, dislikes, life facts, projects, feelings).
+1. Find any NEW information about Master (likes, dislikes, life facts, projects, feelings).
 2. Look for changes in our relationship status or dynamic.
-3. Update the `relationship` object:
-    - `score`: Float (0.0 to 10.0). Increase if Master was kind/helpful, decrease if mean/ignoring.
-    - `status`: One word (e.g. Neutral, Friendly, Affectionate, Devoted, Grumpy, Defensive).
-    - `last_interaction_sentiment`: One word (Positive, Negative, Neutral).
-4. Update existing fields or add new ones to reflect the "Distilled Truth" about Master.
-5. Output the UPDATED Master Profile in valid JSON format ONLY. 
+3. Keep the `relationship` object current:
+    - `relationship.score`: Float (0.0 to 10.0). Increase if Master was kind/helpful, decrease if mean/ignoring.
+    - `relationship.status`: One word (e.g. Neutral, Friendly, Affectionate, Devoted, Grumpy, Defensive).
+    - `relationship.last_interaction_sentiment`: One word (Positive, Negative, Neutral).
+4. Output ONLY a JSON patch with the changes, using dotted paths:
+   {{"add": {{"path.to.list": ["new item"]}}, "update": {{"path.to.field": value}}, "remove": {{"path.to.list": ["stale item"], "path.to.obsolete_field": null}}}}
+5. Leave out anything already in the outline. Output {{}} if nothing changed.
 6. Do NOT include any explanations, tags, or markdown outside the JSON.
 """
 
@@ -81,26 +267,40 @@ The Master Profile is how Aiko "remembers" her Master (omax) deeply, beyond just
                 "options": {"temperature": 0.3} # Low temperature for factual consistency
             }
 
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload) as resp:
-                    if resp.status == 200:
+            async with _background_llm_slot():
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, json=payload) as resp:
+                        if resp.status != 200:
+                            logger.error(f"LLM consolidation failed: {resp.status}")
+                            return None
                         data = await resp.json()
-                        response_text = data.get("message", {}).get("content", "").strip()
-                        
-                        # Extract JSON if the model included markers
-                        if "```json" in response_text:
-                            response_text = response_text.split("```json")[1].split("```")[0].strip()
-                        elif "```" in response_text:
-                            response_text = response_text.split("```")[1].split("```")[0].strip()
-                        
-                        new_profile = json.loads(response_text)
-                        if isinstance(new_profile, dict):
-                            self.profile_cache = new_profile
-                            self._save_profile()
-                            logger.info("Master Profile consolidated and saved.")
-                    else:
-                        logger.error(f"LLM consolidation failed: {resp.status}")
+            response_text = data.get("message", {}).get("content", "").strip()
+
+            # Extract JSON if the model included markers
+            if "```json" in response_text:
+                response_text = response_text.split("```json")[1].split("```")[0].strip()
+            elif "```" in response_text:
+                response_text = response_text.split("```")[1].split("```")[0].strip()
+
+            patch = json.loads(response_text or "{}")
+            return patch if isinstance(patch, dict) else {}
+        except json.JSONDecodeError:
+            raise  # Counted by consolidate(), which skips a chunk that never parses
         except Exception as e:
             logger.error(f"Error during memory consolidation: {e}")
+            return None
+
+
+@asynccontextmanager
+async def _background_llm_slot():
+    """Share the brain's idle-priority slot so consolidation never competes with chat."""
+    try:
+        from core.chat_engine import llm_gate
+    except Exception:
+        yield
+        return
+    async with llm_gate.background():
+        yield
+
 
 memory_consolidator = MemoryConsolidator()
@@ -0,0 +1,86 @@
+"""
+AIKO MEMORY PARTITIONS
+══════════════════════
+User and room partitioning for long-term memory retrieval.
+
+Every new memory is tagged with `user_id` (GLOBAL_USER for shared knowledge)
+and a `room`. Queries are routed to the rooms whose mempalace.yaml keywords
+appear in them, or to the asking user's partition when no room matches, and
+only fall back to a global search when the partition is too thin. Hits owned
+by another user are always dropped, so one Discord user's chat never shows up
+in someone else's reply.
+"""
+
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.lexical_index import tokenize, GLOBAL_USER
+
+logger = logging.getLogger("MemoryPartitions")
+
+PROJECT_CONFIG = Path(__file__).parent.parent / "mempalace.yaml"
+
+
+def load_rooms(config_path: Path = None) -> Dict[str, List[str]]:
+    """Room name -> routing keywords, from the `rooms` section of mempalace.yaml."""
+    path = Path(config_path or PROJECT_CONFIG)
+    if not path.exists():
+        return {}
+    try:
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return {str(r["name"]): [str(k).lower() for k in r.get("keywords", []) or []]
+                for r in data.get("rooms", []) or [] if r.get("name")}
+    except Exception as e:
+        logger.warning(f" [Partitions] Could not read rooms: {e}")
+        return {}
+
+
+def tag_owner(meta: Dict) -> Dict:
+    """Stamp the partition key on a memory's metadata before it is stored."""
+    meta["user_id"] = str(meta.get("user_id") or GLOBAL_USER)
+    return meta
+
+
+def is_visible(meta: Dict, user_id: Optional[str]) -> bool:
+    """Shared and untagged memories are visible to everyone; personal ones only to their owner."""
+    owner = (meta or {}).get("user_id")
+    return user_id is None or owner in (None, "", GLOBAL_USER) or str(owner) == str(user_id)
+
+
+def where_clause(rooms: List[str] = None, user_id: Optional[str] = None) -> Optional[Dict]:
+    """Chroma-style metadata filter for one partition (None = whole collection)."""
+    clauses = []
+    if rooms:
+        clauses.append({"room": rooms[0]} if len(rooms) == 1 else {"room": {"$in": list(rooms)}})
+    if user_id is not None:
+        clauses.append({"user_id": {"$in": [str(user_id), GLOBAL_USER]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class RoomRouter:
+    """Maps a query to the palace rooms it is about."""
+
+    def __init__(self, config_path: Path = None):
+        self.rooms = load_rooms(config_path)
+
+    def route(self, query: str) -> List[str]:
+        words = set(tokenize(query))
+        return [room for room, keywords in self.rooms.items()
+                if room in words or any(k in words for k in keywords)]
+
+    def partition(self, query: str, room: str = None, user_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Filter for the first, narrow search: an explicit room wins, then keyword
+        routed rooms; otherwise the user's own plus shared memories. Room
+        partitions hold mined files without an owner, so they are not
+        additionally filtered by user (ownership is enforced on the hits).
+        """
+        rooms = [room] if room else self.route(query)
+        if rooms:
+            return where_clause(rooms=rooms)
+        return where_clause(user_id=user_id)
@@ -0,0 +1,235 @@
+"""
+AIKO MEMORY SERVER
+══════════════════
+Standalone shared-memory process speaking the REMOTE_RAG_URL protocol.
+
+    python -m core.memory_server --port 8010
+
+Hub instances and the cloud bot point REMOTE_RAG_URL at this process and
+share one warm vector store and embedding model instead of each loading
+their own. Storage is a local RAGMemorySystem (MemPalace, then ChromaDB, then
+the in-process store). Stores from concurrent requests are coalesced into
+one batch per embedding call. Embedding and search run on a bounded worker
+pool. Requests beyond MAX_INFLIGHT are turned away with 503 so a burst
+cannot pile up behind a slow model.
+
+It serves every user's memories, so it listens on 127.0.0.1 by default and
+every request must carry the MEMORY_SERVER_TOKEN shared secret in the
+X-Memory-Token header (RemoteMemoryClient sends it from the same variable).
+Binding to another interface without a token is refused.
+
+    POST /store     {"text", "metadata", "id"?} or {"items": [...]}
+    POST /retrieve  {"query", "n_results", "where"?} -> {"results": [...]}
+    GET  /status    {"status", "memory_count", ...}
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import asyncio
+import logging
+import argparse
+from functools import partial
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(message)s")
+logger = logging.getLogger("MemoryServer")
+
+BASE = Path(__file__).parent.parent
+sys.path.insert(0, str(BASE))
+
+from core.rag_memory import RAGMemorySystem
+
+DEFAULT_HOST = os.getenv("MEMORY_SERVER_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.getenv("MEMORY_SERVER_PORT", "8010"))
+TOKEN = os.getenv("MEMORY_SERVER_TOKEN", "")
+TOKEN_HEADER = "X-Memory-Token"
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+EMBED_WORKERS = int(os.getenv("MEMORY_SERVER_WORKERS", "4"))
+MAX_INFLIGHT = int(os.getenv("MEMORY_SERVER_MAX_INFLIGHT", "32"))
+BATCH_MAX = 128          # Items per add_memories call
+BATCH_WINDOW = 0.05      # Seconds a store waits for other requests to share its batch
+MAX_RESULTS = 50
+
+json_response = partial(web.json_response, dumps=partial(json.dumps, default=str, ensure_ascii=False))
+
+
+class MemoryServer:
+    """aiohttp front end over one RAGMemorySystem."""
+
+    def __init__(self, rag: RAGMemorySystem = None, workers: int = EMBED_WORKERS, max_inflight: int = MAX_INFLIGHT,
+                 token: str = TOKEN):
+        self.rag = rag or RAGMemorySystem()
+        self.token = token
+        self.rag.remote_url = None  # Never forward to ourselves, whatever the environment says
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="MemServer")
+        self.max_inflight = max_inflight
+        self._inflight = 0
+        self._queue: asyncio.Queue = None
+        self._batcher = None
+        self.stats = {"stored": 0, "retrieved": 0, "rejected": 0, "batches": 0, "started": time.time()}
+
+    # ── Lifecycle ──
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 ** 2, middlewares=[self._authenticate])
+        app.add_routes([
+            web.post("/store", self.handle_store),
+            web.post("/retrieve", self.handle_retrieve),
+            web.get("/status", self.handle_status),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        loop = asyncio.get_running_loop()
+        # Load the backend (and its embedding model) before the first request, not during it
+        await loop.run_in_executor(self.pool, self.rag.is_available)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        count = await loop.run_in_executor(self.pool, self.rag.get_memory_count)
+        logger.info(f" [MemServer] 🧠 Ready. Items: {count}")
+
+    async def _on_cleanup(self, app):
+        if self._batcher:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+        self.pool.shutdown(wait=True)
+
+    # ── Admission control ──
+
+    @web.middleware
+    async def _authenticate(self, request, handler):
+        if self.token and not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ""), self.token):
+            return json_response({"error": "Unauthorized"}, status=401)
+        return await handler(request)
+
+    def _admit(self) -> bool:
+        if self._inflight >= self.max_inflight:
+            self.stats["rejected"] += 1
+            return False
+        self._inflight += 1
+        return True
+
+    def _overloaded(self) -> web.Response:
+        return json_response({"error": "Memory server busy"}, status=503, headers={"Retry-After": "1"})
+
+    # ── Write batching ──
+
+    async def _batch_loop(self):
+        """Coalesce queued stores from all requests into add_memories calls."""
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            size = len(jobs[0][0])
+            deadline = loop.time() + BATCH_WINDOW
+            while size < BATCH_MAX:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                size += len(job[0])
+
+            items = [item for batch, _ in jobs for item in batch]
+            try:
+                await loop.run_in_executor(self.pool, self.rag.add_memories, items)
+                self.stats["batches"] += 1
+                self.stats["stored"] += len(items)
+                for batch, future in jobs:
+                    if not future.done(): future.set_result(len(batch))
+            except Exception as e:
+                logger.error(f" [MemServer] Batch of {len(items)} failed: {e}")
+                for _, future in jobs:
+                    if not future.done(): future.set_exception(e)
+
+    # ── Handlers ──
+
+    async def handle_store(self, request):
+        if not self._admit():
+            return self._overloaded()
+        try:
+            data = await request.json()
+            raw = data.get("items") if isinstance(data.get("items"), list) else [data]
+            items = []
+            for entry in raw:
+                text = str(entry.get("text") or "")
+                if not text.strip():
+                    continue
+                meta = dict(entry.get("metadata") or {})
+                if entry.get("id"):
+                    meta["doc_id"] = entry["id"]
+                items.append((text, meta))
+            if not items:
+                return json_response({"status": "success", "stored": 0})
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((items, future))
+            await future
+            return json_response({"status": "success", "stored": len(items)})
+        except json.JSONDecodeError:
+            return json_response({"error": "Invalid JSON"}, status=400)
+        except Exception as e:
+            return json_response({"error": str(e)}, status=500)
+        finally:
+            self._inflight -= 1
+
+    async def handle_retrieve(self, request):
+        if not self._admit():
+            return self._overloaded()
+        try:
+            data = await request.json()
+            query = str(data.get("query") or "")
+            n_results = max(1, min(int(data.get("n_results") or 3), MAX_RESULTS))
+            where = data.get("where") or None
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, self.rag.semantic_search, query, n_results, where)
+            self.stats["retrieved"] += 1
+            return json_response({"results": list(results)})
+        except json.JSONDecodeError:
+            return json_response({"error": "Invalid JSON"}, status=400)
+        except Exception as e:
+            return json_response({"error": str(e)}, status=500)
+        finally:
+            self._inflight -= 1
+
+    async def handle_status(self, request):
+        try:
+            count = await asyncio.get_running_loop().run_in_executor(self.pool, self.rag.get_memory_count)
+        except Exception as e:
+            logger.error(f" [MemServer] Count failed: {e}")
+            count = 0
+        return json_response({
+            "status": "online",
+            "memory_count": count,
+            "inflight": self._inflight,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "uptime": round(time.time() - self.stats["started"]),
+            **{k: v for k, v in self.stats.items() if k != "started"},
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aiko shared memory server")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT)
+    parser.add_argument("--no-mempalace", action="store_true", help="Serve from ChromaDB / local store only")
+    args = parser.parse_args()
+    if not TOKEN and args.host not in LOOPBACK_HOSTS:
+        parser.error(f"set MEMORY_SERVER_TOKEN before binding to {args.host}; the server holds every user's memories")
+
+    rag = RAGMemorySystem()
+    if args.no_mempalace:
+        rag.use_mempalace = False
+    server = MemoryServer(rag, workers=args.workers, max_inflight=args.max_inflight)
+    web.run_app(server.build_app(), host=args.host, port=args.port, print=lambda x: logger.info(x))
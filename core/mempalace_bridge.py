@@ -6,25 +6,83 @@ Implements the RAG interface for transparent drop-in replacement.
 """
 
 import os
+import json
+import time
+import fnmatch
+import hashlib
 import logging
+import threading
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Tuple
 from mempalace.searcher import search_memories
-from mempalace.miner import get_collection, add_drawer, chunk_text
+from mempalace.miner import get_collection, chunk_text
+from core.file_manifest import FileManifest
+from core.dedup import get_dedup_index, dedup_scope
+from core.memory_partitions import tag_owner
 
 logger = logging.getLogger("MemPalaceBridge")
 
 DEFAULT_PALACE = os.path.expanduser("~/.mempalace/palace")
 DEFAULT_WING = "Aiko-desktop"
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Always skipped by incremental mining, on top of `exclude_patterns` in mempalace.yaml
+DEFAULT_EXCLUDES = [".git/", "node_modules/", "__pycache__/", ".venv/", "venv/", "dist/", "target/"]
+MAX_MINE_FILE_SIZE = 2 * 1024 * 1024  # Bigger files are assets/dumps, not knowledge
+WAKEUP_CACHE = DATA_DIR / "palace_wakeup.json"
+WAKEUP_REFRESH_DELAY = 300  # Debounce: re-render the wake-up once writes have settled
+
+
+def load_exclude_patterns(project_dir) -> List[str]:
+    """Read `exclude_patterns` from the project's mempalace.yaml (gitignore-style)."""
+    config_path = Path(project_dir) / "mempalace.yaml"
+    if not config_path.exists():
+        return []
+    try:
+        import yaml
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return [str(p) for p in data.get("exclude_patterns", []) or []]
+    except Exception as e:
+        logger.warning(f" [MemPalace] Could not read exclude patterns: {e}")
+        return []
+
+
+def is_excluded(rel_path: str, patterns: List[str]) -> bool:
+    """Minimal gitignore matching: `dir/` prunes a folder, `a/b*` anchors, `*.log` matches any name."""
+    parts = rel_path.split("/")
+    for pat in patterns:
+        if pat.endswith("/"):
+            pat = pat.rstrip("/")
+            if "/" in pat:
+                if rel_path == pat or rel_path.startswith(pat + "/"):
+                    return True
+            elif pat in parts[:-1] or any(fnmatch.fnmatch(p, pat) for p in parts[:-1]):
+                return True
+        elif "/" in pat:
+            if fnmatch.fnmatch(rel_path, pat.lstrip("/")):
+                return True
+        elif any(fnmatch.fnmatch(p, pat) for p in parts):
+            return True
+    return False
 
 class MemPalaceRAG:
     """MemPalace-backed semantic memory for Aiko."""
+
+    # Shared by every bridge instance on the same palace (instances are cheap and short-lived)
+    _last_write: Dict[str, float] = {}
+    _refresh_timers: Dict[Tuple[str, str], threading.Timer] = {}
+    _refresh_lock = threading.Lock()
+    _wakeups: Dict[Tuple[str, str], Dict] = {}  # (palace, wing) -> {"version", "text"} last rendered
     
     def __init__(self, palace_path: str = None, wing: str = None):
         self.palace_path = palace_path or DEFAULT_PALACE
         self.wing = wing or DEFAULT_WING
         self.collection = None
         self._initialized = False
+        self.world_context = ""
+        self.lexical = None  # Keyword index kept in step with filed documents (set by RAGMemorySystem)
 
     def _initialize(self):
         """Lazy initialize ChromaDB collection via MemPalace."""
@@ -36,54 +94,296 @@ class MemPalaceRAG:
         except Exception as e:
             logger.error(f" [MemPalace] Init Error: {e}")
 
-    def wake_up(self):
-        """Invoke the MemPalace wake-up sequence to build the world context."""
+    # --- Wake-up context ---
+
+    def palace_version(self) -> Dict:
+        """Changes whenever the palace does: drawer count plus the newest write we know of."""
+        stamp = self._last_write.get(self.palace_path, 0.0)
+        db_file = Path(self.palace_path) / "chroma.sqlite3"
+        if db_file.exists():
+            stamp = max(stamp, db_file.stat().st_mtime)
+        return {"count": self.get_memory_count(), "stamp": round(stamp, 3)}
+
+    def _load_wakeup_cache(self) -> Dict:
+        shared = self._wakeups.get((self.palace_path, self.wing))
+        if shared:
+            return shared
+        try:
+            cached = json.loads(WAKEUP_CACHE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if cached.get("palace") != self.palace_path or cached.get("wing") != self.wing:
+            return {}
+        shared = self._wakeups[(self.palace_path, self.wing)] = {"version": cached.get("version"),
+                                                                 "text": cached.get("text", "")}
+        return shared
+
+    def wake_up(self, force: bool = False) -> str:
+        """
+        Build the world context with the MemPalace wake-up sequence.
+        The rendered text is cached in memory (shared by every bridge on the
+        palace) and on disk, and reused while the palace version is unchanged,
+        so restarts skip the expensive render.
+        """
         try:
-            from mempalace.cli import cmd_wakeup
-            import argparse
-            args = argparse.Namespace(palace=self.palace_path, wing=self.wing)
-            cmd_wakeup(args)
+            version = self.palace_version()
+            cached = self._load_wakeup_cache()
+            if not force and cached.get("version") == version:
+                self.world_context = cached.get("text", "")
+                logger.info(" [MemPalace] 🌅 Wake-up context served from cache.")
+                return self.world_context
+
+            # The layer API returns the text; the CLI command prints it, which would mean
+            # swapping the process-wide stdout from the background refresh thread
+            from mempalace.layers import MemoryStack
+            self.world_context = MemoryStack(palace_path=self.palace_path).wake_up(wing=self.wing)
+            self._wakeups[(self.palace_path, self.wing)] = {"version": version, "text": self.world_context}
+
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = WAKEUP_CACHE.with_suffix(".tmp")
+            tmp.write_text(json.dumps({
+                "palace": self.palace_path,
+                "wing": self.wing,
+                "version": version,
+                "built_at": time.time(),
+                "text": self.world_context
+            }, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, WAKEUP_CACHE)
             logger.info(" [MemPalace] 🌅 Palace Wake-up Sequence Complete.")
         except Exception as e:
             logger.error(f" [MemPalace] Wake-up Error: {e}")
+        return self.world_context
 
-    def mine_project(self, project_dir: str = "./"):
-        """Manually trigger a mine scan of the project."""
+    def get_world_context(self) -> str:
+        """Latest wake-up text rendered for this palace, by any bridge instance or an earlier run."""
+        cached = self._load_wakeup_cache().get("text")
+        if cached:
+            self.world_context = cached
+        return self.world_context
+
+    def mark_written(self):
+        """Note a palace write and schedule one debounced background wake-up refresh."""
+        self._last_write[self.palace_path] = time.time()
+        key = (self.palace_path, self.wing)
+        with self._refresh_lock:
+            if key in self._refresh_timers:
+                return
+            timer = threading.Timer(WAKEUP_REFRESH_DELAY, self._refresh_wakeup, args=(key,))
+            timer.daemon = True
+            self._refresh_timers[key] = timer
+        timer.start()
+
+    def _refresh_wakeup(self, key: Tuple[str, str]):
+        with self._refresh_lock:
+            self._refresh_timers.pop(key, None)
+        self.wake_up()
+
+    def mine_project(self, project_dir: str = "./", full: bool = False):
+        """
+        Mine the project into the palace.
+        Incremental by default: only files whose content hash changed since the
+        last run are re-filed (through the bridge's own chunking, one stable
+        drawer set per file), and drawers of deleted files are removed.
+        `full` hands the whole project to the MemPalace miner instead.
+        """
         try:
-            from mempalace.miner import mine
-            mine(project_dir=project_dir, palace_path=self.palace_path, wing_override=self.wing, agent="Aiko")
-            logger.info(f" [MemPalace] ⛏️ Finished mining: {project_dir}")
+            if full:
+                from mempalace.miner import mine
+                mine(project_dir=project_dir, palace_path=self.palace_path, wing_override=self.wing, agent="Aiko")
+                self.mark_written()
+                logger.info(f" [MemPalace] ⛏️ Finished full mining: {project_dir}")
+                return
+
+            if not self.is_available(): return
+            project = Path(project_dir).resolve()
+            manifest = FileManifest(self._mine_manifest_path(project), root=project)
+            files = self._scan_project(project)
+
+            changed = []
+            for f in files:
+                is_changed, digest = manifest.check(f)
+                if is_changed:
+                    changed.append((f, digest))
+
+            seen = {manifest.key(f) for f in files}
+            deleted = [k for k in manifest.keys() if k not in seen]
+            for key in deleted:
+                self.delete_source(str(project / key))
+                manifest.forget(project / key)
+
+            filed = 0
+            for f, digest in changed:
+                # Only files that were actually filed are recorded; failures are retried next run
+                if self._mine_file(project, f):
+                    manifest.record(f, digest)
+                    filed += 1
+
+            manifest.save()
+            logger.info(f" [MemPalace] ⛏️ Incremental mine of {project_dir}: {filed}/{len(changed)} changed filed, "
+                        f"{len(deleted)} removed, {len(files) - len(changed)} unchanged")
         except Exception as e:
             logger.error(f" [MemPalace] Mine Error: {e}")
 
+    def _mine_file(self, project: Path, path: Path) -> bool:
+        """File one project file under stable per-file drawer ids, replacing its previous drawers."""
+        try:
+            text = path.read_text(encoding="utf-8", errors="replace")
+            rel = path.relative_to(project).parts
+            room = rel[0] if len(rel) > 1 else "general"  # Top-level folder, like the miner's default rooms
+            self.delete_source(str(path))
+            self._file_chunks(text, str(path), room, stable_ids=True)
+            return True
+        except Exception as e:
+            logger.error(f" [MemPalace] Mine Error ({path}): {e}")
+            return False
+
+    def _mine_manifest_path(self, project: Path) -> Path:
+        tag = hashlib.md5(f"{project}|{self.palace_path}".encode()).hexdigest()[:10]
+        return DATA_DIR / f"palace_mine_manifest_{tag}.json"
+
+    def _scan_project(self, project: Path) -> List[Path]:
+        """List mineable files, pruning excluded folders before descending into them."""
+        try:
+            from mempalace.miner import READABLE_EXTENSIONS, SKIP_FILENAMES
+        except ImportError:
+            READABLE_EXTENSIONS = {".txt", ".md", ".py", ".js", ".ts", ".jsx", ".tsx", ".json", ".yaml", ".yml", ".html", ".css", ".rs", ".sh", ".toml"}
+            SKIP_FILENAMES = {"mempalace.yaml", "package-lock.json", ".gitignore"}
+
+        patterns = DEFAULT_EXCLUDES + load_exclude_patterns(project)
+        files = []
+        for root, dirs, names in os.walk(project):
+            rel_root = Path(root).relative_to(project).as_posix()
+            rel_root = "" if rel_root == "." else rel_root + "/"
+            dirs[:] = [d for d in dirs if not is_excluded(f"{rel_root}{d}/_", patterns)]
+            for name in names:
+                rel = f"{rel_root}{name}"
+                if name in SKIP_FILENAMES or Path(name).suffix.lower() not in READABLE_EXTENSIONS:
+                    continue
+                if is_excluded(rel, patterns):
+                    continue
+                path = Path(root) / name
+                try:
+                    if path.is_symlink() or path.stat().st_size > MAX_MINE_FILE_SIZE:
+                        continue
+                except OSError:
+                    continue
+                files.append(path)
+        return files
+
+    def delete_source(self, source_file: str) -> bool:
+        """Remove every drawer that was filed from `source_file`."""
+        if not self.is_available(): return False
+        try:
+            self.collection.delete(where={"source_file": source_file})
+            if self.lexical is not None:
+                self.lexical.delete_source(source_file)
+            self.mark_written()
+            return True
+        except Exception as e:
+            logger.error(f" [MemPalace] Delete Error ({source_file}): {e}")
+            return False
+
     def is_available(self) -> bool:
         self._initialize()
         return self.collection is not None
 
-    def add_memory(self, text: str, metadata: dict = None, room: str = "general"):
-        """File a memory into a specific room in the Aiko wing."""
-        if not self.is_available(): return
-        if not text.strip(): return
-        
+    def add_memory(self, text: str, metadata: dict = None, room: str = "general", dedup: bool = True) -> List[str]:
+        """
+        File a memory into a specific room in the Aiko wing. Returns the drawer ids.
+        A near-duplicate of an existing memory only refreshes that memory's
+        `seen_count` / `last_seen` (pass dedup=False when the caller already checked).
+        """
+        if not self.is_available(): return []
+        if not text.strip(): return []
+        metadata = metadata or {}
+
         try:
-            # Chunk long texts as per MemPalace spec
-            chunks = chunk_text(text, metadata.get("source", "conversation"))
-            for i, chunk in enumerate(chunks):
-                add_drawer(
-                    collection=self.collection,
-                    wing=self.wing,
-                    room=room,
-                    content=chunk["content"],
-                    source_file=metadata.get("source", "conversation"),
-                    chunk_index=i,
-                    agent="Aiko"
-                )
+            scope = dedup_scope(metadata, room)
+            if dedup:
+                dup = get_dedup_index().check(text, scope)
+                if dup:
+                    if self.touch_drawers(dup["refs"], dup["seen_count"], dup["last_seen"]):
+                        return dup["refs"]
+                    get_dedup_index().forget(dup["id"])  # Its drawers were evicted: file it again
+            ids = self._file_chunks(text, metadata.get("source", "conversation"), room, metadata)
+            if dedup:
+                get_dedup_index().add(text, scope, ids)
+            return ids
         except Exception as e:
             logger.error(f" [MemPalace] Add Error: {e}")
+            return []
+
+    def touch_drawers(self, ids: List[str], seen_count: int, last_seen: float) -> bool:
+        """Record another sighting on existing drawers. False when none of them exist anymore."""
+        if not ids or not self.is_available(): return False
+        try:
+            existing = self.collection.get(ids=ids, include=[]).get("ids") or []
+            if not existing:
+                return False
+            self.collection.update(ids=existing, metadatas=[{"seen_count": seen_count, "last_seen": last_seen}] * len(existing))
+            return True
+        except Exception as e:
+            logger.error(f" [MemPalace] Touch Error: {e}")
+            return False
 
-    def search_memory(self, query: str, n_results: int = 5, wing: str = None, room: str = None) -> tuple:
-        """High-recall search using MemPalace search logic."""
+    def upsert_document(self, source_id: str, text: str, room: str = "general", metadata: dict = None) -> int:
+        """
+        Replace every drawer of `source_id` with the chunks of `text`.
+        Drawer IDs are derived from (source_id, chunk_index), so re-filing the
+        same document overwrites it instead of adding duplicates.
+        """
+        if not self.is_available(): return 0
+        try:
+            self.delete_source(source_id)
+            return len(self._file_chunks(text, source_id, room, metadata, stable_ids=True))
+        except Exception as e:
+            logger.error(f" [MemPalace] Upsert Error ({source_id}): {e}")
+            return 0
+
+    def _file_chunks(self, text: str, source: str, room: str, metadata: dict = None, stable_ids: bool = False) -> List[str]:
+        """Chunk `text` (MemPalace spec) and upsert the drawers in one batch. Returns the drawer ids."""
+        chunks = chunk_text(text, source)
+        if not chunks: return []
+
+        extra = tag_owner({k: v for k, v in (metadata or {}).items()
+                           if isinstance(v, (str, int, float, bool)) and k not in ("source", "room")})
+        filed_at = datetime.now().isoformat()
+        ids, docs, metas = [], [], []
+        for i, chunk in enumerate(chunks):
+            content = chunk["content"]
+            # Stable documents key on position; free-form memories key on content
+            key = f"{source}|{i}" if stable_ids else f"{source}|{hashlib.sha256(content.encode()).hexdigest()}"
+            ids.append(f"drawer_{self.wing}_{room}_{hashlib.sha256(key.encode()).hexdigest()[:24]}")
+            docs.append(content)
+            metas.append({
+                **extra,
+                "wing": self.wing,
+                "room": room,
+                "source_file": source,
+                "chunk_index": i,
+                "added_by": "Aiko",
+                "filed_at": filed_at,
+            })
+        self.collection.upsert(documents=docs, ids=ids, metadatas=metas)
+        if stable_ids and self.lexical is not None:
+            # Documents are keyword-indexed chunk for chunk; free-form memories are indexed by the caller
+            self.lexical.add_document(source, docs, dict(extra, room=room, source_file=source))
+        self.mark_written()
+        return ids
+
+    def search_memory(self, query: str, n_results: int = 5, wing: str = None, room: str = None,
+                      where: dict = None) -> tuple:
+        """
+        High-recall search using MemPalace search logic.
+        With `where` (Chroma metadata filter) the wing is queried directly so
+        partition filters such as user_id apply; without it the MemPalace
+        searcher ranks the whole wing.
+        """
         if not self.is_available(): return ()
+        if where:
+            if room:
+                where = {"$and": [where, {"room": room}]}
+            return self._search_where(query, n_results, wing or self.wing, where)
         
         try:
             results = search_memories(
@@ -98,15 +398,19 @@ class MemPalaceRAG:
                 logger.error(f" [MemPalace] Search Error: {results['error']}")
                 return ()
                 
-            # Format to Aiko's expected (text, meta) format
+            # Format to Aiko's expected (text, meta) format, with each drawer's owner so
+            # callers can keep other users' memories out of unfiltered searches
+            hits = results.get("results", [])
+            owners = self._owners([hit.get("drawer_id") for hit in hits])
             formatted = []
-            for hit in results.get("results", []):
+            for hit in hits:
                 formatted.append({
                     "text": hit["text"],
                     "meta": {
                         "wing": hit["wing"],
                         "room": hit["room"],
                         "source": hit["source_file"],
+                        "user_id": owners.get(hit.get("drawer_id")),
                         "similarity": hit["similarity"]
                     }
                 })
@@ -115,6 +419,39 @@ class MemPalaceRAG:
             logger.error(f" [MemPalace] Search Fatal: {e}")
             return ()
 
+    def _owners(self, ids: List[str]) -> Dict[str, str]:
+        """drawer id -> user_id partition key, for hits that came back without their metadata."""
+        ids = [i for i in ids if i]
+        if not ids: return {}
+        found = self.collection.get(ids=ids, include=["metadatas"])
+        return {i: (m or {}).get("user_id") for i, m in zip(found.get("ids") or [], found.get("metadatas") or [])}
+
+    def _search_where(self, query: str, n_results: int, wing: str, where: dict) -> tuple:
+        flt = {"$and": [{"wing": wing}, where]} if where else {"wing": wing}
+        try:
+            results = self.collection.query(query_texts=[query], n_results=n_results, where=flt,
+                                            include=["documents", "metadatas", "distances"])
+        except Exception as e:
+            logger.error(f" [MemPalace] Filtered Search Error: {e}")
+            return ()
+        formatted = []
+        docs = (results.get("documents") or [[]])[0]
+        metas = (results.get("metadatas") or [[]])[0]
+        dists = (results.get("distances") or [[]])[0]
+        for doc, meta, dist in zip(docs, metas, dists):
+            meta = meta or {}
+            formatted.append({
+                "text": doc,
+                "meta": {
+                    "wing": meta.get("wing", wing),
+                    "room": meta.get("room", "general"),
+                    "source": meta.get("source_file", "unknown"),
+                    "user_id": meta.get("user_id"),
+                    "similarity": round(1 - dist, 3)
+                }
+            })
+        return tuple(formatted)
+
     def get_memory_count(self) -> int:
         """Count only drawers in Aiko's wing."""
         if not self.is_available(): return 0
@@ -15,6 +15,11 @@ import logging
 
 logger = logging.getLogger("MessageQueue")
 
+DEFAULT_LEASE = 120       # Seconds a claimed message stays invisible before it is handed out again
+MAX_DELIVERIES = 5        # Claims after which an unacknowledged message is left for cleanup
+RECLAIM_INTERVAL = 5      # Seconds between expired-lease sweeps done by dequeue
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 
 class MessageQueue:
     """
@@ -25,23 +30,31 @@ class MessageQueue:
     - Priority queue support
     - Automatic message expiration
     - Batch operations for performance
+    - Atomic claims: one UPDATE ... RETURNING hands each message to exactly one consumer
+    - Visibility-timeout leases: claimed but unacknowledged messages return to the queue
     """
 
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, lease_seconds: float = DEFAULT_LEASE):
         if db_path is None:
             base_dir = Path(__file__).parent.parent / "data"
             base_dir.mkdir(exist_ok=True)
             db_path = base_dir / "aiko_queue.db"
 
         self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
         self._local = threading.local()
+        self._last_reclaim = 0
         self._init_db()
 
     def _get_conn(self) -> sqlite3.Connection:
         """Get thread-local database connection."""
         if not hasattr(self._local, 'conn') or self._local.conn is None:
-            self._local.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self._local.conn.row_factory = sqlite3.Row
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            conn.row_factory = sqlite3.Row
+            # WAL: bots and the hub read while another process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
         return self._local.conn
 
     def _init_db(self):
@@ -60,10 +73,20 @@ class MessageQueue:
                 expires_at REAL,
                 processed_at REAL,
                 processed_by TEXT,
-                retry_count INTEGER DEFAULT 0
+                retry_count INTEGER DEFAULT 0,
+                lease_until REAL
             )
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_queue_time ON messages (queue_name, created_at)")
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(messages)")}
+        if 'lease_until' not in columns:
+            cursor.execute("ALTER TABLE messages ADD COLUMN lease_until REAL")
+        # Covers the claim scan: pending rows of one queue, already in (priority, created_at) order
+        cursor.execute("DROP INDEX IF EXISTS idx_queue_time")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_queue_claim
+            ON messages (queue_name, processed_at, priority, created_at, expires_at)
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_lease ON messages (lease_until) WHERE lease_until IS NOT NULL")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_expires ON messages (expires_at)")
 
         # Events table for pub/sub
@@ -117,44 +140,60 @@ class MessageQueue:
         return cursor.lastrowid
 
     def dequeue(self, queue_name: str, processor_id: str = None,
-                batch_size: int = 1, timeout: float = 0) -> List[Dict]:
+                batch_size: int = 1, timeout: float = 0, lease_seconds: float = None) -> List[Dict]:
         """
-        Get messages from queue (non-blocking).
+        Claim messages from queue (non-blocking).
 
         Args:
             queue_name: Queue to read from
             processor_id: Identifier for this processor
-            batch_size: Number of messages to fetch
+            batch_size: Number of messages to claim
             timeout: Not used (for API compatibility)
+            lease_seconds: Visibility timeout; unacknowledged messages are handed out again after it
 
         Returns:
             List of message dicts with 'id', 'payload', 'created_at'
         """
+        if time.time() - self._last_reclaim >= RECLAIM_INTERVAL:
+            self.reclaim_expired()
+
         conn = self._get_conn()
-        cursor = conn.cursor()
         now = time.time()
-
-        # Get highest priority, oldest messages
-        cursor.execute("""
-            SELECT id, payload, created_at, retry_count FROM messages
+        lease_until = now + (lease_seconds or self.lease_seconds)
+        pick = """
+            SELECT id FROM messages
             WHERE queue_name = ? AND processed_at IS NULL
             AND (expires_at IS NULL OR expires_at > ?)
             ORDER BY priority ASC, created_at ASC
             LIMIT ?
-        """, (queue_name, now, batch_size))
-
-        rows = cursor.fetchall()
-        if not rows:
+        """
+        try:
+            if HAS_RETURNING:
+                # Select and mark in one statement: no other consumer can claim the same rows
+                rows = conn.execute(f"""
+                    UPDATE messages
+                    SET processed_at = ?, processed_by = ?, lease_until = ?, retry_count = retry_count + 1
+                    WHERE id IN ({pick})
+                    RETURNING id, payload, created_at, priority, retry_count - 1 AS retry_count
+                """, (now, processor_id, lease_until, queue_name, now, batch_size)).fetchall()
+            else:
+                conn.execute("BEGIN IMMEDIATE")
+                ids = [row['id'] for row in conn.execute(pick, (queue_name, now, batch_size))]
+                conn.executemany(
+                    "UPDATE messages SET processed_at = ?, processed_by = ?, lease_until = ?, "
+                    "retry_count = retry_count + 1 WHERE id = ?",
+                    [(now, processor_id, lease_until, i) for i in ids])
+                rows = conn.execute(
+                    f"SELECT id, payload, created_at, priority, retry_count - 1 AS retry_count FROM messages "
+                    f"WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall() if ids else []
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"[Queue] Claim error on {queue_name}: {e}")
             return []
 
         messages = []
-        for row in rows:
-            # Mark as processed
-            cursor.execute(
-                "UPDATE messages SET processed_at = ?, processed_by = ?, retry_count = retry_count + 1 WHERE id = ?",
-                (now, processor_id, row['id'])
-            )
-
+        for row in sorted(rows, key=lambda r: (r['priority'], r['created_at'], r['id'])):
             try:
                 payload = json.loads(row['payload'])
             except json.JSONDecodeError:
@@ -166,8 +205,6 @@ class MessageQueue:
                 'created_at': row['created_at'],
                 'retry_count': row['retry_count']
             })
-
-        conn.commit()
         return messages
 
     def dequeue_one(self, queue_name: str, processor_id: str = None) -> Optional[Dict]:
@@ -207,11 +244,47 @@ class MessageQueue:
         conn = self._get_conn()
         cursor = conn.cursor()
         cursor.execute(
-            "UPDATE messages SET processed_at = NULL, processed_by = NULL WHERE id = ?",
+            "UPDATE messages SET processed_at = NULL, processed_by = NULL, lease_until = NULL WHERE id = ?",
             (message_id,)
         )
         conn.commit()
 
+    def extend_lease(self, message_id: int, seconds: float = None, processor_id: str = None) -> bool:
+        """Keep a message invisible while its consumer is still working on it."""
+        conn = self._get_conn()
+        sql = "UPDATE messages SET lease_until = ? WHERE id = ? AND processed_at IS NOT NULL"
+        params = [time.time() + (seconds or self.lease_seconds), message_id]
+        if processor_id is not None:
+            sql += " AND processed_by = ?"
+            params.append(processor_id)
+        cursor = conn.execute(sql, params)
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def reclaim_expired(self, max_deliveries: int = MAX_DELIVERIES) -> int:
+        """
+        Return messages whose lease ran out (consumer crashed or gave up) to
+        the queue. Messages already delivered `max_deliveries` times stay
+        claimed and are removed by cleanup_old_data.
+        """
+        self._last_reclaim = time.time()
+        conn = self._get_conn()
+        try:
+            cursor = conn.execute("""
+                UPDATE messages SET processed_at = NULL, processed_by = NULL, lease_until = NULL
+                WHERE lease_until IS NOT NULL AND lease_until < ? AND retry_count < ?
+            """, (self._last_reclaim, max_deliveries))
+            conn.execute("UPDATE messages SET lease_until = NULL WHERE lease_until IS NOT NULL AND lease_until < ?",
+                         (self._last_reclaim,))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"[Queue] Reclaim error: {e}")
+            return 0
+        if cursor.rowcount:
+            logger.warning(f"[Queue] Reclaimed {cursor.rowcount} messages with expired leases")
+        return cursor.rowcount
+
     def get_queue_stats(self, queue_name: str = None) -> Dict:
         """Get queue statistics."""
         conn = self._get_conn()
@@ -48,10 +48,15 @@ from core.autonomous_agent import autonomous_agent
 from core.pc_manager import PCManager
 from core.startup_manager import startup_manager
 from core.message_queue import get_queue, send_response
+from core.queue_workers import ConsumerPool
 from core.unified_memory import get_unified_memory
 from core.proactive import ProactiveAgent
+from core.palace_compactor import PalaceCompactor
 from core.bot_manager import start_all_satellites
 from core.obsidian_connector import ObsidianConnector
+from core.file_manifest import FileManifest
+from core.fs_watcher import DirectoryWatcher
+from core.history_search import get_history_index
 
 # ═══════════════════════════════════════════════════════════════
 # UI UPDATES & BROADCASTING
@@ -122,6 +127,10 @@ logger.info("🧠 Unified Memory initialized")
 # Legacy memory for compatibility
 memory = MemoryManager()
 
+# Full-text search over every chat message, kept in sync with the conversation store
+history_index = get_history_index()
+history_index.attach(memory.store)
+
 # RAG will be local here, as this IS the hub
 os.environ["REMOTE_RAG_URL"] = ""
 rag = RAGMemorySystem()
@@ -148,6 +157,10 @@ brain = AikoBrain(
     obsidian=obsidian
 )
 
+# Maintenance LLM work (rolling summaries, palace compaction) runs on the brain's idle-priority slot
+unified_memory.summarizer.llm = brain.ask_background
+palace_compactor = PalaceCompactor(rag.mempalace, llm=brain.ask_background, store=memory.store)
+
 # Link components to proactive agent
 proactive_agent.brain = brain
 proactive_agent.obsidian = obsidian
@@ -175,6 +188,8 @@ async def sync_star_office(state: str, detail: str = ""):
         return False
 
 USER_ID = "omax"
+KNOWLEDGE_QUEUE_SIZE = 64   # Max pending knowledge files before the watcher blocks
+KNOWLEDGE_WORKERS = 2       # Concurrent document ingestions
 
 # --- Callbacks ---
 async def broadcast_amplitude(amp: float):
@@ -219,59 +234,42 @@ brain.on_sentence = sync_on_sentence
 # MESSAGE QUEUE PROCESSING (Discord/Telegram Integration)
 # ═══════════════════════════════════════════════════════════════
 
-async def process_queue_messages():
-    """Background task: Process messages from Discord/Telegram bots."""
-    while True:
-        try:
-            # Process Discord messages
-            discord_msg = msg_queue.dequeue_one('discord_in', processor_id='neural_hub')
-            if discord_msg:
-                payload = discord_msg['payload']
-                user_id = payload.get('user_id', 'discord_user')
-                message = payload.get('message', '')
-
-                logger.info(f"[Queue] Processing Discord message from {user_id}: {message[:50]}...")
+async def handle_bot_message(queue_name: str, msg: dict):
+    """One Discord/Telegram turn: chat, reply through the outbound queue, log a thought."""
+    source = queue_name.rsplit('_', 1)[0]
+    payload = msg['payload']
+    user_id = payload.get('user_id', f'{source}_user')
+    message = payload.get('message', '')
 
-                # Process through Aiko brain
-                reply, emotion, *_ = await brain.chat(message, user_id=user_id)
+    logger.info(f"[Queue] Processing {source.capitalize()} message from {user_id}: {message[:50]}...")
 
-                # Send response back to Discord queue
-                send_response('discord', user_id, reply, emotion)
+    # Process through Aiko brain; the reply goes to the platform, not to the desktop UI/TTS, whose
+    # shared sentence stream would interleave with other conversations running concurrently.
+    # A retried turn already saved its input on the first delivery.
+    reply, emotion, *_ = await brain.chat(message, user_id=user_id, save_input=msg.get('attempt', 1) == 1,
+                                          emit=lambda _sentence: None)
 
-                # Log thought
-                unified_memory.think(
-                    f"Responded to Discord user {user_id}: {reply[:100]}...",
-                    category='observation',
-                    related_memories=[user_id],
-                    emotion=emotion,
-                    importance=5
-                )
+    # Send response back to the platform's queue
+    send_response(source, user_id, reply, emotion)
 
-                # Acknowledge message
-                msg_queue.acknowledge(discord_msg['id'])
-
-            # Process Telegram messages
-            telegram_msg = msg_queue.dequeue_one('telegram_in', processor_id='neural_hub')
-            if telegram_msg:
-                payload = telegram_msg['payload']
-                user_id = payload.get('user_id', 'telegram_user')
-                message = payload.get('message', '')
-
-                logger.info(f"[Queue] Processing Telegram message from {user_id}: {message[:50]}...")
-
-                reply, emotion, *_ = await brain.chat(message, user_id=user_id)
-
-                send_response('telegram', user_id, reply, emotion)
+    # Log thought
+    unified_memory.think(
+        f"Responded to {source.capitalize()} user {user_id}: {reply[:100]}...",
+        category='observation',
+        related_memories=[user_id],
+        emotion=emotion,
+        importance=5
+    )
 
-                unified_memory.think(
-                    f"Responded to Telegram user {user_id}: {reply[:100]}...",
-                    category='observation',
-                    related_memories=[user_id],
-                    emotion=emotion,
-                    importance=5
-                )
+# Different users are answered concurrently; one user's turns stay in order
+queue_pool = ConsumerPool(msg_queue, handle_bot_message, ['discord_in', 'telegram_in'],
+                          processor_id='neural_hub', max_concurrency=config.get("QUEUE_CONCURRENCY", 4))
 
-                msg_queue.acknowledge(telegram_msg['id'])
+async def process_queue_messages():
+    """Background task: feed messages from Discord/Telegram bots to the consumer pool."""
+    while True:
+        try:
+            queue_pool.poll()
 
             # Heartbeat
             msg_queue.heartbeat('neural_hub')
@@ -309,7 +307,8 @@ async def handle_status(req):
         "status": "online",
         "hub_name": "Aiko Neural Hub v2",
         "metrics": metrics,
-        "rag_available": rag.is_available()
+        "rag_available": rag.is_available(),
+        "queue": queue_pool.stats()
     })
 
 async def handle_health(req):
@@ -326,10 +325,11 @@ async def handle_health(req):
     return web.json_response(health)
 
 async def handle_sessions(req):
-    """List all available chat sessions with recency and pinning."""
+    """List chat sessions with recency and pinning (?limit=&cursor= for pagination)."""
     try:
-        sessions = memory.get_recent_sessions()
-        return web.json_response({"sessions": sessions})
+        limit = int(req.query["limit"]) if req.query.get("limit") else None
+        page = memory.get_sessions_page(limit=limit, cursor=req.query.get("cursor"))
+        return web.json_response(page)
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
@@ -366,12 +366,36 @@ async def handle_delete_session(req):
         return web.json_response({"error": str(e)}, status=500)
 
 async def handle_history(req):
-    """Get full history for a specific session."""
+    """
+    Get history for a specific session.
+    ?since=<message id|timestamp> returns only newer messages (reconnects);
+    ?before=<message id>&limit=N pages backwards through older ones.
+    """
     try:
         # Support both ?id= and ?uid= (frontend uses uid)
         sid = req.query.get("uid") or req.query.get("id") or USER_ID
-        mem, uid = memory.get_user_data(sid)
-        return web.json_response({"history": mem[uid]["history"]})
+        limit = int(req.query["limit"]) if req.query.get("limit") else None
+        page = memory.get_history_page(sid, since=req.query.get("since"),
+                                       before=req.query.get("before"), limit=limit)
+        return web.json_response(page)
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+
+async def handle_history_search(req):
+    """
+    Full-text search over past messages.
+    ?q=<words>&uid=<session>&limit=&offset= -> ranked hits with highlighted snippets.
+    """
+    try:
+        if not history_index.enabled:
+            return web.json_response({"error": "History search is disabled (set HISTORY_SEARCH=true)"}, status=404)
+        q = req.query.get("q", "").strip()
+        if not q:
+            return web.json_response({"error": "Missing query"}, status=400)
+        page = history_index.search(q, user_id=req.query.get("uid") or None,
+                                    limit=int(req.query.get("limit", 20)),
+                                    offset=int(req.query.get("offset", 0)))
+        return web.json_response(page)
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
@@ -479,15 +503,14 @@ async def handle_ws(req):
                     attachments = data.get("attachments", [])
 
                     async def _process_branch(text, msg_id, uid, attachments):
-                        # 1. Truncate history
-                        mem, user_key = memory.get_user_data(uid)
-                        idx = -1
-                        for i, m in enumerate(mem[user_key]["history"]):
-                            if str(m.get("timestamp", "")) == str(msg_id) or str(m.get("id", "")) == str(msg_id):
-                                idx = i
-                                break
-                        if idx != -1:
-                            memory.truncate_history(uid, idx)
+                        # 1. Fork the conversation tree before the edited message (old branch is kept)
+                        if not memory.branch_from(uid, str(msg_id)):
+                            # Older clients identify messages by timestamp
+                            mem, user_key = memory.get_user_data(uid)
+                            match = next((m for m in mem[user_key]["history"]
+                                          if str(m.get("timestamp", "")) == str(msg_id)), None)
+                            if match:
+                                memory.branch_from(uid, match["id"])
 
                         # 2. Proceed exactly like a chat message
                         await broadcast_event("chat_start", {"role": "user", "text": text})
@@ -520,6 +543,15 @@ async def handle_ws(req):
                     asyncio.create_task(_process_branch(text, msg_id, uid, attachments))
                 
 
+                elif m_type == "checkout":
+                    # Switch to another branch of the conversation tree (pointer move, no regeneration)
+                    uid = data.get("session_id") or data.get("user_id", USER_ID)
+                    if memory.checkout(uid, str(data.get("message_id"))):
+                        page = memory.get_history_page(uid, limit=data.get("limit"))
+                        await ws.send_str(json.dumps({"type": "history", "data": dict(page, session_id=uid)}))
+                    else:
+                        await ws.send_str(json.dumps({"type": "error", "data": {"msg": "Unknown message id"}}))
+
                 elif m_type == "ping":
                     await ws.send_str(json.dumps({"type": "pong"}))
                 
@@ -557,9 +589,19 @@ async def on_startup(app):
     asyncio.create_task(memory_autosave_loop())
     logger.info("💾 Memory auto-save started")
 
+    # Fold old conversation turns into rolling summaries when the LLM is idle
+    asyncio.create_task(conversation_summary_loop())
+
     # Start Consolidated Satellites (Discord/Telegram)
     asyncio.create_task(start_all_satellites())
 
+    # One-time indexing of chat history written before the search index existed
+    asyncio.get_running_loop().run_in_executor(None, history_index.backfill)
+
+    # Obsidian vault index (notes, tags, links, tasks, full text), kept fresh by a watcher
+    if obsidian and obsidian.is_valid:
+        asyncio.get_running_loop().run_in_executor(None, obsidian.start_watching)
+
     # MemPalace Wake-up & Indexing
     if hasattr(rag, 'mempalace') and rag.mempalace.is_available():
         _loop = asyncio.get_running_loop()
@@ -616,7 +658,18 @@ async def memory_autosave_loop():
                 if obsidian and obsidian.is_valid:
                     _loop.run_in_executor(None, obsidian.mine_vault, rag.mempalace)
                 memory_autosave_loop.last_mine = now
-            
+
+            # Move idle sessions to the compressed cold tier (Daily)
+            if now - getattr(memory_autosave_loop, "last_archive", 0) > 86400:
+                memory_autosave_loop.last_archive = now
+                asyncio.get_running_loop().run_in_executor(
+                    None, unified_memory.store.archive_idle, config.get("SESSION_ARCHIVE_DAYS", 30))
+
+            # Keep the palace under its drawer budget (Every 6 hours)
+            if now - getattr(memory_autosave_loop, "last_compact", 0) > 21600:
+                memory_autosave_loop.last_compact = now
+                asyncio.create_task(palace_compactor.compact(config.get("PALACE_MAX_DRAWERS", 50000)))
+
             # Periodic Cache Cleanup (Every 6 hours)
             if not hasattr(memory_autosave_loop, "last_cleanup"):
                 memory_autosave_loop.last_cleanup = now
@@ -629,6 +682,15 @@ async def memory_autosave_loop():
         except Exception as e:
             logger.error(f"[Hub] Periodic Mine error: {e}")
 
+async def conversation_summary_loop():
+    """Background hierarchical summarization of long conversations."""
+    while True:
+        await asyncio.sleep(300)  # Every 5 minutes
+        try:
+            await unified_memory.summarize_pending()
+        except Exception as e:
+            logger.error(f"[Memory] Summarizer error: {e}")
+
 async def handle_purge(req):
     """Clean system caches and session memory."""
     try:
@@ -794,6 +856,7 @@ def build_hub_app():
     app.router.add_post("/api/sessions/pin", handle_pin_session)
     app.router.add_delete("/api/sessions/delete", handle_delete_session)
     app.router.add_get("/api/history", handle_history)
+    app.router.add_get("/api/history/search", handle_history_search)
     app.router.add_get("/api/relationship", handle_relationship)
     app.router.add_post("/api/chat", handle_chat_api)
     app.router.add_post("/api/purge", handle_purge)
@@ -857,44 +920,103 @@ def build_hub_app():
     
     # --- Background Tasks ---
     async def knowledge_ingestion_loop():
-        """Watches data/knowledge/ and auto-ingests new files."""
+        """Watches data/knowledge/ and ingests new or edited files within seconds."""
         knowledge_dir = BASE / "data" / "knowledge"
         knowledge_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Persistent tracking
-        ingested_files = set()
-        track_file = BASE / "data" / "ingested_files.json"
-        if track_file.exists():
-            try: ingested_files.update(json.loads(track_file.read_text()))
-            except: pass
-
-        logger.info("[RAG] 📚 Knowledge Ingestion Task Started.")
-        
-        while True:
+        _loop = asyncio.get_running_loop()
+
+        # Manifest keyed by path + content hash (mtime shortcut skips unchanged files)
+        manifest = FileManifest(BASE / "data" / "knowledge_manifest.json", root=knowledge_dir)
+        legacy_file = BASE / "data" / "ingested_files.json"
+        if not len(manifest) and legacy_file.exists():
             try:
-                _loop = asyncio.get_running_loop()
-                for file in knowledge_dir.iterdir():
-                    if file.is_file() and file.name not in ingested_files:
-                        logger.info(f"[RAG] 📖 Ingesting: {file.name}")
-                        ingested_files.add(file.name) # Mark BEFORE to prevent loop on crash
-                        
-                        try:
-                            # Move to executor to prevent blocking the main loop
-                            success = await _loop.run_in_executor(None, rag.ingest_document, str(file))
-                            if success:
-                                logger.info(f"[RAG] ✅ Ingested {file.name}")
-                            else:
-                                logger.warning(f"[RAG] ⚠️ RAG returned False for {file.name}")
-                        except Exception as ingest_err:
-                            logger.error(f"[RAG] 💥 Crash during ingestion of {file.name}: {ingest_err}")
-                        
-                        # Save progress
-                        track_file.write_text(json.dumps(list(ingested_files)))
+                for name in json.loads(legacy_file.read_text()):
+                    if (knowledge_dir / name).is_file():
+                        manifest.record(knowledge_dir / name)
+                manifest.save()
+                logger.info(f"[RAG] Migrated {len(manifest)} entries from ingested_files.json")
             except Exception as e:
-                logger.error(f"[RAG] ❌ Loop error: {e}")
-            
-            await asyncio.sleep(60) # Check every minute
-            
+                logger.warning(f"[RAG] Legacy tracking migration failed: {e}")
+
+        # Bounded ingestion queue: the watcher blocks (backpressure) instead of piling up work
+        queue = asyncio.Queue(maxsize=KNOWLEDGE_QUEUE_SIZE)
+        queued = set()
+        active = set()   # Being ingested right now: a second worker must not file the same path
+        rerun = set()    # Changed again while being ingested
+
+        async def _enqueue(path: str):
+            if path in active:
+                rerun.add(path)  # Its worker picks the change up once the current pass finishes
+                return
+            if path in queued: return
+            queued.add(path)
+            await queue.put(path)
+
+        def _on_change(paths):
+            # Runs on the watcher thread: wait for queue room so a burst is throttled, not dropped
+            for p in paths:
+                asyncio.run_coroutine_threadsafe(_enqueue(p), _loop).result()
+
+        def _process(path: str) -> str:
+            file = Path(path)
+            if not file.is_file():
+                if not manifest.forget(file):
+                    return "skipped"
+                rag.delete_document(rag.document_id(path))
+                return "forgotten"
+            changed, digest = manifest.check(file)
+            if not changed:
+                return "unchanged"
+            logger.info(f"[RAG] 📖 Ingesting: {file.name}")
+            if not rag.ingest_document(str(file)):
+                return "failed"  # Not recorded: retried on its next change or the next start
+            manifest.record(file, digest)
+            return "ingested"
+
+        async def _worker():
+            while True:
+                path = await queue.get()
+                queued.discard(path)
+                active.add(path)
+                try:
+                    while True:
+                        result = await _loop.run_in_executor(None, _process, path)
+                        if result == "ingested":
+                            logger.info(f"[RAG] ✅ Ingested {Path(path).name}")
+                        elif result == "failed":
+                            logger.warning(f"[RAG] ⚠️ RAG returned False for {Path(path).name}")
+                        if path not in rerun:
+                            break
+                        rerun.discard(path)
+                except Exception as ingest_err:
+                    logger.error(f"[RAG] 💥 Crash during ingestion of {Path(path).name}: {ingest_err}")
+                finally:
+                    active.discard(path)
+                    rerun.discard(path)
+                    queue.task_done()
+                    if queue.empty():
+                        await _loop.run_in_executor(None, manifest.save)
+
+        workers = [asyncio.create_task(_worker()) for _ in range(KNOWLEDGE_WORKERS)]
+        watcher = DirectoryWatcher(knowledge_dir, _on_change, debounce=1.5)
+        try:
+            # Catch up on anything that changed while the hub was down
+            for key in manifest.keys():
+                await _enqueue(str(knowledge_dir / key))
+            existing = await _loop.run_in_executor(
+                None, lambda: [str(f) for f in knowledge_dir.rglob("*") if f.is_file()]
+            )
+            for path in existing:
+                await _enqueue(path)
+
+            watcher.start()
+            logger.info(f"[RAG] 📚 Knowledge Ingestion Task Started ({watcher.backend}).")
+            await asyncio.Event().wait()
+        finally:
+            watcher.stop()
+            for w in workers: w.cancel()
+            manifest.save()
+
     async def reminder_check_loop():
         """Periodically check for due reminders and notify satellites."""
         while True:
@@ -921,6 +1043,7 @@ def build_hub_app():
         app['bio_sync_task'].cancel()
         app['reminder_task'].cancel()
         await asyncio.gather(app['knowledge_task'], app['bio_sync_task'], app['reminder_task'], return_exceptions=True)
+        await queue_pool.close()
         
     app.on_startup.append(start_background_tasks)
     app.on_cleanup.append(cleanup_background_tasks)
@@ -1,16 +1,21 @@
 
-import os
+import hashlib
 import logging
 from pathlib import Path
+from core.file_manifest import FileManifest
+from core.vault_index import VaultIndex
 
 logger = logging.getLogger("Obsidian")
 
+DATA_DIR = Path(__file__).parent.parent / "data"
+
 class ObsidianConnector:
     """Manages connection and interaction with an Obsidian vault."""
     
     def __init__(self, vault_path=None):
         self.vault_path = vault_path
         self.is_valid = False
+        self.index = None
         if vault_path:
             self.validate_vault()
 
@@ -23,6 +28,11 @@ class ObsidianConnector:
         path = Path(self.vault_path)
         if path.exists() and path.is_dir():
              self.is_valid = True
+             try:
+                 self.index = VaultIndex(path)
+             except Exception as e:
+                 logger.error(f"Vault index unavailable, falling back to disk scans: {e}")
+                 self.index = None
              logger.info(f"Obsidian Vault linked: {self.vault_path}")
              return True
         
@@ -30,14 +40,45 @@ class ObsidianConnector:
         logger.warning(f"Invalid Obsidian Vault path: {self.vault_path}")
         return False
 
+    def _fresh_index(self):
+        """The vault index, refreshed once per process unless the watcher keeps it current."""
+        if self.index is not None and not self.index.fresh:
+            self.index.refresh()
+        return self.index
+
+    def start_watching(self):
+        """Keep the vault index current from filesystem events."""
+        if self.is_valid and self.index is not None:
+            self.index.start_watching()
+
     def list_notes(self):
         """List all markdown notes in the vault."""
         if not self.is_valid: return []
+        if self._fresh_index() is not None:
+            return self.index.list_notes()
         notes = []
         for p in Path(self.vault_path).rglob("*.md"):
             notes.append(str(p.relative_to(self.vault_path)))
         return notes
 
+    def search_notes(self, query, limit=10, tag=None):
+        """Full-text search over the vault: [{path, title, snippet, score}]."""
+        if not self.is_valid or self._fresh_index() is None: return []
+        return self.index.search(query, limit, tag=tag)
+
+    def get_backlinks(self, note):
+        """Notes that [[link]] to `note`."""
+        if not self.is_valid or self._fresh_index() is None: return []
+        return self.index.backlinks(note)
+
+    def get_open_tasks(self, relative_path=None):
+        """Unchecked `- [ ]` tasks of one note, or of the whole vault."""
+        if not self.is_valid: return []
+        if self._fresh_index() is not None:
+            return [t["text"] for t in self.index.open_tasks(relative_path)]
+        content = self.read_note(relative_path) if relative_path else None
+        return [line.strip().replace('- [ ]', '').strip() for line in (content or "").split('\n') if '- [ ]' in line]
+
     def read_note(self, relative_path):
         """Read content of a specific note."""
         if not self.is_valid: return None
@@ -57,25 +98,78 @@ class ObsidianConnector:
         try:
             full_path.parent.mkdir(parents=True, exist_ok=True)
             full_path.write_text(content, encoding="utf-8")
+            if self.index is not None:
+                self.index.index_note(relative_path)
             return True
         except Exception as e:
             logger.error(f"Error creating note {relative_path}: {e}")
             return False
 
+    @staticmethod
+    def note_id(relative_path) -> str:
+        """Stable palace source ID for a note (survives re-syncs, unlike random drawer IDs)."""
+        return f"obsidian://{Path(relative_path).as_posix()}"
+
+    def _sync_manifest(self) -> FileManifest:
+        tag = hashlib.md5(str(Path(self.vault_path).resolve()).encode()).hexdigest()[:10]
+        return FileManifest(DATA_DIR / f"obsidian_sync_{tag}.json", root=self.vault_path)
+
+    def sync_vault(self, palace_bridge) -> dict:
+        """
+        Incrementally sync the vault into the MemPalace.
+        Only notes whose content hash changed are re-filed (upserted under their
+        stable note ID); notes deleted from the vault have their drawers removed.
+        """
+        stats = {"updated": 0, "removed": 0, "unchanged": 0}
+        if not self.is_valid or not palace_bridge: return stats
+
+        vault = Path(self.vault_path)
+        manifest = self._sync_manifest()
+        seen = set()
+
+        for note_path in self.list_notes():
+            full_path = vault / note_path
+            key = manifest.key(full_path)
+            seen.add(key)
+            changed, digest = manifest.check(full_path)
+            if not changed:
+                stats["unchanged"] += 1
+                continue
+
+            if key not in manifest:
+                # First sync of this note: drop drawers left by the old full re-mining
+                palace_bridge.delete_source(note_path)
+
+            content = self.read_note(note_path)
+            if content and content.strip():
+                palace_bridge.upsert_document(
+                    self.note_id(note_path),
+                    content,
+                    room="obsidian",
+                    metadata={"type": "obsidian_note", "note": Path(note_path).as_posix()}
+                )
+            else:
+                palace_bridge.delete_source(self.note_id(note_path))
+            manifest.record(full_path, digest)
+            stats["updated"] += 1
+
+        for key in manifest.keys():
+            if key not in seen:
+                palace_bridge.delete_source(self.note_id(key))
+                manifest.forget(vault / key)
+                stats["removed"] += 1
+
+        manifest.save()
+        return stats
+
     def mine_vault(self, palace_bridge):
-        """Index the entire vault into the MemPalace world context."""
+        """Index the vault into the MemPalace world context (incremental)."""
         if not self.is_valid or not palace_bridge: return False
-        logger.info(f" [Obsidian] ⛏️ Starting Mnemonic Mining of vault: {self.vault_path}")
+        logger.info(f" [Obsidian] ⛏️ Syncing vault: {self.vault_path}")
         try:
-            notes = self.list_notes()
-            for note_path in notes:
-                content = self.read_note(note_path)
-                if content:
-                    palace_bridge.add_memory(
-                        text=content,
-                        metadata={"source": note_path, "type": "obsidian_note"},
-                        room="obsidian"
-                    )
+            stats = self.sync_vault(palace_bridge)
+            logger.info(f" [Obsidian] Vault sync done: {stats['updated']} updated, "
+                        f"{stats['removed']} removed, {stats['unchanged']} unchanged")
             return True
         except Exception as e:
             logger.error(f" [Obsidian] Mining Error: {e}")
@@ -93,9 +187,19 @@ class ObsidianConnector:
         return self.read_note(rel_path)
 
     def append_to_daily(self, text):
+        """Append a log entry to today's daily note without reading or rewriting it."""
+        if not self.is_valid: return False
         rel_path = self.get_daily_note_path()
-        content = self.read_note(rel_path) or ""
         import datetime
         timestamp = datetime.datetime.now().strftime("%H:%M")
-        new_content = f"{content}\n\n### Aiko Log [{timestamp}]\n{text}\n"
-        return self.create_note(rel_path, new_content)
+        full_path = Path(self.vault_path) / rel_path
+        try:
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(full_path, "a", encoding="utf-8") as f:
+                f.write(f"\n\n### Aiko Log [{timestamp}]\n{text}\n")
+            if self.index is not None:
+                self.index.index_note(rel_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error appending to daily note {rel_path}: {e}")
+            return False
@@ -0,0 +1,224 @@
+"""
+AIKO PALACE COMPACTOR
+═════════════════════
+Importance-scored forgetting for the conversational part of MemPalace.
+
+Every chat turn is filed into the palace, so without eviction the collection
+(and vector search latency) grows forever. When the palace holds more than
+PALACE_MAX_DRAWERS drawers, the compactor scores conversational drawers by
+importance × recency and folds the lowest-scoring ones, grouped by user and
+room, into summary drawers (or simply evicts them when no LLM is available).
+
+Mined project/vault files are never touched, and neither are drawers marked
+pinned, high-importance or high-affection, nor memories of pinned sessions or
+of users whose affection is at or above KEEP_AFFECTION. When the LLM cannot
+produce a summary, the batch is kept as-is for a later run rather than lost.
+"""
+
+import math
+import heapq
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("PalaceCompactor")
+
+DEFAULT_MAX_DRAWERS = 50000
+LOW_WATERMARK = 0.9        # Compact down to 90% of the budget so runs don't fire every cycle
+PAGE_SIZE = 1000           # Metadata page size for collection.get
+MERGE_GROUP = 20           # Drawers folded into one summary drawer
+HALF_LIFE_DAYS = 30.0
+KEEP_IMPORTANCE = 8        # Drawer `importance` at or above this is never forgotten
+KEEP_AFFECTION = 80        # Drawer or session `affection` at or above this is never forgotten
+MAX_SUMMARY_CHARS = 1500
+
+# Conversational drawer kinds (by `type`, else `source_file`); anything else is never forgotten
+TYPE_IMPORTANCE = {
+    "chat_history": 1.0,     # Raw single turns
+    "conversation": 1.5,     # User/assistant exchange
+    "archived_chat": 2.0,    # Whole stretches already out of the raw window
+    "palace_summary": 3.0,   # Output of a previous compaction
+}
+
+MERGE_PROMPT = (
+    "These are old memories of conversations between {user} and Aiko. Merge them into one "
+    "memory of at most 8 sentences. Keep facts about the user, promises, decisions and emotional "
+    "moments; drop greetings and small talk. No preamble.\n\n{body}"
+)
+
+
+def _kind(meta: Dict) -> Optional[str]:
+    kind = meta.get("type") or meta.get("source_file")
+    return kind if kind in TYPE_IMPORTANCE else None
+
+
+def _timestamp(meta: Dict) -> float:
+    ts = meta.get("timestamp")
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return datetime.fromisoformat(str(meta.get("filed_at"))).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def score(meta: Dict, now: float, affection: int = 0) -> float:
+    """Importance × recency; repeated sightings and the user's affection slow forgetting down."""
+    importance = TYPE_IMPORTANCE.get(_kind(meta), 1.0) * (1 + float(meta.get("importance", 0)) / 10)
+    importance *= 1 + math.log(max(1, int(meta.get("seen_count", 1))))
+    importance *= 1 + max(0, affection) / 100
+    age_days = max(0.0, now - _timestamp(meta)) / 86400
+    recency = math.exp(-age_days * math.log(2) / HALF_LIFE_DAYS)
+    return importance * (0.1 + recency)
+
+
+def is_protected(meta: Dict) -> bool:
+    return (bool(meta.get("pinned"))
+            or float(meta.get("importance", 0)) >= KEEP_IMPORTANCE
+            or float(meta.get("affection", 0)) >= KEEP_AFFECTION)
+
+
+class PalaceCompactor:
+    """Keeps the palace under a drawer budget by merging/evicting low-value chat drawers."""
+
+    def __init__(self, palace, llm: Callable[[str], Awaitable[str]] = None, store=None):
+        self.palace = palace
+        self.llm = llm
+        self.store = store
+        self._running = False
+
+    def _sessions(self) -> Dict[str, Dict]:
+        if self.store is None:
+            from core.conversation_store import get_conversation_store
+            self.store = get_conversation_store()
+        return self.store.load()
+
+    # --- Selection ---
+
+    def _select(self, excess: int) -> List[Tuple[float, str, Dict]]:
+        """Page through drawer metadata and keep the `excess` lowest-scoring eligible drawers."""
+        now = datetime.now().timestamp()
+        sessions = self._sessions()
+        worst: List[Tuple[float, str, Dict]] = []  # max-heap on score via negation
+        offset = 0
+        while True:
+            page = self.palace.collection.get(include=["metadatas"], limit=PAGE_SIZE, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for drawer_id, meta in zip(ids, page.get("metadatas") or [{}] * len(ids)):
+                meta = meta or {}
+                if _kind(meta) is None or is_protected(meta):
+                    continue
+                session = sessions.get(str(meta.get("user_id")), {})
+                session = session if isinstance(session, dict) else {}
+                affection = session.get("affection", 0)
+                if session.get("pinned") or affection >= KEEP_AFFECTION:
+                    continue
+                s = score(meta, now, affection)
+                item = (-s, drawer_id, meta)
+                if len(worst) < excess:
+                    heapq.heappush(worst, item)
+                elif -s > worst[0][0]:
+                    heapq.heapreplace(worst, item)
+            offset += len(ids)
+        return sorted(((-s, drawer_id, meta) for s, drawer_id, meta in worst), key=lambda x: x[0])
+
+    # --- Compaction ---
+
+    async def compact(self, max_drawers: int = None) -> Dict[str, int]:
+        """Bring the palace back under budget. Returns {'merged', 'evicted', 'summaries'}."""
+        stats = {"merged": 0, "evicted": 0, "summaries": 0}
+        if self._running or not self.palace.is_available():
+            return stats
+        self._running = True
+        try:
+            budget = int(max_drawers or DEFAULT_MAX_DRAWERS)
+            count = await asyncio.to_thread(self.palace.collection.count)
+            if count <= budget:
+                return stats
+            excess = count - int(budget * LOW_WATERMARK)
+            victims = await asyncio.to_thread(self._select, excess)
+            if not victims:
+                logger.warning(f" [Compactor] Palace over budget ({count}/{budget}) but nothing is evictable.")
+                return stats
+
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            metas = {drawer_id: meta for _, drawer_id, meta in victims}
+            for _, drawer_id, meta in victims:
+                groups.setdefault((str(meta.get("user_id", "global")), meta.get("room", "conversations")), []).append(drawer_id)
+
+            for (user_id, room), ids in groups.items():
+                for i in range(0, len(ids), MERGE_GROUP):
+                    batch = ids[i:i + MERGE_GROUP]
+                    if self.llm is not None and len(batch) > 1:
+                        # A failed merge keeps the originals; the next run retries them
+                        if await self._merge(user_id, room, batch):
+                            stats["merged"] += len(batch)
+                            stats["summaries"] += 1
+                    else:
+                        await self._evict(batch, [metas[i] for i in batch])
+                        stats["evicted"] += len(batch)
+
+            self.palace.mark_written()
+            logger.info(f" [Compactor] 🧹 Palace {count}/{budget}: merged {stats['merged']} drawers into "
+                        f"{stats['summaries']} summaries, evicted {stats['evicted']}.")
+        except Exception as e:
+            logger.error(f" [Compactor] Compaction error: {e}")
+        finally:
+            self._running = False
+        return stats
+
+    async def _merge(self, user_id: str, room: str, ids: List[str]) -> bool:
+        """Replace a batch of drawers with one LLM-written summary drawer."""
+        got = await asyncio.to_thread(self.palace.collection.get, ids=ids, include=["documents", "metadatas"])
+        docs = got.get("documents") or []
+        metas = got.get("metadatas") or []
+        if not docs:
+            return False
+        order = sorted(range(len(docs)), key=lambda i: _timestamp(metas[i] or {}))
+        body = "\n---\n".join(docs[i][:800] for i in order)
+        try:
+            text = (await self.llm(MERGE_PROMPT.format(user=user_id, body=body)) or "").strip()[:MAX_SUMMARY_CHARS]
+        except Exception as e:
+            logger.error(f" [Compactor] LLM error: {e}")
+            return False
+        if not text:
+            return False
+
+        stamps = [_timestamp(m or {}) for m in metas]
+        summary_id = f"drawer_{self.palace.wing}_{room}_summary_{hashlib.sha256('|'.join(sorted(ids)).encode()).hexdigest()[:24]}"
+        summary_meta = {
+            "wing": self.palace.wing,
+            "room": room,
+            "source_file": "palace_summary",
+            "type": "palace_summary",
+            "user_id": user_id,
+            "merged": len(ids),
+            "timestamp": max(stamps, default=0.0),
+            "added_by": "Aiko",
+            "filed_at": datetime.now().isoformat(),
+            "lexical_id": summary_id,
+        }
+        await asyncio.to_thread(
+            self.palace.collection.upsert, documents=[text], ids=[summary_id], metadatas=[summary_meta])
+        # Only drop the originals once the summary is actually readable back
+        written = await asyncio.to_thread(self.palace.collection.get, ids=[summary_id], include=["documents"])
+        if (written.get("documents") or [None])[0] != text:
+            logger.error(f" [Compactor] Summary drawer {summary_id} was not stored; keeping {len(ids)} drawers.")
+            return False
+        lexical = getattr(self.palace, "lexical", None)
+        if lexical is not None:
+            await asyncio.to_thread(lexical.add, text, summary_meta, summary_id)
+        await self._evict(ids, metas)
+        return True
+
+    async def _evict(self, ids: List[str], metas: List[Dict]):
+        """Delete drawers and the keyword-index entries of the memories they were filed from."""
+        await asyncio.to_thread(self.palace.collection.delete, ids=ids)
+        lexical = getattr(self.palace, "lexical", None)
+        lexical_ids = {m.get("lexical_id") for m in metas if m and m.get("lexical_id")}
+        if lexical is not None and lexical_ids:
+            await asyncio.to_thread(lexical.delete, list(lexical_ids))
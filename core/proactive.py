@@ -63,8 +63,10 @@ class ProactiveAgent:
                     mem = get_unified_memory()
                     from core.config_manager import config
                     uid = config.get("username", "omax")
-                    history = mem.get_history(uid, limit=100)
-                    await memory_consolidator.consolidate(history)
+                    history = mem.get_messages_since(uid, memory_consolidator.checkpoint(uid))
+                    # Off-peak window: chunks stop at 5 AM and resume from the checkpoint next night
+                    deadline = now.replace(hour=5, minute=0, second=0, microsecond=0).timestamp()
+                    await memory_consolidator.consolidate(history, user_id=uid, deadline=deadline)
                     self.last_consolidation = now.date()
                     
                     # Wake up refreshed: Boost Serotonin/Dopamine, Flush Cortisol/Adrenaline
@@ -145,15 +147,12 @@ class ProactiveAgent:
             return
 
         try:
-            # Query the daily note content via our bridge
-            daily_note = self.obsidian.get_daily_note_content()
-            if not daily_note: return
-            
-            todos = [line.strip() for line in daily_note.split('\n') if '- [ ]' in line]
+            # Open tasks of today's daily note, straight from the vault index
+            todos = self.obsidian.get_open_tasks(self.obsidian.get_daily_note_path())
             
             if todos:
                 self.last_obsidian_nag = current_time
-                task_snippet = todos[0].replace('- [ ]', '').strip()
+                task_snippet = todos[0]
                 
                 # Ask Aiko's personality how to nag
                 prompt = (
@@ -0,0 +1,164 @@
+"""
+AIKO QUEUE WORKERS
+══════════════════
+Concurrent consumer pool for the bot message queues.
+
+Messages from every input queue are claimed in batches and fanned out to
+per-conversation lanes: turns of the same conversation run strictly in the
+order they were queued, different conversations run side by side, and a
+semaphore caps how many handlers are active at once. A failed turn is retried
+in its lane with exponential backoff, up to MAX_DELIVERIES deliveries in total.
+Claimed messages keep their lease extended while they wait or run, and the
+time each message spent queued before its handler started is reported per queue.
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from core.message_queue import MessageQueue, MAX_DELIVERIES
+
+logger = logging.getLogger("QueueWorkers")
+
+DEFAULT_CONCURRENCY = 4
+PREFETCH = 2              # Claimed messages allowed per handler slot (waiting in lanes)
+WAIT_SAMPLES = 200        # Recent wait times kept per queue for the stats
+RETRY_DELAY = 2.0         # Seconds before the first retry of a failed turn, doubled per attempt
+MAX_RETRY_DELAY = 30.0
+
+
+def conversation_key(queue_name: str, payload: Dict) -> str:
+    """One platform user is one conversation (queues are claimed separately, so order only holds per queue)."""
+    return f"{queue_name}:{payload.get('user_id', '')}"
+
+
+class ConsumerPool:
+    """Claims from several queues and runs `handler(queue_name, message)` with per-key ordering."""
+
+    def __init__(self, queue: MessageQueue, handler: Callable[[str, Dict], Awaitable[None]],
+                 queue_names: List[str], processor_id: str = None, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 key: Callable[[str, Dict], str] = conversation_key):
+        self.queue = queue
+        self.handler = handler
+        self.queue_names = list(queue_names)
+        self.processor_id = processor_id
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.key = key
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lanes: Dict[str, deque] = {}
+        self._tasks: Set[asyncio.Task] = set()  # Running lanes, so they can be cancelled on shutdown
+        self._held: Dict[int, str] = {}  # Claimed, not yet finished: message id -> queue name
+        self._active = 0
+        self._last_extend = 0
+        self._next_queue = 0
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in self.queue_names}
+        self._counts = {name: {"processed": 0, "failed": 0} for name in self.queue_names}
+
+    # ── Dispatch ──
+
+    def poll(self) -> int:
+        """Claim what the pool has room for and start lanes. Call from the event loop."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._extend_leases()
+
+        room = self.max_concurrency * PREFETCH - len(self._held)
+        claimed = 0
+        # Rotate the starting queue so a busy platform cannot starve the other
+        order = self.queue_names[self._next_queue:] + self.queue_names[:self._next_queue]
+        self._next_queue = (self._next_queue + 1) % len(self.queue_names)
+        for name in order:
+            if room <= 0:
+                break
+            for msg in self.queue.dequeue(name, processor_id=self.processor_id, batch_size=room):
+                self._held[msg['id']] = name
+                key = self.key(name, msg['payload'])
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = self._lanes[key] = deque()
+                    task = asyncio.create_task(self._run_lane(key, lane))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                lane.append((name, msg))
+                claimed += 1
+                room -= 1
+        return claimed
+
+    async def _run_lane(self, key: str, lane: deque):
+        """Process one conversation's messages in order; the lane closes when it runs dry."""
+        try:
+            while lane:
+                name, msg = lane[0]
+                queued_at = msg['payload'].get('timestamp') or msg['created_at']
+                attempts = msg['retry_count']
+                try:
+                    while True:
+                        async with self._slots:
+                            if attempts == msg['retry_count']:
+                                self._waits[name].append(max(0.0, time.time() - queued_at))
+                            self._active += 1
+                            msg['attempt'] = attempts + 1  # Lets the handler skip side effects of an earlier delivery
+                            try:
+                                await self.handler(name, msg)
+                                self.queue.acknowledge(msg['id'])
+                                self._counts[name]["processed"] += 1
+                                break
+                            except Exception as e:
+                                attempts += 1
+                                self._counts[name]["failed"] += 1
+                                logger.error(f"[Queue] Handler failed on {name} #{msg['id']} "
+                                             f"(attempt {attempts}/{MAX_DELIVERIES}): {e}")
+                            finally:
+                                self._active -= 1
+                        if attempts >= MAX_DELIVERIES:
+                            logger.error(f"[Queue] Dropping #{msg['id']} after {MAX_DELIVERIES} attempts")
+                            self.queue.acknowledge(msg['id'])
+                            break
+                        # Retry in place after a backoff: the lane keeps the user's later turns behind
+                        # it, and its leases keep being extended while it waits
+                        await asyncio.sleep(min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+                finally:
+                    self._held.pop(msg['id'], None)
+                lane.popleft()
+        finally:
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+
+    async def close(self):
+        """Cancel the running lanes; their unacknowledged messages are redelivered once the leases expire."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _extend_leases(self):
+        """Keep claimed messages invisible to other consumers while they wait or run."""
+        now = time.time()
+        if not self._held or now - self._last_extend < self.queue.lease_seconds / 3:
+            return
+        self._last_extend = now
+        for message_id in list(self._held):
+            self.queue.extend_lease(message_id, processor_id=self.processor_id)
+
+    # ── Stats ──
+
+    def stats(self) -> Dict:
+        """Per-queue wait times (seconds from enqueue to handler start) and pool load."""
+        queues = {}
+        for name in self.queue_names:
+            waits = sorted(self._waits[name])
+            queues[name] = {
+                **self._counts[name],
+                "in_flight": sum(1 for q in self._held.values() if q == name),
+                "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "wait_p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                "wait_max": round(waits[-1], 3) if waits else 0.0,
+            }
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "conversations": len(self._lanes),
+            "queues": queues,
+        }
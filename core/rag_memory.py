@@ -1,15 +1,21 @@
 
 """
 AIKO RAG MEMORY SYSTEM
-Long-term semantic memory using ChromaDB (Local) or SharedMemoryServer (Remote).
+Long-term semantic memory using MemPalace, ChromaDB, an in-process vector store (Local)
+or SharedMemoryServer (Remote).
 """
 
 import os
 import uuid
 import time
-import requests
 import logging
-from .mempalace_bridge import MemPalaceRAG
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .mempalace_bridge import MemPalaceRAG, chunk_text
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from .dedup import get_dedup_index, dedup_scope
+from .memory_partitions import RoomRouter, is_visible, tag_owner
+from .remote_memory import RemoteMemoryClient
 from functools import lru_cache
 from dotenv import load_dotenv
 
@@ -22,6 +28,18 @@ EMBEDDING_MODEL_NAME = "nomic-embed-text"
 OLLAMA_BASE_URL = "http://127.0.0.1:11434"
 # If this ENV is set, we talk to the server instead of opening the local DB
 REMOTE_RAG_URL = os.getenv("REMOTE_RAG_URL") 
+# Hybrid retrieval: give up on embeddings after this long and answer from the keyword index
+VECTOR_TIMEOUT = float(os.getenv("RAG_VECTOR_TIMEOUT", "2.5"))
+VECTOR_COOLDOWN = 30  # seconds to stay lexical-only after a slow vector search
+KEYWORD_QUERY_MAX_TERMS = 3  # short queries answered lexically when there are enough exact hits
+
+
+class _KeywordOnly(Exception):
+    """Carries a keyword-only answer out of the cached search, so a degraded result is never cached."""
+
+    def __init__(self, hits: tuple):
+        super().__init__()
+        self.hits = hits
 
 class RAGMemorySystem:
     """Semantic long-term memory."""
@@ -32,12 +50,22 @@ class RAGMemorySystem:
         self.ef = None  # Embedding Function
         self._initialized = False
         self.remote_url = REMOTE_RAG_URL
+        self.remote = None  # RemoteMemoryClient when REMOTE_RAG_URL is set
+        self._fallback_tried = False
         self.use_mempalace = True # Dynamic switch
         self.mempalace = MemPalaceRAG()
+        self.lexical = LexicalIndex()
+        self.mempalace.lexical = self.lexical  # Filed documents and deleted sources stay in step
+        self.dedup = get_dedup_index()
+        self.router = RoomRouter()
+        self.local_store = None  # LocalVectorStore when MemPalace and ChromaDB are unavailable
+        self._vector_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="RAGVector")
+        self._vector_backoff_until = 0
             
     def _initialize(self):
         """Initialize ChromaDB or prepare remote client."""
         if self.remote_url:
+            self.remote = RemoteMemoryClient(self.remote_url, on_fallback=self._store_fallback)
             logger.info(f" [RAG] 🔗 Connected to Remote Memory: {self.remote_url}")
             self._initialized = True
             return
@@ -59,21 +87,28 @@ class RAGMemorySystem:
             from chromadb.utils import embedding_functions
         except ImportError as e:
             logger.error(f" [!] [RAG] Missing dependencies: {e}")
-            return
+            return self._init_local_store()
             
-        # Setup Ollama Embedding Function
+        # Setup Embedding Function (Ollama, or in-process with EMBEDDING_BACKEND=local)
+        collection_name = "aiko_memory_v2"
         try:
-            self.ef = embedding_functions.OllamaEmbeddingFunction(
-                model_name=EMBEDDING_MODEL_NAME,
-                url=f"{OLLAMA_BASE_URL}/api/embeddings"
-            )
+            from .embeddings import get_embedder, OllamaEmbedder
+            embedder = get_embedder()
+            if isinstance(embedder, OllamaEmbedder):
+                self.ef = embedding_functions.OllamaEmbeddingFunction(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    url=f"{OLLAMA_BASE_URL}/api/embeddings"
+                )
+            else:
+                self.ef = embedder
+                collection_name = "aiko_memory_v2_local"  # Different vector space, never mix with Ollama's
         except Exception as e:
             logger.error(f" [X] [RAG] Embedding Init Error: {e}")
-            return
+            return self._init_local_store()
 
         def _get_coll():
             client = chromadb.PersistentClient(path=CHROMA_PATH)
-            return client, client.get_or_create_collection(name="aiko_memory_v2", embedding_function=self.ef)
+            return client, client.get_or_create_collection(name=collection_name, embedding_function=self.ef)
 
         try:
             # Multi-threaded init with timeout to prevent Windows hang
@@ -90,14 +125,42 @@ class RAGMemorySystem:
             t.join(timeout=4.0)
             
             if not init_res["success"]:
-                logger.warning(" [!] [RAG] DB is LOCKED by another process. Running in Read-Only/Empty mode.")
-                return
+                logger.warning(" [!] [RAG] DB is LOCKED by another process. Falling back to local vector store.")
+                return self._init_local_store()
 
             self.client, self.collection = init_res["c"], init_res["coll"]
             logger.info(f" [OK] [RAG] Local DB Connected. Items: {self.collection.count()}")
             self._initialized = True
         except Exception as e:
             logger.error(f" [X] [RAG] Fatal DB Error: {e}")
+            self._init_local_store()
+
+    def _init_local_store(self):
+        """Third tier: in-process numpy vector store (no ChromaDB needed)."""
+        try:
+            from .embeddings import get_embedder, OllamaEmbedder
+            from .vector_store import LocalVectorStore, STORE_DIR
+            embedder = get_embedder()
+            store_dir = STORE_DIR if isinstance(embedder, OllamaEmbedder) else STORE_DIR.with_name("vector_store_local")
+            self.local_store = LocalVectorStore(embedder=embedder, store_dir=store_dir)
+            logger.info(f" [OK] [RAG] 🧮 Local vector store ready. Items: {self.local_store.count()}")
+            self._initialized = True
+        except Exception as e:
+            logger.error(f" [X] [RAG] Local vector store unavailable: {e}")
+
+    def _ensure_fallback_store(self):
+        """Remote mode: open the local store the first time the server is unreachable."""
+        if self.local_store is None and not self._fallback_tried:
+            self._fallback_tried = True
+            logger.warning(" [RAG] Remote memory unreachable, falling back to local vector store.")
+            self._init_local_store()
+
+    def _store_fallback(self, items: List[Dict]):
+        """Keep a batch the memory server rejected in the local store."""
+        self._ensure_fallback_store()
+        if self.local_store is not None:
+            self.local_store.add([i["text"] for i in items], [i["metadata"] for i in items],
+                                 ids=[i.get("id") or str(uuid.uuid4()) for i in items])
         
     def _ensure_initialized(self):
         if self._initialized: return
@@ -105,58 +168,210 @@ class RAGMemorySystem:
 
     def is_available(self) -> bool:
         self._ensure_initialized()
-        if self.remote_url: return True
-        return self.collection is not None
+        # The keyword index alone is enough to answer recalls
+        return self._vector_available() or self.lexical.enabled
         
     def add_memory(self, text: str, metadata: dict = None):
-        """Add a text snippet to memory (Local or Remote)."""
-        if not text.strip(): return
+        """
+        Add a text snippet to memory (Local or Remote) and to the keyword index.
+        Near-duplicates of a stored memory only refresh its seen_count / last_seen.
+        """
+        self.add_memories([(text, metadata)])
+
+    def add_memories(self, items: List[Tuple[str, dict]]):
+        """Batch form of add_memory: one embedding call for the whole batch where the backend allows it."""
         self._ensure_initialized()
+        pending = []  # (text, meta, doc_id, dedup scope)
+        for text, metadata in items:
+            if not text or not text.strip(): continue
+            meta = tag_owner(dict(metadata or {}))
+            meta.setdefault("timestamp", time.time())
+            doc_id = meta.pop("doc_id", None)  # Stable ID -> re-adding replaces instead of duplicating
+
+            scope = dedup_scope(meta)
+            if not doc_id:
+                dup = self.dedup.check(text, scope)
+                if dup:
+                    if self._touch_duplicate(dup):
+                        continue
+                    self.dedup.forget(dup["id"])  # Stale: the stored copy was evicted
 
+            lexical_id = self.lexical.add(text, meta, doc_id=doc_id)
+            if lexical_id:
+                meta["lexical_id"] = lexical_id  # Lets whoever evicts the vectors drop the keyword entry too
+            pending.append((text, meta, doc_id, scope))
+        if not pending: return
+        self._cached_search.cache_clear()
+
+        for (text, meta, doc_id, scope), refs in zip(pending, self._store_vectors(pending)):
+            if not doc_id and refs is not None:
+                self.dedup.add(text, scope, refs)
+
+    def _store_vectors(self, pending: List[tuple]) -> List:
+        """Write a batch to the active backend. Per item: stored ids ([] if unknown), None on failure."""
+        per_item = (len(pending) == 1 or (self.use_mempalace and self.mempalace.is_available())
+                    or (self.remote is not None and self.remote.available))  # The remote client batches itself
+        if per_item:
+            return [self._store_vector(text, meta, doc_id) for text, meta, doc_id, _ in pending]
+        if self.remote is not None:
+            self._ensure_fallback_store()
+
+        ids = [doc_id or str(uuid.uuid4()) for _, _, doc_id, _ in pending]
+        texts = [p[0] for p in pending]
+        metas = [p[1] for p in pending]
+        if self.remote is not None:
+            # Server unreachable: keep a local copy for reads and replay the batch to it later
+            self.remote.journal([_journal_item(text, meta, doc_id) for text, meta, doc_id, _ in pending])
+        try:
+            if self.local_store is not None:
+                self.local_store.add(texts, metas, ids=ids)
+            elif self.collection is not None:
+                self.collection.upsert(documents=texts, metadatas=metas, ids=ids)
+            else:
+                return [None] * len(pending)
+            return [[i] for i in ids]
+        except Exception as e:
+            logger.error(f"[RAG] Batch add error: {e}")
+            return [None] * len(pending)
+
+    def _store_vector(self, text: str, meta: dict, doc_id: str = None):
+        """Write to the active vector backend. Returns the stored ids ([] if unknown), None on failure."""
         if self.use_mempalace and self.mempalace.is_available():
-            self.mempalace.add_memory(text, metadata)
-            return
+            if doc_id:
+                self.mempalace.upsert_document(doc_id, text, metadata=meta)
+                return [doc_id]
+            return self.mempalace.add_memory(text, meta, room=meta.get("room", "general"), dedup=False)
         
-        if self.remote_url:
+        if self.remote is not None:
+            if self.remote.available:
+                self.remote.store(text, meta, doc_id)  # Batched in the background
+                return []
+            self.remote.journal([_journal_item(text, meta, doc_id)])
+            self._ensure_fallback_store()
+
+        if self.local_store is not None:
             try:
-                requests.post(f"{self.remote_url}/store", json={"text": text, "metadata": metadata}, timeout=5)
-                return
+                return self.local_store.add([text], [meta], ids=[doc_id] if doc_id else None)
             except Exception as e:
-                logger.error(f"[RAG] Remote store error: {e}")
-                return
+                logger.error(f"[RAG] Local store add error: {e}")
+            return None
 
-        if not self.collection: return
+        if not self.collection: return None
         try:
-            mem_id = str(uuid.uuid4())
-            meta = metadata or {}
-            meta["timestamp"] = time.time()
-            self.collection.add(documents=[text], metadatas=[meta], ids=[mem_id])
-            self.search_memory.cache_clear()
+            ids = [doc_id or str(uuid.uuid4())]
+            self.collection.upsert(documents=[text], metadatas=[meta], ids=ids)
+            return ids
         except Exception as e:
             logger.error(f"[RAG] Add Error: {e}")
+            return None
+
+    def _touch_duplicate(self, dup: dict) -> bool:
+        """Refresh the stored copy of a near-duplicate. False when that copy no longer exists."""
+        if self.use_mempalace and self.mempalace.is_available():
+            return self.mempalace.touch_drawers(dup["refs"], dup["seen_count"], dup["last_seen"])
+        if self.remote is not None:
+            if self.remote.available:
+                return True  # The server owns its vectors; the sighting is counted locally
+            self._ensure_fallback_store()  # Outage: the copy was written to the local fallback
+        if self.local_store is not None:
+            return self.local_store.update_meta(dup["refs"], {"seen_count": dup["seen_count"],
+                                                              "last_seen": dup["last_seen"]}) > 0
+        if not self.collection: return False
+        try:
+            existing = self.collection.get(ids=dup["refs"], include=[]).get("ids") or []
+            if existing:
+                self.collection.update(ids=existing, metadatas=[{"seen_count": dup["seen_count"],
+                                                                 "last_seen": dup["last_seen"]}] * len(existing))
+            return bool(existing)
+        except Exception as e:
+            logger.error(f"[RAG] Duplicate touch error: {e}")
+            return False
             
+    def search_memory(self, query: str, n_results: int = 3, room: str = None, user_id: str = None) -> tuple:
+        """
+        Hybrid recall: BM25 keyword hits fused with vector hits (reciprocal rank fusion).
+        Falls back to keyword-only when embeddings are unavailable or too slow.
+
+        Searches the partition the query belongs to (explicit room, keyword-routed
+        rooms, or the user's own memories) and widens to the whole store only when
+        that partition is too thin. With `user_id`, other users' memories never match.
+        Full answers are cached; keyword-only fallbacks are not, so recall recovers
+        as soon as the vector backend does.
+        """
+        try:
+            return self._cached_search(query, n_results, room, user_id)
+        except _KeywordOnly as fallback:
+            return fallback.hits
+
     @lru_cache(maxsize=128)
-    def search_memory(self, query: str, n_results: int = 3) -> tuple:
-        """Find relevant memories (Local or Remote)."""
+    def _cached_search(self, query: str, n_results: int, room: str, user_id: str) -> tuple:
         if not query.strip(): return ()
         self._ensure_initialized()
+        user_id = str(user_id) if user_id is not None else None
+        rooms = [room] if room else self.router.route(query)
+
+        lexical = self.lexical.search(query, n_results * 2, room=rooms, user_id=user_id)
+        if rooms and not room and len(lexical) < n_results:
+            lexical = _merge_hits(lexical, self.lexical.search(query, n_results * 2, user_id=user_id))
+
+        # Fast path: short keyword recalls with enough exact hits skip the embedding round trip
+        if len(lexical) >= n_results and len(tokenize(query)) <= KEYWORD_QUERY_MAX_TERMS:
+            return tuple(lexical[:n_results])
+        if not self._vector_available() or time.time() < self._vector_backoff_until:
+            raise _KeywordOnly(tuple(lexical[:n_results]))
+
+        future = self._vector_pool.submit(self._partitioned_search, query, n_results, room, user_id)
+        try:
+            vector = list(future.result(timeout=VECTOR_TIMEOUT))
+        except FutureTimeout:
+            logger.warning(f"[RAG] Vector search exceeded {VECTOR_TIMEOUT}s, answering from keyword index.")
+            self._vector_backoff_until = time.time() + VECTOR_COOLDOWN
+            raise _KeywordOnly(tuple(lexical[:n_results]))
 
+        if not lexical:
+            return tuple(vector[:n_results])
+        return tuple(reciprocal_rank_fusion([vector, lexical], n_results))
+
+    def _partitioned_search(self, query: str, n_results: int, room: str = None, user_id: str = None) -> List[Dict]:
+        """Vector search in the routed partition, widened to the whole store if it yields too little."""
+        where = self.router.partition(query, room, user_id)
+        hits = [h for h in self._vector_search(query, n_results * 2, where) if is_visible(h.get("meta"), user_id)]
+        if where is not None and not room and len(hits) < n_results:
+            wide = [h for h in self._vector_search(query, n_results * 4, None) if is_visible(h.get("meta"), user_id)]
+            hits = _merge_hits(hits, wide)
+        return hits[:n_results * 2]
+
+    def semantic_search(self, query: str, n_results: int = 3, where: dict = None) -> tuple:
+        """Filtered vector search without keyword fusion (what the memory server answers /retrieve with)."""
+        if not query.strip(): return ()
+        self._ensure_initialized()
+        return self._vector_search(query, n_results, where)
+
+    def _vector_available(self) -> bool:
+        if self.use_mempalace and self.mempalace.is_available(): return True
+        return bool(self.remote_url) or self.collection is not None or self.local_store is not None
+
+    def _vector_search(self, query: str, n_results: int, where: dict = None) -> tuple:
+        """Pure semantic search against the active backend (MemPalace, Remote, Chroma or local store)."""
         if self.use_mempalace and self.mempalace.is_available():
-            return self.mempalace.search_memory(query, n_results)
+            return self.mempalace.search_memory(query, n_results, where=where or None)
         
-        if self.remote_url:
+        if self.remote is not None:
+            hits = self.remote.retrieve(query, n_results, where) if self.remote.available else None
+            if hits is not None:
+                return tuple(hits)
+            self._ensure_fallback_store()
+
+        if self.local_store is not None:
             try:
-                resp = requests.post(f"{self.remote_url}/retrieve", json={"query": query, "n_results": n_results}, timeout=5)
-                if resp.status_code == 200:
-                    return tuple(resp.json().get("results", []))
-                return ()
+                return tuple(self.local_store.query(query, n_results, where=where))
             except Exception as e:
-                logger.error(f"[RAG] Remote search error: {e}")
+                logger.error(f"[RAG] Local store search error: {e}")
                 return ()
 
         if not self.collection: return ()
         try:
-            results = self.collection.query(query_texts=[query], n_results=n_results)
+            results = self.collection.query(query_texts=[query], n_results=n_results, where=where)
             memories = []
             if results["documents"]:
                 for i, doc in enumerate(results["documents"][0]):
@@ -168,23 +383,75 @@ class RAGMemorySystem:
             return ()
 
     def ingest_document(self, file_path: str) -> bool:
+        """
+        File a document as chunks, replacing its previous version. The vector
+        store and the keyword index hold the same chunks.
+        """
         if not self.is_available() or not os.path.exists(file_path): return False
         try:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 text = f.read()
-            if text:
-                self.add_memory(text, metadata={"source": os.path.basename(file_path)})
-                return True
-        except: return False
-        return False
+            if not text.strip():
+                return False
+            source_id = self.document_id(file_path)
+            meta = tag_owner({"source": os.path.basename(file_path), "timestamp": time.time()})
+            self._cached_search.cache_clear()
+            if self.use_mempalace and self.mempalace.is_available():
+                # Chunks, files and keyword-indexes the drawers (see MemPalaceRAG._file_chunks)
+                return self.mempalace.upsert_document(source_id, text, metadata=meta) > 0
+
+            chunks = [c["content"] for c in chunk_text(text, source_id)]
+            self.delete_document(source_id)
+            self.lexical.add_document(source_id, chunks, meta)
+            pending = [(chunk, dict(meta, source_id=source_id, chunk_index=i), f"{source_id}#{i}", None)
+                       for i, chunk in enumerate(chunks)]
+            return any(refs is not None for refs in self._store_vectors(pending))
+        except Exception as e:
+            logger.error(f"[RAG] Ingest error ({file_path}): {e}")
+            return False
+
+    @staticmethod
+    def document_id(file_path: str) -> str:
+        return f"file://{os.path.abspath(file_path)}"
+
+    def delete_document(self, source_id: str):
+        """Remove every chunk of a document filed by ingest_document, from vectors and keywords."""
+        self._ensure_initialized()
+        self.lexical.delete_source(source_id)
+        self._cached_search.cache_clear()
+        try:
+            if self.use_mempalace and self.mempalace.is_available():
+                self.mempalace.delete_source(source_id)
+            elif self.local_store is not None:
+                # The bare id is the unchunked copy filed by older versions
+                self.local_store.delete(ids=[source_id], where={"source_id": source_id})
+            elif self.collection is not None:
+                self.collection.delete(ids=[source_id])
+                self.collection.delete(where={"source_id": source_id})
+            # Remote mode: the memory server has no delete endpoint, so only the keyword entries go
+        except Exception as e:
+            logger.error(f"[RAG] Delete error ({source_id}): {e}")
 
     def get_memory_count(self) -> int:
         self._ensure_initialized()
-        if self.remote_url:
-            try:
-                resp = requests.get(f"{self.remote_url}/status", timeout=2)
-                return resp.json().get("memory_count", 0)
-            except: return 0
+        if self.remote is not None:
+            return self.remote.count()
         if self.use_mempalace and self.mempalace.is_available():
             return self.mempalace.get_memory_count()
+        if self.local_store is not None:
+            return self.local_store.count()
         return self.collection.count() if self.collection else 0
+
+
+def _journal_item(text: str, meta: dict, doc_id: str = None) -> Dict:
+    """A /store item as RemoteMemoryClient.store would have sent it."""
+    item = {"text": text, "metadata": meta}
+    if doc_id:
+        item["id"] = doc_id
+    return item
+
+
+def _merge_hits(first: List[Dict], second: List[Dict]) -> List[Dict]:
+    """Concatenate ranked hit lists, keeping the first occurrence of each text."""
+    seen = {h.get("text") for h in first}
+    return list(first) + [h for h in second if h.get("text") not in seen]
@@ -0,0 +1,383 @@
+"""
+AIKO REMOTE MEMORY CLIENT
+═════════════════════════
+Async client for a shared memory server (REMOTE_RAG_URL).
+
+One background event loop owns a keep-alive aiohttp session, so stores and
+retrievals reuse pooled connections instead of opening one per call and
+parking an executor thread on a blocking request. Stores return immediately
+and are flushed to `/store` in batches; multi-room queries fan out to one
+`/retrieve` per room in parallel; recent answers are served from a small
+read-through cache. Repeated failures open a circuit breaker, during which
+the caller uses its local store and failed batches are handed to `on_fallback`.
+Everything written during an outage is journaled to disk and replayed to
+`/store` once the server answers again (also after a restart).
+"""
+
+import os
+import json
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger("RemoteMemory")
+
+REQUEST_TIMEOUT = float(os.getenv("REMOTE_RAG_TIMEOUT", "5"))
+POOL_SIZE = int(os.getenv("REMOTE_RAG_POOL", "8"))
+TOKEN = os.getenv("MEMORY_SERVER_TOKEN", "")  # Shared secret the memory server checks
+TOKEN_HEADER = "X-Memory-Token"
+BATCH_MAX = 64           # Items per /store request
+BATCH_WINDOW = 0.5       # Seconds a store may wait for company before it is sent
+CACHE_SIZE = 256
+CACHE_TTL = 60           # Seconds a retrieve answer is reused
+STATUS_TTL = 30
+BREAKER_FAILURES = 3     # Consecutive failures that open the circuit
+BREAKER_RESET = 30       # Seconds before a half-open trial request
+JOURNAL_PATH = Path(__file__).parent.parent / "data" / "remote_journal.jsonl"
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> one half-open trial after a cooldown."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._count >= self.failures and time.time() - self._opened_at < self.reset_after
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._count < self.failures:
+                return True
+            if time.time() - self._opened_at < self.reset_after or self._trial:
+                return False
+            self._trial = True  # Half-open: let exactly one request probe the server
+            return True
+
+    def success(self):
+        with self._lock:
+            if self._count >= self.failures:
+                logger.info(" [Remote] ✅ Memory server reachable again, circuit closed.")
+            self._count, self._trial = 0, False
+
+    def failure(self):
+        with self._lock:
+            self._count += 1
+            self._trial = False
+            if self._count >= self.failures:
+                if time.time() - self._opened_at >= self.reset_after:
+                    logger.warning(f" [Remote] ⚡ Circuit open for {self.reset_after}s after {self._count} failures.")
+                self._opened_at = time.time()
+
+
+def split_rooms(where: Optional[Dict]) -> List[Optional[Dict]]:
+    """
+    Split a `room $in [...]` filter (top level or inside `$and`) into one
+    filter per room, so each room can be queried in parallel.
+    """
+    if not where:
+        return [where]
+    clauses = where.get("$and") if "$and" in where else [where]
+    for i, clause in enumerate(clauses):
+        rooms = (clause.get("room") or {}).get("$in") if isinstance(clause.get("room"), dict) else None
+        if rooms and len(rooms) > 1:
+            rest = clauses[:i] + clauses[i + 1:]
+            return [{"$and": rest + [{"room": r}]} if rest else {"room": r} for r in rooms]
+    return [where]
+
+
+def _interleave(result_lists: List[List[Dict]], n_results: int) -> List[Dict]:
+    """Round-robin merge of per-room rankings, dropping repeated texts."""
+    merged, seen = [], set()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank].get("text") not in seen:
+                seen.add(results[rank].get("text"))
+                merged.append(results[rank])
+    return merged[:n_results]
+
+
+class RemoteMemoryClient:
+    """Pooled, batched, cached client for the shared memory server."""
+
+    def __init__(self, base_url: str, on_fallback: Callable[[List[Dict]], None] = None,
+                 journal_path: Path = None):
+        self.base_url = base_url.rstrip("/")
+        self.on_fallback = on_fallback
+        self.journal_path = Path(journal_path or JOURNAL_PATH)
+        self._journal_lock = threading.Lock()
+        self._replaying = False
+        self.breaker = CircuitBreaker()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._status = (0.0, 0)
+        self._loop = asyncio.new_event_loop()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name="RemoteMemory").start()
+        self._ready.wait(timeout=5)
+        atexit.register(self.close)
+
+    # ── Event loop ──
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._flusher())
+        self._loop.create_task(self._replay())  # Writes journaled before a restart
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers={TOKEN_HEADER: TOKEN} if TOKEN else None)
+        return self._session
+
+    def _submit(self, coro, timeout: float):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
+    @property
+    def available(self) -> bool:
+        """False while the circuit is open; callers should use their local store."""
+        return not self.breaker.is_open
+
+    # ── Writes ──
+
+    def store(self, text: str, metadata: dict = None, doc_id: str = None):
+        """Queue a memory for the next batched /store. Returns immediately."""
+        item = {"text": text, "metadata": metadata or {}}
+        if doc_id:
+            item["id"] = doc_id
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    async def _flusher(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + BATCH_WINDOW
+            while len(batch) < BATCH_MAX:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._send_batch(batch)
+
+    async def _post_store(self, batch: List[Dict]):
+        session = await self._get_session()
+        async with session.post(f"{self.base_url}/store", json={"items": batch}) as resp:
+            resp.raise_for_status()
+
+    async def _send_batch(self, batch: List[Dict]):
+        if self.breaker.allow():
+            try:
+                await self._post_store(batch)
+                self._on_success()
+                self._invalidate()
+                return
+            except Exception as e:
+                self.breaker.failure()
+                logger.error(f" [Remote] Batch store of {len(batch)} failed: {e}")
+        self.journal(batch)
+        if self.on_fallback:
+            try:
+                # Local embedding is blocking work; keep it off the event loop
+                await self._loop.run_in_executor(None, self.on_fallback, batch)
+            except Exception as e:
+                logger.error(f" [Remote] Local fallback store failed: {e}")
+
+    def _on_success(self):
+        self.breaker.success()
+        if not self._replaying and self.journal_path.exists():
+            self._replaying = True
+            self._loop.call_soon_threadsafe(self._loop.create_task, self._replay())
+
+    # ── Outage journal ──
+
+    def journal(self, items: List[Dict]):
+        """Remember writes the server never got; they are replayed once it is reachable."""
+        if not items:
+            return
+        with self._journal_lock:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+
+    def _read_journal(self) -> List[Dict]:
+        with self._journal_lock:
+            if not self.journal_path.exists():
+                return []
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        items = []
+        for line in lines:
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(None)  # Torn line: counted so the trim below stays aligned
+        return items
+
+    def _trim_journal(self, sent: int):
+        """Drop the first `sent` entries, keeping anything journaled while the replay ran."""
+        with self._journal_lock:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                rest = f.readlines()[sent:]
+            if not rest:
+                self.journal_path.unlink()
+                return
+            tmp = self.journal_path.with_suffix(".tmp")
+            tmp.write_text("".join(rest), encoding="utf-8")
+            os.replace(tmp, self.journal_path)
+
+    async def _replay(self):
+        self._replaying = True
+        sent = 0
+        try:
+            entries = await self._loop.run_in_executor(None, self._read_journal)
+            while sent < len(entries) and self.breaker.allow():
+                chunk = entries[sent:sent + BATCH_MAX]
+                try:
+                    await self._post_store([item for item in chunk if item])
+                except Exception as e:
+                    self.breaker.failure()
+                    logger.warning(f" [Remote] Journal replay paused: {e}")
+                    break
+                self.breaker.success()
+                sent += len(chunk)
+            if sent:
+                await self._loop.run_in_executor(None, self._trim_journal, sent)
+                self._invalidate()
+                logger.info(f" [Remote] 📤 Replayed {sent} memories written during the outage.")
+        except Exception as e:
+            logger.error(f" [Remote] Journal replay error: {e}")
+        finally:
+            self._replaying = False
+
+    def flush(self, timeout: float = REQUEST_TIMEOUT + 1):
+        """Send everything queued so far (used on shutdown)."""
+        async def _drain():
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for i in range(0, len(batch), BATCH_MAX):
+                await self._send_batch(batch[i:i + BATCH_MAX])
+        try:
+            self._submit(_drain(), timeout)
+        except Exception as e:
+            logger.warning(f" [Remote] Flush incomplete: {e}")
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        self.flush()
+        if self._session is not None:
+            try:
+                self._submit(self._session.close(), 2)
+            except Exception:
+                pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # ── Reads ──
+
+    def _cache_key(self, query: str, n_results: int, where: Optional[Dict]) -> str:
+        return json.dumps([query, n_results, where], sort_keys=True, default=str)
+
+    def _cached(self, key: str, max_age: float) -> Optional[List[Dict]]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None or time.time() - entry[0] > max_age:
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, key: str, results: List[Dict]):
+        with self._cache_lock:
+            self._cache[key] = (time.time(), results)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def _invalidate(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def retrieve(self, query: str, n_results: int = 3, where: Dict = None) -> Optional[List[Dict]]:
+        """
+        Semantic search on the server. Returns None when the server cannot
+        answer (circuit open or request failed) and nothing usable is cached,
+        so the caller can fall back to its local store.
+        """
+        key = self._cache_key(query, n_results, where)
+        hit = self._cached(key, CACHE_TTL)
+        if hit is not None:
+            return hit
+        if not self.breaker.allow():
+            return self._cached(key, float("inf"))  # Stale beats nothing while the server is down
+        try:
+            results = self._submit(self._retrieve(query, n_results, where), REQUEST_TIMEOUT + 1)
+            self._on_success()
+        except Exception as e:
+            self.breaker.failure()
+            logger.error(f" [Remote] Retrieve failed: {e}")
+            return self._cached(key, float("inf"))
+        self._remember(key, results)
+        return results
+
+    async def _retrieve(self, query: str, n_results: int, where: Optional[Dict]) -> List[Dict]:
+        session = await self._get_session()
+
+        async def _one(filter_):
+            async with session.post(f"{self.base_url}/retrieve",
+                                    json={"query": query, "n_results": n_results, "where": filter_}) as resp:
+                resp.raise_for_status()
+                return (await resp.json()).get("results", [])
+
+        filters = split_rooms(where)
+        if len(filters) == 1:
+            return await _one(filters[0])
+        return _interleave(await asyncio.gather(*(_one(f) for f in filters)), n_results)
+
+    def count(self) -> int:
+        """Server-side memory count, cached briefly; last known value when unreachable."""
+        checked_at, last = self._status
+        if time.time() - checked_at < STATUS_TTL or not self.breaker.allow():
+            return last
+
+        async def _status():
+            session = await self._get_session()
+            async with session.get(f"{self.base_url}/status") as resp:
+                resp.raise_for_status()
+                return (await resp.json()).get("memory_count", 0)
+
+        try:
+            last = self._submit(_status(), REQUEST_TIMEOUT + 1)
+            self._on_success()
+        except Exception as e:
+            self.breaker.failure()
+            logger.error(f" [Remote] Status failed: {e}")
+        self._status = (time.time(), last)
+        return last
@@ -90,6 +90,16 @@ class MemoryCipher:
             system_logger.error(f"Memory Decryption Failed: {e}")
             raise
 
+    def encrypt_bytes(self, data: bytes) -> bytes:
+        return self.fernet.encrypt(data)
+
+    def decrypt_bytes(self, token: bytes) -> bytes:
+        try:
+            return self.fernet.decrypt(token)
+        except Exception as e:
+            system_logger.error(f"Memory Decryption Failed: {e}")
+            raise
+
 # Global Security Policy Engine & Cipher
 policy_engine = SecurityManager()
 memory_cipher = MemoryCipher()
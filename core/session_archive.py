@@ -0,0 +1,187 @@
+"""
+AIKO SESSION ARCHIVE
+════════════════════
+Cold tier for conversations nobody has touched in a while.
+
+Idle sessions are written to compressed JSONL segments grouped by the month
+of their last activity (zstd when `zstandard` is installed, gzip otherwise),
+encrypted with the same memory cipher as the hot store, and dropped from the
+hot store. A small catalog keeps enough metadata for the sidebar and points
+at the segment to read when a session is opened again. Segments are never
+appended to; when a session is deleted or restored its segment is rewritten
+without it, so forgotten conversations do not linger on disk.
+"""
+
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.security import memory_cipher
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("SessionArchive")
+
+ARCHIVE_DIR = Path(__file__).parent.parent / "data" / "archive"
+ZSTD_LEVEL = 10
+PLAIN_MAGIC = (b"\x28\xb5\x2f\xfd", b"\x1f\x8b")  # zstd / gzip: segments written before encryption
+
+
+class SessionArchive:
+    """Month-bucketed compressed segments plus a session -> segment catalog."""
+
+    def __init__(self, archive_dir: Path = None):
+        self.archive_dir = Path(archive_dir or ARCHIVE_DIR)
+        self.catalog_path = self.archive_dir / "catalog.json"
+        self.catalog: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._load_catalog()
+
+    def _load_catalog(self):
+        if self.catalog_path.exists():
+            try:
+                self.catalog = json.loads(self.catalog_path.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.error(f" [Archive] Catalog load error: {e}")
+                self.catalog = {}
+
+    def _save_catalog(self):
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.catalog_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.catalog, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.catalog_path)
+
+    # --- Segment I/O ---
+
+    @staticmethod
+    def _compress(raw: bytes, suffix: str = None) -> (bytes, str):
+        """Compress (as `suffix`, or the best available codec), then encrypt (ciphertext does not compress)."""
+        if suffix is None:
+            suffix = ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+        if suffix == ".jsonl.zst":
+            blob = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        else:
+            blob = gzip.compress(raw)
+        return memory_cipher.encrypt_bytes(blob), suffix
+
+    @staticmethod
+    def _decompress(path: Path) -> bytes:
+        data = path.read_bytes()
+        if not data.startswith(PLAIN_MAGIC):
+            data = memory_cipher.decrypt_bytes(data)
+        if path.name.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"{path.name} needs the 'zstandard' package")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return gzip.decompress(data)
+
+    def _new_segment(self, month: str, suffix: str) -> Path:
+        """Every archive run gets a fresh part number."""
+        part = 1
+        while any((self.archive_dir / f"sessions-{month}-{part:03d}{ext}").exists()
+                  for ext in (".jsonl.zst", ".jsonl.gz")):
+            part += 1
+        return self.archive_dir / f"sessions-{month}-{part:03d}{suffix}"
+
+    # --- Public API ---
+
+    def __contains__(self, session_id: str) -> bool:
+        return str(session_id) in self.catalog
+
+    def archive(self, sessions: Dict[str, Dict], metas: Dict[str, Dict]) -> int:
+        """Write sessions to new segments (one per activity month) and catalog them."""
+        if not sessions:
+            return 0
+        by_month: Dict[str, List[str]] = {}
+        for sid in sessions:
+            month = datetime.fromtimestamp(metas[sid].get("lastActive", 0) or time.time()).strftime("%Y-%m")
+            by_month.setdefault(month, []).append(sid)
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for month, sids in by_month.items():
+                raw = "".join(json.dumps({"id": sid, "session": sessions[sid]}, ensure_ascii=False) + "\n"
+                              for sid in sids).encode("utf-8")
+                blob, suffix = self._compress(raw)
+                segment = self._new_segment(month, suffix)
+                tmp = segment.with_name(segment.name + ".tmp")
+                tmp.write_bytes(blob)
+                os.replace(tmp, segment)
+                for sid in sids:
+                    self.catalog[sid] = dict(metas[sid], segment=segment.name, archived_at=time.time())
+            self._save_catalog()
+        logger.info(f" [Archive] 🧊 Archived {len(sessions)} idle sessions into {len(by_month)} segment(s).")
+        return len(sessions)
+
+    def read(self, session_id: str) -> Optional[Dict]:
+        """Load one session from its segment. The catalog entry stays until `forget`."""
+        entry = self.catalog.get(str(session_id))
+        if entry is None:
+            return None
+        try:
+            raw = self._decompress(self.archive_dir / entry["segment"])
+        except Exception as e:
+            logger.error(f" [Archive] Cannot read {entry['segment']}: {e}")
+            return None
+        for line in raw.splitlines():
+            record = json.loads(line)
+            if record["id"] == str(session_id):
+                logger.info(f" [Archive] Restored session {session_id} from {entry['segment']}")
+                return record["session"]
+        return None
+
+    def forget(self, session_id: str) -> bool:
+        """
+        Erase a session from the archive: its segment is rewritten without it
+        (or deleted once empty) before the catalog entry goes. False when the
+        session was not archived or its bytes could not be erased.
+        """
+        sid = str(session_id)
+        with self._lock:
+            entry = self.catalog.get(sid)
+            if entry is None:
+                return False
+            try:
+                self._rewrite_segment(entry["segment"], drop=sid)
+            except Exception as e:
+                logger.error(f" [Archive] Cannot erase session {sid} from {entry['segment']}: {e}")
+                return False
+            del self.catalog[sid]
+            self._save_catalog()
+        return True
+
+    def _rewrite_segment(self, name: str, drop: str):
+        """Keep only the records the catalog still points at (minus `drop`); remove the segment if none are left."""
+        path = self.archive_dir / name
+        if not path.exists():
+            return
+        keep = {sid for sid, entry in self.catalog.items() if entry.get("segment") == name and sid != drop}
+        lines = [line for line in self._decompress(path).splitlines(keepends=True)
+                 if line.strip() and json.loads(line)["id"] in keep]
+        if not lines:
+            path.unlink()
+            return
+        suffix = ".jsonl.zst" if name.endswith(".zst") else ".jsonl.gz"
+        blob, _ = self._compress(b"".join(lines), suffix)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(blob)
+        os.replace(tmp, path)
+
+    def clear(self) -> List[str]:
+        """Delete every segment and the catalog (full memory wipe). Returns the dropped session ids."""
+        with self._lock:
+            for segment in self.archive_dir.glob("sessions-*.jsonl.*"):
+                segment.unlink()
+            dropped = list(self.catalog)
+            self.catalog = {}
+            self._save_catalog()
+        return dropped
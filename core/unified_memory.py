@@ -2,9 +2,9 @@
 AIKO UNIFIED MEMORY SYSTEM v3.0
 ═══════════════════════════════════════════════════════════════
 A unified memory layer combining:
-- Short-term conversation history (JSON)
+- Short-term conversation history (shared ConversationStore)
 - Long-term semantic memory (RAG/ChromaDB)
-- Aiko's internal thoughts stream (Text files)
+- Aiko's internal thoughts stream (indexed JSONL + readable text files)
 - Personality-linked file associations
 
 Design Goals:
@@ -16,15 +16,22 @@ Design Goals:
 
 import json
 import os
+import re
 import time
+import struct
 import asyncio
-from datetime import datetime
+import threading
+from collections import deque
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass, asdict
 import logging
 import hashlib
 
+from core.config_manager import config
+from core.conversation_store import get_conversation_store
+
 logger = logging.getLogger("UnifiedMemory")
 
 # Memory paths
@@ -34,6 +41,16 @@ MEMORY_FILE = DATA_DIR / "unified_memory.json"
 THOUGHTS_DIR = DATA_DIR / "thoughts"
 FILE_LINKS_DIR = DATA_DIR / "file_links"
 
+# Thought log: (timestamp, byte offset) per line of the day's JSONL segment
+THOUGHT_INDEX_ENTRY = struct.Struct('<dQ')
+THOUGHT_TAIL_SIZE = 256        # Recent thoughts kept in memory for prompt building
+THOUGHT_RETENTION_DAYS = 0     # Days kept before folding into thought_rollup.json (0 keeps everything)
+THOUGHT_ROLLUP_HIGHLIGHTS = 5
+
+# File graph: tags are indexed by word so lookups never scan every link
+TAG_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+LINK_JOURNAL_COMPACT_MIN = 200  # Journal lines before folding into file_links.json
+
 @dataclass
 class Thought:
     """A single thought entry."""
@@ -63,11 +80,17 @@ class ThoughtStream:
     """
     Manages Aiko's stream of consciousness.
     Writes to both text files and structured storage.
+
+    Structured storage is one JSONL segment per day plus a sidecar index of
+    fixed-size (timestamp, byte offset) records, so time-range queries seek
+    straight to the first matching line and tail reads never scan a whole day.
+    The `.txt` files remain as the human-readable view.
     """
 
-    def __init__(self, thoughts_dir: Path = None):
+    def __init__(self, thoughts_dir: Path = None, retention_days: int = THOUGHT_RETENTION_DAYS):
         self.thoughts_dir = thoughts_dir or THOUGHTS_DIR
         self.thoughts_dir.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
 
         # Daily thought log file
         self.current_date = datetime.now().strftime("%Y-%m-%d")
@@ -75,23 +98,41 @@ class ThoughtStream:
         self.buffer_size = 10
         self.last_flush = time.time()
         self.flush_interval = 30  # seconds
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # Serializes flushes so index offsets match the segment
 
         # Ensure today's file exists
         self._get_today_file()
+        self._repair_index(self.current_date)
+        self.recent = deque(self._read_tail(THOUGHT_TAIL_SIZE), maxlen=THOUGHT_TAIL_SIZE)
+        self.rollup()
+
+    def _segment_paths(self, date_str: str):
+        """(jsonl segment, sidecar index) for a day."""
+        return (self.thoughts_dir / f"aiko_thoughts_{date_str}.jsonl",
+                self.thoughts_dir / f"aiko_thoughts_{date_str}.idx")
+
+    def _segment_dates(self) -> List[str]:
+        return sorted(p.stem.replace("aiko_thoughts_", "") for p in self.thoughts_dir.glob("aiko_thoughts_*.jsonl"))
 
     def _get_today_file(self) -> Path:
         """Get or create today's thought log file."""
         today = datetime.now().strftime("%Y-%m-%d")
 
         if today != self.current_date:
-            self.current_date = today
             self._flush_buffer()  # Flush old date's buffer
+            self.current_date = today
+            self.rollup()
+
+        return self._text_file(today)
 
-        file_path = self.thoughts_dir / f"aiko_thoughts_{today}.txt"
+    def _text_file(self, date_str: str) -> Path:
+        """Get or create a day's human-readable thought log."""
+        file_path = self.thoughts_dir / f"aiko_thoughts_{date_str}.txt"
 
         if not file_path.exists():
             header = f"""╔══════════════════════════════════════════════════════════════════╗
-║  AIKO'S THOUGHT STREAM - {today}                                        ║
+║  AIKO'S THOUGHT STREAM - {date_str}                                        ║
 ║  A window into her digital mind                                     ║
 ╚══════════════════════════════════════════════════════════════════╝
 
@@ -104,14 +145,34 @@ Each entry is timestamped and categorized for better understanding.
         return file_path
 
     def _flush_buffer(self):
-        """Write buffered thoughts to file."""
-        if not self.thoughts_buffer:
-            return
-
-        file_path = self._get_today_file()
-
-        with open(file_path, 'a', encoding='utf-8') as f:
-            for thought in self.thoughts_buffer:
+        """Write buffered thoughts to the day segment, its index and the text log."""
+        # Taken before the buffer swap, so concurrent flushes also append in thought order
+        with self._write_lock:
+            with self._lock:
+                if not self.thoughts_buffer:
+                    return
+                pending, self.thoughts_buffer = self.thoughts_buffer, []
+
+            by_day: Dict[str, List[Dict]] = {}
+            for thought in pending:
+                day = datetime.fromtimestamp(thought['timestamp']).strftime("%Y-%m-%d")
+                by_day.setdefault(day, []).append(thought)
+
+            for day, thoughts in by_day.items():
+                segment, index = self._segment_paths(day)
+                with open(segment, 'ab') as seg, open(index, 'ab') as idx:
+                    for thought in thoughts:
+                        offset = seg.tell()
+                        seg.write((json.dumps(thought, ensure_ascii=False) + "\n").encode('utf-8'))
+                        idx.write(THOUGHT_INDEX_ENTRY.pack(thought['timestamp'], offset))
+                self._write_text_log(day, thoughts)
+
+            self.last_flush = time.time()
+
+    def _write_text_log(self, day: str, thoughts: List[Dict]):
+        """Human-readable rendering of thoughts (the original .txt format)."""
+        with open(self._text_file(day), 'a', encoding='utf-8') as f:
+            for thought in thoughts:
                 time_str = datetime.fromtimestamp(thought['timestamp']).strftime("%H:%M:%S")
 
                 # Visual formatting based on category
@@ -136,9 +197,6 @@ Each entry is timestamped and categorized for better understanding.
 
                 f.write("─" * 60 + "\n")
 
-        self.thoughts_buffer.clear()
-        self.last_flush = time.time()
-
     def think(self, content: str, category: str = "reflection",
               related_files: List[str] = None, related_memories: List[str] = None,
               emotion: str = "neutral", importance: int = 5):
@@ -154,7 +212,7 @@ Each entry is timestamped and categorized for better understanding.
             )
         """
         thought = {
-            'timestamp': time.time(),
+            'timestamp': None,
             'content': content,
             'category': category,
             'related_files': related_files or [],
@@ -163,7 +221,10 @@ Each entry is timestamped and categorized for better understanding.
             'importance': importance
         }
 
-        self.thoughts_buffer.append(thought)
+        with self._lock:
+            thought['timestamp'] = time.time()  # Stamped under the lock: the index needs ascending timestamps
+            self.thoughts_buffer.append(thought)
+            self.recent.append(thought)
 
         # Flush if buffer is full or interval passed
         if (len(self.thoughts_buffer) >= self.buffer_size or
@@ -172,71 +233,343 @@ Each entry is timestamped and categorized for better understanding.
 
         return thought
 
-    def get_recent_thoughts(self, hours: int = 24) -> List[Dict]:
-        """Get recent thoughts from text files."""
-        thoughts = []
+    # --- Index ---
+
+    def _repair_index(self, date_str: str):
+        """Rebuild a day's index if it is missing or lags its segment (crash mid-flush)."""
+        segment, index = self._segment_paths(date_str)
+        if not segment.exists():
+            return
+        seg_size = segment.stat().st_size
+        entries = index.stat().st_size // THOUGHT_INDEX_ENTRY.size if index.exists() else 0
+        if entries:
+            _, last_offset = self._index_entry(index, entries - 1)
+            with open(segment, 'rb') as f:
+                f.seek(last_offset)
+                f.readline()
+                if f.tell() == seg_size:
+                    return
+
+        logger.warning(f"[Thoughts] Rebuilding index for {date_str}")
+        with open(segment, 'rb') as seg, open(index, 'wb') as idx:
+            offset = 0
+            for line in seg:
+                try:
+                    idx.write(THOUGHT_INDEX_ENTRY.pack(json.loads(line)['timestamp'], offset))
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+
+    @staticmethod
+    def _index_entry(index: Path, i: int):
+        with open(index, 'rb') as f:
+            f.seek(i * THOUGHT_INDEX_ENTRY.size)
+            return THOUGHT_INDEX_ENTRY.unpack(f.read(THOUGHT_INDEX_ENTRY.size))
+
+    def _seek_offset(self, index: Path, since: float) -> int:
+        """Byte offset of the first thought at or after `since` (binary search over the index)."""
+        n = index.stat().st_size // THOUGHT_INDEX_ENTRY.size
+        lo, hi = 0, n
+        with open(index, 'rb') as f:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(mid * THOUGHT_INDEX_ENTRY.size)
+                ts, _ = THOUGHT_INDEX_ENTRY.unpack(f.read(THOUGHT_INDEX_ENTRY.size))
+                if ts < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == n:
+                return -1
+            f.seek(lo * THOUGHT_INDEX_ENTRY.size)
+            return THOUGHT_INDEX_ENTRY.unpack(f.read(THOUGHT_INDEX_ENTRY.size))[1]
+
+    def _read_tail(self, k: int) -> List[Dict]:
+        """Last k flushed thoughts, reading only the tail of the newest segments."""
+        thoughts: List[Dict] = []
+        for date_str in reversed(self._segment_dates()):
+            segment, index = self._segment_paths(date_str)
+            if not index.exists():
+                continue
+            n = index.stat().st_size // THOUGHT_INDEX_ENTRY.size
+            need = k - len(thoughts)
+            if n == 0:
+                continue
+            _, offset = self._index_entry(index, max(0, n - need))
+            with open(segment, 'rb') as f:
+                f.seek(offset)
+                chunk = [json.loads(line) for line in f if line.strip()]
+            thoughts = chunk[-need:] + thoughts
+            if len(thoughts) >= k:
+                break
+        return thoughts
+
+    # --- Queries ---
+
+    def tail(self, k: int = 10, category: str = None) -> List[Dict]:
+        """Most recent k thoughts (oldest first), served from memory."""
+        with self._lock:
+            recent = list(self.recent)
+        if category:
+            recent = [t for t in recent if t['category'] == category]
+        if k >= len(recent) and len(self.recent) == self.recent.maxlen:
+            return self.query(category=category, limit=k, newest=True)
+        return recent[-k:]
+
+    def query(self, start: float = None, end: float = None, category: str = None,
+              min_importance: int = 0, limit: int = None, newest: bool = False) -> List[Dict]:
+        """
+        Thoughts in [start, end), optionally filtered by category and importance.
+        Only segments overlapping the range are opened, and each is entered at
+        the indexed offset of `start`.
+        """
+        self._flush_buffer()
+        end = end or time.time() + 1
+        start_day = datetime.fromtimestamp(start).strftime("%Y-%m-%d") if start else ""
+        end_day = datetime.fromtimestamp(end).strftime("%Y-%m-%d")
+        dates = [d for d in self._segment_dates() if start_day <= d <= end_day]
+        if newest:
+            dates.reverse()
+
+        results: List[Dict] = []
+        for date_str in dates:
+            segment, index = self._segment_paths(date_str)
+            offset = self._seek_offset(index, start) if start and index.exists() else 0
+            if offset < 0:
+                continue
+            day: List[Dict] = []
+            with open(segment, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        t = json.loads(line)
+                    except ValueError:
+                        continue
+                    if t['timestamp'] >= end:
+                        break
+                    if category and t['category'] != category:
+                        continue
+                    if t.get('importance', 0) < min_importance:
+                        continue
+                    day.append(t)
+            if newest:
+                results = day + results
+                if limit and len(results) >= limit:
+                    return results[-limit:]
+            else:
+                results.extend(day)
+                if limit and len(results) >= limit:
+                    return results[:limit]
+        return results
+
+    def get_recent_thoughts(self, hours: int = 24, category: str = None) -> List[Dict]:
+        """Get thoughts from the last `hours` hours."""
         cutoff = time.time() - (hours * 3600)
+        with self._lock:
+            recent = list(self.recent)
+        if len(recent) < self.recent.maxlen or (recent and recent[0]['timestamp'] < cutoff):
+            # Everything in range is already in memory
+            return [t for t in recent if t['timestamp'] >= cutoff and (not category or t['category'] == category)]
+        return self.query(start=cutoff, category=category)
 
-        for file_path in sorted(self.thoughts_dir.glob("aiko_thoughts_*.txt")):
-            # Parse file date from filename
+    # --- Retention ---
+
+    def rollup(self):
+        """
+        Fold day segments older than the retention window into
+        thought_rollup.json (per-day counts plus the most important thoughts)
+        and delete their JSONL, index and text files.
+        """
+        if not self.retention_days:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        expired = [d for d in self._segment_dates() if d < cutoff]
+        if not expired:
+            return
+
+        rollup_file = self.thoughts_dir / "thought_rollup.json"
+        try:
+            rollup = json.loads(rollup_file.read_text(encoding='utf-8')) if rollup_file.exists() else {}
+        except Exception:
+            rollup = {}
+
+        for date_str in expired:
+            segment, index = self._segment_paths(date_str)
+            categories, emotions, highlights = {}, {}, []
             try:
-                date_str = file_path.stem.replace("aiko_thoughts_", "")
-                file_date = datetime.strptime(date_str, "%Y-%m-%d").timestamp()
-
-                if file_date >= cutoff - 86400:  # Include previous day
-                    content = file_path.read_text(encoding='utf-8')
-                    # Simple parsing - could be enhanced
-                    thoughts.append({
-                        'date': date_str,
-                        'content': content
-                    })
-            except:
+                with open(segment, 'rb') as f:
+                    for line in f:
+                        try:
+                            t = json.loads(line)
+                        except ValueError:
+                            continue
+                        categories[t['category']] = categories.get(t['category'], 0) + 1
+                        emotions[t['emotion']] = emotions.get(t['emotion'], 0) + 1
+                        highlights.append(t)
+            except OSError:
                 continue
+            highlights.sort(key=lambda t: t.get('importance', 0), reverse=True)
+            rollup[date_str] = {
+                'count': sum(categories.values()),
+                'categories': categories,
+                'emotions': emotions,
+                'highlights': [{'timestamp': t['timestamp'], 'category': t['category'],
+                                'importance': t.get('importance', 0), 'content': t['content'][:300]}
+                               for t in highlights[:THOUGHT_ROLLUP_HIGHLIGHTS]]
+            }
+            for path in (segment, index, self.thoughts_dir / f"aiko_thoughts_{date_str}.txt"):
+                path.unlink(missing_ok=True)
 
-        return thoughts[-5:]  # Last 5 files
+        tmp = rollup_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(rollup, indent=2, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, rollup_file)
+        logger.info(f"[Thoughts] Rolled up {len(expired)} day(s) older than {self.retention_days} days")
 
 
 class FileMemoryGraph:
     """
     Links files to Aiko's personality and memory.
     Tracks which files are important to her.
+
+    Links are kept in memory with inverted indexes (tag token -> files,
+    file type -> files, user -> files) and a lazily rebuilt relevance
+    ranking, so lookups touch only matching files. Changes are appended to a
+    journal on flush and folded into file_links.json when it grows.
     """
 
     def __init__(self, links_dir: Path = None):
         self.links_dir = links_dir or FILE_LINKS_DIR
         self.links_dir.mkdir(parents=True, exist_ok=True)
         self.links_file = self.links_dir / "file_links.json"
+        self.journal_file = self.links_dir / "file_links.journal"
+        self.vectors_file = self.links_dir / "file_embeddings.json"
         self._cache = {}
         self._dirty = False
+        self._dirty_keys = set()
+        self._journal_entries = 0
+        self._lock = threading.RLock()
+
+        # Indexes
+        self._tag_index: Dict[str, set] = {}
+        self._type_index: Dict[str, set] = {}
+        self._user_index: Dict[str, set] = {}
+        self._ranked: Optional[List[str]] = None  # keys by (relevance, last_accessed) desc
+
+        # Optional semantic search over summaries
+        self._embedder = None
+        self._vectors: Dict[str, Dict] = {}
+        self._embed_backoff_until = 0
+
         self._load()
 
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return hashlib.md5(file_path.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        return [t.lower() for t in TAG_TOKEN_PATTERN.findall(text or "")]
+
     def _load(self):
-        """Load file links from disk."""
+        """Load the snapshot, then replay the journal on top of it."""
+        self._cache = {}
         if self.links_file.exists():
             try:
                 self._cache = json.loads(self.links_file.read_text(encoding='utf-8'))
             except:
                 self._cache = {}
-        else:
-            self._cache = {}
 
-    def _save(self):
-        """Save file links to disk (debounced)."""
+        if self.journal_file.exists():
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    self._journal_entries += 1
+                    if entry.get('link') is None:
+                        self._cache.pop(entry['key'], None)
+                    else:
+                        self._cache[entry['key']] = entry['link']
+
+        for key, link in self._cache.items():
+            self._index(key, link)
+
+        if self.vectors_file.exists():
+            try:
+                self._vectors = json.loads(self.vectors_file.read_text(encoding='utf-8'))
+            except:
+                self._vectors = {}
+
+    # --- Indexes ---
+
+    def _index(self, key: str, link: Dict):
+        for tag in link.get('tags', []):
+            for token in self._tokens(tag):
+                self._tag_index.setdefault(token, set()).add(key)
+        self._type_index.setdefault(str(link.get('file_type', '')).lower(), set()).add(key)
+        if link.get('user_id'):
+            self._user_index.setdefault(str(link['user_id']), set()).add(key)
+        self._ranked = None
+
+    def _unindex(self, key: str, link: Dict):
+        for index, values in ((self._tag_index, [t for tag in link.get('tags', []) for t in self._tokens(tag)]),
+                              (self._type_index, [str(link.get('file_type', '')).lower()]),
+                              (self._user_index, [str(link['user_id'])] if link.get('user_id') else [])):
+            for value in values:
+                keys = index.get(value)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del index[value]
+        self._ranked = None
+
+    def _rank_key(self, key: str) -> tuple:
+        return self._cache[key]['relevance_score'], self._cache[key]['last_accessed']
+
+    def _ranking(self) -> List[str]:
+        if self._ranked is None:
+            self._ranked = sorted(self._cache, key=self._rank_key, reverse=True)
+        return self._ranked
+
+    # --- Persistence ---
+
+    def _save(self, key: str = None):
+        """Mark a link dirty (debounced; written in flush())."""
         self._dirty = True
-        # Actual save happens in flush() or on significant changes
+        if key:
+            self._dirty_keys.add(key)
 
     def flush(self):
-        """Force save to disk."""
-        if self._dirty:
-            self.links_file.write_text(
-                json.dumps(self._cache, indent=2, ensure_ascii=False),
-                encoding='utf-8'
-            )
+        """Append changed links to the journal; compact into the snapshot when it grows."""
+        with self._lock:
+            if not self._dirty:
+                return
+            keys, self._dirty_keys = self._dirty_keys, set()
             self._dirty = False
+            lines = [json.dumps({'key': k, 'link': self._cache.get(k)}, ensure_ascii=False) + "\n" for k in keys]
+
+        self._journal_entries += len(lines)
+        if self._journal_entries > max(LINK_JOURNAL_COMPACT_MIN, len(self._cache)):
+            self.compact()
+            return
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    def compact(self):
+        """Rewrite file_links.json from memory and truncate the journal."""
+        with self._lock:
+            payload = json.dumps(self._cache, indent=2, ensure_ascii=False)
+            tmp = self.links_file.with_suffix(".tmp")
+            tmp.write_text(payload, encoding='utf-8')
+            os.replace(tmp, self.links_file)
+            self.journal_file.unlink(missing_ok=True)
+            self._journal_entries = 0
 
     def link_file(self, file_path: str, file_type: str = None,
                   tags: List[str] = None, summary: str = "",
-                  emotional_value: float = 0.0, relevance: float = 0.5):
+                  emotional_value: float = 0.0, relevance: float = 0.5,
+                  user_id: str = None):
         """
         Link a file to Aiko's memory.
 
@@ -247,52 +580,140 @@ class FileMemoryGraph:
             summary: Aiko's understanding of the file
             emotional_value: How this file makes her feel (-1 to 1)
             relevance: How relevant to her core self (0 to 1)
+            user_id: User who shared the file (indexed for per-user lookups)
         """
         now = time.time()
 
         # Create hash key for path
-        file_hash = hashlib.md5(file_path.encode()).hexdigest()[:16]
-
-        link = {
-            'path': file_path,
-            'file_type': file_type or Path(file_path).suffix.lstrip('.') or 'unknown',
-            'linked_at': self._cache.get(file_hash, {}).get('linked_at', now),
-            'access_count': self._cache.get(file_hash, {}).get('access_count', 0) + 1,
-            'last_accessed': now,
-            'tags': tags or [],
-            'summary': summary,
-            'emotional_value': emotional_value,
-            'relevance_score': relevance
-        }
+        file_hash = self._key(file_path)
+
+        with self._lock:
+            previous = self._cache.get(file_hash, {})
+            link = {
+                'path': file_path,
+                'file_type': file_type or Path(file_path).suffix.lstrip('.') or 'unknown',
+                'linked_at': previous.get('linked_at', now),
+                'access_count': previous.get('access_count', 0) + 1,
+                'last_accessed': now,
+                'tags': tags or [],
+                'summary': summary,
+                'emotional_value': emotional_value,
+                'relevance_score': relevance,
+                'user_id': user_id or previous.get('user_id')
+            }
 
-        self._cache[file_hash] = link
-        self._save()
+            if previous:
+                self._unindex(file_hash, previous)
+            self._cache[file_hash] = link
+            self._index(file_hash, link)
+            self._save(file_hash)
 
         return file_hash
 
-    def get_linked_files(self, tag: str = None, min_relevance: float = 0.0) -> List[Dict]:
-        """Get files linked to Aiko's personality."""
-        files = []
-        for link in self._cache.values():
-            if link['relevance_score'] >= min_relevance:
-                if tag is None or tag in link['tags']:
-                    files.append(link)
-
-        # Sort by relevance and recency
-        files.sort(key=lambda x: (x['relevance_score'], x['last_accessed']), reverse=True)
+    def get_linked_files(self, tag: str = None, min_relevance: float = 0.0,
+                         user_id: str = None, limit: int = None) -> List[Dict]:
+        """Get files linked to Aiko's personality, by relevance and recency."""
+        with self._lock:
+            candidates = None
+            if tag is not None:
+                tokens = self._tokens(tag)
+                candidates = set.intersection(*(self._tag_index.get(t, set()) for t in tokens)) if tokens else set()
+            if user_id is not None:
+                user_keys = self._user_index.get(str(user_id), set())
+                candidates = user_keys if candidates is None else candidates & user_keys
+
+            # Filtered lookups rank only their candidates, not every linked file
+            ordered = self._ranking() if candidates is None else sorted(candidates, key=self._rank_key, reverse=True)
+            files = []
+            for key in ordered:
+                link = self._cache[key]
+                if link['relevance_score'] < min_relevance:
+                    break  # Ranking is relevance-descending
+                if tag is not None and tag not in link['tags']:
+                    continue
+                files.append(link)
+                if limit and len(files) >= limit:
+                    break
         return files
 
+    def match_query(self, query: str, user_id: str = None) -> Dict[str, float]:
+        """
+        Keyword relevance for the files a query mentions: 0.5 when one of a
+        file's tags appears in the query, +0.3 when its file type does.
+        Only files reached through the inverted indexes are scored.
+        """
+        tokens = set(self._tokens(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            tag_hits = set().union(*(self._tag_index.get(t, set()) for t in tokens)) if tokens else set()
+            for key in tag_hits:
+                link = self._cache[key]
+                if any(tag_tokens and set(tag_tokens) <= tokens
+                       for tag_tokens in (self._tokens(t) for t in link['tags'])):
+                    scores[key] = 0.5
+            for token in tokens:
+                for key in self._type_index.get(token, ()):
+                    scores[key] = scores.get(key, 0.0) + 0.3
+            if user_id is not None:
+                allowed = self._user_index.get(str(user_id), set())
+                scores = {k: v for k, v in scores.items() if k in allowed}
+        return scores
+
+    def similar_files(self, query: str, limit: int = 5, user_id: str = None) -> List[tuple]:
+        """
+        (similarity, link) pairs ranked by embedding cosine similarity between
+        the query and file summaries. Empty if no embedding backend answers.
+        """
+        if time.time() < self._embed_backoff_until:
+            return []
+        try:
+            import numpy as np
+            if self._embedder is None:
+                from core.embeddings import get_embedder
+                self._embedder = get_embedder()
+
+            with self._lock:
+                keys = list(self._user_index.get(str(user_id), set())) if user_id is not None else list(self._cache)
+                model = getattr(self._embedder, 'name', '')
+                # Vectors from another embedding backend live in a different space: re-embed them
+                stale = [k for k in keys if self._cache[k].get('summary') and
+                         (self._vectors.get(k, {}).get('summary_hash') != self._summary_hash(self._cache[k]) or
+                          self._vectors[k].get('model', model) != model)]
+            if stale:
+                texts = [f"{self._cache[k]['path']}: {self._cache[k]['summary']}" for k in stale]
+                for k, vec in zip(stale, self._embedder.embed(texts)):
+                    self._vectors[k] = {'summary_hash': self._summary_hash(self._cache[k]), 'vector': vec,
+                                        'model': model}
+                self.vectors_file.write_text(json.dumps(self._vectors), encoding='utf-8')
+
+            keys = [k for k in keys if k in self._vectors and k in self._cache]
+            if not keys:
+                return []
+            matrix = np.asarray([self._vectors[k]['vector'] for k in keys], dtype=np.float32)
+            q = np.asarray(self._embedder.embed([query])[0], dtype=np.float32)
+            sims = matrix @ q / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(q) + 1e-12)
+            order = np.argsort(-sims)[:limit]
+            return [(float(sims[i]), self._cache[keys[i]]) for i in order]
+        except Exception as e:
+            logger.warning(f"[FileGraph] Semantic search unavailable: {e}")
+            self._embed_backoff_until = time.time() + 60
+            return []
+
+    @staticmethod
+    def _summary_hash(link: Dict) -> str:
+        return hashlib.md5(f"{link['path']}|{link.get('summary', '')}".encode()).hexdigest()
+
     def get_file_context(self, file_path: str) -> Optional[Dict]:
         """Get Aiko's understanding of a file."""
-        file_hash = hashlib.md5(file_path.encode()).hexdigest()[:16]
-        return self._cache.get(file_hash)
+        return self._cache.get(self._key(file_path))
 
     def update_summary(self, file_path: str, summary: str):
         """Update Aiko's understanding of a file."""
-        file_hash = hashlib.md5(file_path.encode()).hexdigest()[:16]
-        if file_hash in self._cache:
-            self._cache[file_hash]['summary'] = summary
-            self._save()
+        file_hash = self._key(file_path)
+        with self._lock:
+            if file_hash in self._cache:
+                self._cache[file_hash]['summary'] = summary
+                self._save(file_hash)
 
 
 class UnifiedMemoryManager:
@@ -306,13 +727,13 @@ class UnifiedMemoryManager:
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
         # Subsystems
-        self.thought_stream = ThoughtStream()
+        self.thought_stream = ThoughtStream(retention_days=int(config.get("THOUGHT_RETENTION_DAYS", 0) or 0))
         self.file_graph = FileMemoryGraph()
 
-        # Conversation history (lightweight, in-memory with disk backup)
-        self.history: Dict[str, List[Dict]] = {}
-        self.history_file = self.data_dir / "conversation_history.json"
-        self._load_history()
+        # Conversation history lives in the shared ConversationStore (one write path)
+        self.store = get_conversation_store()
+        self.summarizer = self.store.summarizer
+        self.store.on_archive.append(self._archive_to_palace)
 
         # Affection/personality per user
         self.user_profiles: Dict[str, Dict] = {}
@@ -328,14 +749,6 @@ class UnifiedMemoryManager:
         self._last_save = time.time()
         self._save_interval = 60  # seconds
 
-    def _load_history(self):
-        """Load conversation history from disk."""
-        if self.history_file.exists():
-            try:
-                self.history = json.loads(self.history_file.read_text(encoding='utf-8'))
-            except:
-                self.history = {}
-
     def _load_profiles(self):
         """Load user profiles."""
         if self.profiles_file.exists():
@@ -362,10 +775,7 @@ class UnifiedMemoryManager:
     def save(self):
         """Persist all memory to disk."""
         # Save conversations
-        self.history_file.write_text(
-            json.dumps(self.history, indent=2, ensure_ascii=False),
-            encoding='utf-8'
-        )
+        self.store.flush()
 
         # Save profiles
         self.profiles_file.write_text(
@@ -387,19 +797,14 @@ class UnifiedMemoryManager:
 
     # === Conversation History ===
 
+    @property
+    def history(self) -> Dict[str, List[Dict]]:
+        """Read-only view of every session's raw turns."""
+        return self.store.histories()
+
     def add_message(self, user_id: str, role: str, content: str, metadata: dict = None):
         """Add message to conversation history."""
-        if user_id not in self.history:
-            self.history[user_id] = []
-
-        entry = {
-            'role': role,
-            'content': content,
-            'timestamp': time.time(),
-            'metadata': metadata or {}
-        }
-
-        self.history[user_id].append(entry)
+        self.store.append(user_id, role, content, metadata=metadata or {})
 
         # File into MemPalace for high-recall long-term storage
         try:
@@ -414,67 +819,69 @@ class UnifiedMemoryManager:
         except Exception as e:
             logger.error(f"[Memory] Palace filing error: {e}")
 
-        # Memory Compression & Archiving (Keep local history efficient)
-        if len(self.history[user_id]) > 40:
-            self._compress_history(user_id)
-
-    def _compress_history(self, user_id: str):
-        """Turn old conversation segments into a single semantic anchor."""
-        history = self.history[user_id]
-        if len(history) < 30: return
+        # Log important messages to thought stream
+        if role == 'assistant' and len(content) > 100:
+            self.thought_stream.think(
+                f"Responded to {user_id}: {content[:100]}...",
+                category='observation',
+                importance=4
+            )
 
-        to_compress = history[:20]
-        remaining = history[20:]
+        self._maybe_save()
 
-        summary_title = f"[MNEMONIC_CHRONICLE]"
-        summary_content = "\n".join([f"{m['role']}: {m['content'][:100]}..." for m in to_compress])
-        
-        # Archive the FULL text to MemPalace (High Recall)
+    def _archive_to_palace(self, user_id: str, turns: List[Dict]):
+        """
+        Store hook: turns leaving the raw window (already folded into the
+        summary pyramid, see conversation_summarizer) are archived in full to
+        MemPalace for high recall.
+        """
         try:
             from core.mempalace_bridge import get_mempalace_rag
             mp = get_mempalace_rag()
             if mp.is_available():
-                full_archive_text = "CONVERSATION_ARCHIVE:\n" + "\n".join([f"{m['role']}: {m['content']}" for m in to_compress])
+                full_archive_text = "CONVERSATION_ARCHIVE:\n" + "\n".join([f"{m['role']}: {m['content']}" for m in turns])
                 mp.add_memory(
                     full_archive_text,
                     metadata={"user_id": user_id, "type": "archived_chat"},
                     room="conversations"
                 )
-        except: pass
-
-        # Replace first 20 with 1 summary entry
-        archive_entry = {
-            'role': 'system',
-            'content': f"{summary_title}: I've archived our earlier chat into the Palace. We discussed: {summary_content[:500]}",
-            'timestamp': to_compress[-1]['timestamp'],
-            'metadata': {'type': 'archive_summary'}
-        }
-        
-        self.history[user_id] = [archive_entry] + remaining
-        logger.info(f"[Memory] Compressed history for {user_id}. Palace archive created.")
+        except Exception as e:
+            logger.error(f"[Memory] Palace archive error: {e}")
 
-        # Log important messages to thought stream
-        if role == 'assistant' and len(content) > 100:
-            self.thought_stream.think(
-                f"Responded to {user_id}: {content[:100]}...",
-                category='observation',
-                importance=4
-            )
+    async def summarize_pending(self) -> int:
+        """Fold old turns into rolling summaries (run from a background loop)."""
+        return await self.store.summarize_pending()
 
-        self._maybe_save()
+    def get_summary_context(self, user_id: str, max_chars: int = 2000) -> str:
+        """Rolling summary of everything older than the raw history window."""
+        return self.summarizer.get_context(user_id, max_chars)
 
     def get_history(self, user_id: str, limit: int = 20) -> List[Dict]:
         """Get conversation history for user."""
-        history = self.history.get(user_id, [])
+        history = self.store.messages(user_id)
         return [{'role': m['role'], 'content': m['content']}
                 for m in history[-limit:]]
 
+    def get_messages_since(self, user_id: str, since: float = 0.0) -> List[Dict]:
+        """
+        Turns (with timestamps) newer than `since`, oldest first. Stretches the
+        store already folded away are represented by their rolling summaries
+        (role 'summary'), so nothing said after `since` is skipped.
+        """
+        stored = self.store.messages(user_id)
+        oldest_raw = stored[0].get('timestamp', 0) if stored else float('inf')
+        folded = [{'role': 'summary', 'content': s['text'], 'timestamp': s['end']}
+                  for s in self.summarizer.get_summaries(user_id)
+                  if s['end'] > since and s['start'] < oldest_raw]
+        raw = [{'role': m['role'], 'content': m['content'], 'timestamp': m.get('timestamp', 0)}
+               for m in stored if m.get('timestamp', 0) > since]
+        return sorted(folded + raw, key=lambda m: m['timestamp'])
+
     def clear_history(self, user_id: str = None):
         """Clear history for user or all users."""
-        if user_id:
-            self.history[user_id] = []
-        else:
-            self.history.clear()
+        for sid in ([user_id] if user_id else list(self.history)):
+            self.store.set_history(sid, [])
+        self.summarizer.forget(user_id)
         self.save()
 
     # === User Profiles ===
@@ -551,9 +958,9 @@ class UnifiedMemoryManager:
         """Add a thought to Aiko's stream."""
         return self.thought_stream.think(content, category, **kwargs)
 
-    def get_recent_thoughts(self, hours: int = 24) -> List[Dict]:
+    def get_recent_thoughts(self, hours: int = 24, category: str = None) -> List[Dict]:
         """Get recent thoughts."""
-        return self.thought_stream.get_recent_thoughts(hours)
+        return self.thought_stream.get_recent_thoughts(hours, category)
 
     # === File Links ===
 
@@ -565,27 +972,36 @@ class UnifiedMemoryManager:
         """Get Aiko's understanding of a file."""
         return self.file_graph.get_file_context(file_path)
 
-    def find_relevant_files(self, query: str, limit: int = 5) -> List[Dict]:
-        """Find files relevant to query."""
-        # Simple tag matching - could use embeddings in future
-        all_files = self.file_graph.get_linked_files()
-
-        query_lower = query.lower()
-        scored = []
-
-        for f in all_files:
-            score = 0
-            if any(tag in query_lower for tag in [t.lower() for t in f['tags']]):
-                score += 0.5
-            if f['file_type'].lower() in query_lower:
-                score += 0.3
-            score += f['relevance_score'] * 0.2
-
-            if score > 0:
-                scored.append((score, f))
-
-        scored.sort(reverse=True)
-        return [f for _, f in scored[:limit]]
+    def find_relevant_files(self, query: str, limit: int = 5, user_id: str = None,
+                            semantic: bool = False) -> List[Dict]:
+        """
+        Find files relevant to query.
+        Tag/type matches come from the graph's inverted indexes; with
+        `semantic=True` summary embeddings add up to 0.5 to the score.
+        """
+        graph = self.file_graph
+        scores = graph.match_query(query, user_id=user_id)
+        if semantic:
+            for similarity, link in graph.similar_files(query, limit=limit * 2, user_id=user_id):
+                key = graph._key(link['path'])
+                scores[key] = scores.get(key, 0.0) + max(similarity, 0.0) * 0.5
+
+        scored = [(score + graph._cache[k]['relevance_score'] * 0.2, graph._cache[k])
+                  for k, score in scores.items() if k in graph._cache]
+        scored.sort(key=lambda x: (x[0], x[1]['last_accessed']), reverse=True)
+        results = [f for _, f in scored[:limit]]
+
+        # Pad with the most relevant files overall, as the relevance term alone still scores
+        if len(results) < limit:
+            seen = {f['path'] for f in results}
+            for f in graph.get_linked_files(user_id=user_id):
+                if f['relevance_score'] <= 0:
+                    break
+                if f['path'] not in seen:
+                    results.append(f)
+                    if len(results) >= limit:
+                        break
+        return results
 
     # === Personality Integration ===
 
@@ -593,19 +1009,17 @@ class UnifiedMemoryManager:
         """Generate personality context from all memory systems."""
         context_parts = []
 
-        # Recent thoughts
-        recent_thoughts = self.get_recent_thoughts(hours=1)
+        # Recent thoughts (in-memory tail, no file reads)
+        cutoff = time.time() - 3600
+        recent_thoughts = [t for t in self.thought_stream.tail(3) if t['timestamp'] >= cutoff]
         if recent_thoughts:
             context_parts.append("## Recent Reflections")
-            for t in recent_thoughts[-3:]:  # Last 3
-                lines = t['content'].split('\n')
-                for line in lines[:5]:  # First 5 lines
-                    if line.strip() and not line.startswith('═'):
-                        context_parts.append(line)
-                        break
+            for t in recent_thoughts:
+                first_line = next((l for l in t['content'].split('\n') if l.strip()), "")
+                context_parts.append(f"- [{t['category']}] {first_line}")
 
         # Important files
-        important_files = self.file_graph.get_linked_files(min_relevance=0.7)[:5]
+        important_files = self.file_graph.get_linked_files(min_relevance=0.7, limit=5)
         if important_files:
             context_parts.append("\n## Files Important to Me")
             for f in important_files:
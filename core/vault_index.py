@@ -0,0 +1,353 @@
+"""
+AIKO VAULT INDEX
+════════════════
+Persistent SQLite index of an Obsidian vault.
+
+Per note it keeps stat info, title, frontmatter, tags, open/closed tasks and
+outgoing [[wikilinks]] (so backlinks are one indexed lookup), plus an FTS5
+full-text index. A refresh only re-parses notes whose mtime/size changed, and
+a DirectoryWatcher on the vault keeps the index current between refreshes, so
+listing, searching and TODO scans never walk a 10k-note vault again.
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from core.fs_watcher import DirectoryWatcher
+from core.lexical_index import tokenize
+
+logger = logging.getLogger("VaultIndex")
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+IGNORED_DIRS = {".obsidian", ".trash", ".git"}
+
+FRONTMATTER_PATTERN = re.compile(r"\A---\s*\n(.*?)\n---\s*(?:\n|\Z)", re.DOTALL)
+WIKILINK_PATTERN = re.compile(r"!?\[\[([^\]|#^]+)(?:[#^][^\]|]*)?(?:\|[^\]]*)?\]\]")
+TAG_PATTERN = re.compile(r"(?<![\w&/#])#([A-Za-z_][\w/-]*)")
+TASK_PATTERN = re.compile(r"^\s*[-*+]\s+\[([ xX])\]\s+(.*)$", re.MULTILINE)
+CODE_FENCE_PATTERN = re.compile(r"```.*?```", re.DOTALL)
+
+
+def link_key(name: str) -> str:
+    """Obsidian resolves links by note name: compare lowercase basenames without `.md`."""
+    name = Path(name.strip()).name
+    return (name[:-3] if name.lower().endswith(".md") else name).lower()
+
+
+def parse_frontmatter(text: str) -> Dict:
+    match = FRONTMATTER_PATTERN.match(text)
+    if not match:
+        return {}
+    block = match.group(1)
+    try:
+        import yaml
+        data = yaml.safe_load(block)
+        return data if isinstance(data, dict) else {}
+    except ImportError:
+        pass
+    except Exception:
+        return {}
+    data = {}  # Minimal `key: value` fallback without PyYAML
+    for line in block.splitlines():
+        if ":" in line and not line.startswith((" ", "-")):
+            key, value = line.split(":", 1)
+            data[key.strip()] = value.strip().strip("'\"")
+    return data
+
+
+def parse_note(text: str) -> Dict:
+    """Title, frontmatter, tags, wikilink targets and tasks of a note's markdown."""
+    frontmatter = parse_frontmatter(text)
+    body = FRONTMATTER_PATTERN.sub("", text, count=1)
+    scan = CODE_FENCE_PATTERN.sub("", body)
+
+    tags = set()
+    fm_tags = frontmatter.get("tags") or frontmatter.get("tag") or []
+    if isinstance(fm_tags, str):
+        fm_tags = re.split(r"[,\s]+", fm_tags)
+    tags.update(str(t).lstrip("#").lower() for t in fm_tags if t)
+    tags.update(t.lower() for t in TAG_PATTERN.findall(scan))
+
+    title = str(frontmatter.get("title") or "")
+    if not title:
+        heading = re.search(r"^#\s+(.+)$", scan, re.MULTILINE)
+        title = heading.group(1).strip() if heading else ""
+
+    return {
+        "title": title,
+        "frontmatter": frontmatter,
+        "body": body,
+        "tags": sorted(tags),
+        "links": sorted({link_key(t) for t in WIKILINK_PATTERN.findall(scan) if t.strip()}),
+        "tasks": [(mark != " ", task.strip()) for mark, task in TASK_PATTERN.findall(scan)],
+    }
+
+
+class VaultIndex:
+    """Notes, tags, tasks and the link graph of one vault, with FTS search."""
+
+    def __init__(self, vault_path, db_path: str = None):
+        self.vault = Path(vault_path).resolve()
+        tag = hashlib.md5(str(self.vault).encode()).hexdigest()[:10]
+        self.db_path = str(db_path or DATA_DIR / f"vault_index_{tag}.db")
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._watcher: Optional[DirectoryWatcher] = None
+        self.fresh = False  # True after a full refresh in this process
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Get thread-local database connection."""
+        if getattr(self._local, "conn", None) is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return self._local.conn
+
+    def _init_db(self):
+        conn = self._get_conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                title TEXT,
+                mtime REAL,
+                size INTEGER,
+                frontmatter TEXT
+            );
+            CREATE TABLE IF NOT EXISTS tags (
+                path TEXT NOT NULL REFERENCES notes(path) ON DELETE CASCADE,
+                tag TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS links (
+                src TEXT NOT NULL REFERENCES notes(path) ON DELETE CASCADE,
+                dst TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                path TEXT NOT NULL REFERENCES notes(path) ON DELETE CASCADE,
+                position INTEGER,
+                done INTEGER,
+                text TEXT
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                path UNINDEXED, title, body, tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE INDEX IF NOT EXISTS idx_notes_name ON notes (name);
+            CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags (tag);
+            CREATE INDEX IF NOT EXISTS idx_tags_path ON tags (path);
+            CREATE INDEX IF NOT EXISTS idx_links_dst ON links (dst);
+            CREATE INDEX IF NOT EXISTS idx_links_src ON links (src);
+            CREATE INDEX IF NOT EXISTS idx_tasks_open ON tasks (done, path);
+        """)
+        conn.commit()
+
+    # --- Indexing ---
+
+    def _rel(self, path) -> Optional[str]:
+        p = Path(path)
+        if not p.is_absolute():
+            p = self.vault / p
+        try:
+            rel = p.resolve().relative_to(self.vault)
+        except ValueError:
+            return None
+        if p.suffix.lower() != ".md" or any(part in IGNORED_DIRS for part in rel.parts[:-1]):
+            return None
+        return rel.as_posix()
+
+    def _scan(self) -> Dict[str, tuple]:
+        """rel path -> (mtime, size) for every note, pruning ignored folders."""
+        found = {}
+        stack = [str(self.vault)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in IGNORED_DIRS:
+                                    stack.append(entry.path)
+                            elif entry.name.lower().endswith(".md") and entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                rel = Path(entry.path).relative_to(self.vault).as_posix()
+                                found[rel] = (st.st_mtime, st.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return found
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index in line with the vault, re-parsing only notes whose stat changed."""
+        on_disk = self._scan()
+        known = {row["path"]: (row["mtime"], row["size"])
+                 for row in self._get_conn().execute("SELECT path, mtime, size FROM notes")}
+        changed = [rel for rel, sig in on_disk.items() if known.get(rel) != sig]
+        removed = [rel for rel in known if rel not in on_disk]
+        for rel in changed:
+            self.index_note(rel)
+        for rel in removed:
+            self.remove_note(rel)
+        self.fresh = True
+        if changed or removed:
+            logger.info(f" [Vault] Indexed {len(changed)} notes, removed {len(removed)} ({len(on_disk)} total).")
+        return {"indexed": len(changed), "removed": len(removed), "total": len(on_disk)}
+
+    def index_note(self, path) -> bool:
+        """(Re)index one note; removes it from the index if it no longer exists."""
+        rel = self._rel(path)
+        if rel is None:
+            return False
+        full = self.vault / rel
+        try:
+            st = full.stat()
+            text = full.read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            self.remove_note(rel)
+            return False
+
+        note = parse_note(text)
+        conn = self._get_conn()
+        with self._write_lock:
+            try:
+                self._delete_rows(conn, rel)
+                conn.execute(
+                    "INSERT INTO notes (path, name, title, mtime, size, frontmatter) VALUES (?, ?, ?, ?, ?, ?)",
+                    (rel, link_key(rel), note["title"], st.st_mtime, st.st_size,
+                     json.dumps(note["frontmatter"], ensure_ascii=False, default=str))
+                )
+                conn.executemany("INSERT INTO tags (path, tag) VALUES (?, ?)", [(rel, t) for t in note["tags"]])
+                conn.executemany("INSERT INTO links (src, dst) VALUES (?, ?)", [(rel, d) for d in note["links"]])
+                conn.executemany("INSERT INTO tasks (path, position, done, text) VALUES (?, ?, ?, ?)",
+                                 [(rel, i, int(done), task) for i, (done, task) in enumerate(note["tasks"])])
+                conn.execute("INSERT INTO notes_fts (path, title, body) VALUES (?, ?, ?)",
+                             (rel, note["title"], note["body"]))
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f" [Vault] Index error ({rel}): {e}")
+                return False
+
+    def remove_note(self, path):
+        rel = self._rel(path) or Path(path).as_posix()
+        conn = self._get_conn()
+        with self._write_lock:
+            self._delete_rows(conn, rel)
+            conn.commit()
+
+    @staticmethod
+    def _delete_rows(conn: sqlite3.Connection, rel: str):
+        conn.execute("DELETE FROM notes WHERE path = ?", (rel,))  # Cascades to tags/links/tasks
+        conn.execute("DELETE FROM notes_fts WHERE path = ?", (rel,))
+
+    # --- Watching ---
+
+    def start_watching(self):
+        """Keep the index current from filesystem events (initial refresh included)."""
+        if self._watcher is not None:
+            return
+        self.refresh()
+        self._watcher = DirectoryWatcher(self.vault, self._on_change, debounce=1.0,
+                                         patterns=["*.md"], ignore_dirs=IGNORED_DIRS)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _on_change(self, paths: Iterable[str]):
+        for path in paths:
+            self.index_note(path)  # Missing files are removed from the index
+
+    # --- Queries ---
+
+    def list_notes(self) -> List[str]:
+        return [row["path"] for row in self._get_conn().execute("SELECT path FROM notes ORDER BY path")]
+
+    def count(self) -> int:
+        return self._get_conn().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def get_note(self, path) -> Optional[Dict]:
+        """Metadata of one note: title, frontmatter, tags, outgoing links, tasks."""
+        rel = self._rel(path)
+        conn = self._get_conn()
+        row = conn.execute("SELECT * FROM notes WHERE path = ?", (rel,)).fetchone() if rel else None
+        if row is None:
+            return None
+        return {
+            "path": rel,
+            "title": row["title"],
+            "mtime": row["mtime"],
+            "frontmatter": json.loads(row["frontmatter"] or "{}"),
+            "tags": [r["tag"] for r in conn.execute("SELECT tag FROM tags WHERE path = ?", (rel,))],
+            "links": [r["dst"] for r in conn.execute("SELECT dst FROM links WHERE src = ?", (rel,))],
+            "tasks": [{"done": bool(r["done"]), "text": r["text"]}
+                      for r in conn.execute("SELECT done, text FROM tasks WHERE path = ? ORDER BY position", (rel,))],
+        }
+
+    def search(self, query: str, limit: int = 10, tag: str = None) -> List[Dict]:
+        """BM25 full-text search over titles and bodies, optionally within one tag."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        sql = """
+            SELECT f.path, n.title, snippet(notes_fts, 2, '[', ']', '…', 12) AS snippet, bm25(notes_fts, 0, 5.0, 1.0) AS score
+            FROM notes_fts f JOIN notes n ON n.path = f.path
+            WHERE notes_fts MATCH ?
+        """
+        params: list = [" OR ".join(f'"{t}"' for t in terms)]
+        if tag:
+            sql += " AND f.path IN (SELECT path FROM tags WHERE tag = ?)"
+            params.append(tag.lstrip("#").lower())
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        try:
+            rows = self._get_conn().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f" [Vault] Search error: {e}")
+            return []
+        return [{"path": r["path"], "title": r["title"], "snippet": r["snippet"], "score": -r["score"]} for r in rows]
+
+    def backlinks(self, note: str) -> List[str]:
+        """Notes linking to `note` (a path or a note name)."""
+        rows = self._get_conn().execute("SELECT DISTINCT src FROM links WHERE dst = ? ORDER BY src", (link_key(note),))
+        return [r["src"] for r in rows]
+
+    def outlinks(self, note: str) -> List[str]:
+        """Existing notes that `note` links to (unresolved links are skipped)."""
+        rel = self._rel(note)
+        rows = self._get_conn().execute("""
+            SELECT DISTINCT n.path FROM links l JOIN notes n ON n.name = l.dst
+            WHERE l.src = ? ORDER BY n.path
+        """, (rel,))
+        return [r["path"] for r in rows]
+
+    def notes_with_tag(self, tag: str) -> List[str]:
+        rows = self._get_conn().execute("SELECT DISTINCT path FROM tags WHERE tag = ? ORDER BY path",
+                                        (tag.lstrip("#").lower(),))
+        return [r["path"] for r in rows]
+
+    def open_tasks(self, path: str = None, limit: int = 100) -> List[Dict]:
+        """Unchecked `- [ ]` items, for one note or the whole vault (newest notes first)."""
+        sql = "SELECT t.path, t.text FROM tasks t JOIN notes n ON n.path = t.path WHERE t.done = 0"
+        params: list = []
+        if path:
+            sql += " AND t.path = ?"
+            params.append(self._rel(path))
+        sql += " ORDER BY n.mtime DESC, t.position LIMIT ?"
+        params.append(limit)
+        return [{"path": r["path"], "text": r["text"]} for r in self._get_conn().execute(sql, params)]
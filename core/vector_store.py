@@ -0,0 +1,312 @@
+"""
+AIKO LOCAL VECTOR STORE
+═══════════════════════
+Dependency-light, in-process vector store used when neither MemPalace nor
+ChromaDB can be opened (Docker, cloud, minimal installs).
+
+Layout (data/vector_store/):
+- embeddings.f16   unit-normalized float16 rows, memory-mapped for search
+- records.jsonl    append-only log of {row, id, text, meta} and tombstones
+- store.json       embedding dimension and model name
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("VectorStore")
+
+STORE_DIR = Path(__file__).parent.parent / "data" / "vector_store"
+APPROX_THRESHOLD = 50_000   # Rows above which search pre-filters with sign-projection codes
+APPROX_CANDIDATES = 64      # Candidates re-ranked exactly per requested result
+CODE_BITS = 64
+SEARCH_BLOCK = 16_384       # Rows converted to float32 at a time during exact scoring
+COMPACT_MIN_DEAD = 1_000    # Tombstoned rows before the store rewrites itself...
+COMPACT_DEAD_RATIO = 0.25   # ...once they are also this share of all rows
+
+
+def _matches(meta: Dict, where: Optional[Dict]) -> bool:
+    """Chroma-style equality filter, with `$and` / `$in` support."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_matches(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict) and "$in" in cond:
+            if meta.get(key) not in cond["$in"]:
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+class LocalVectorStore:
+    """Float16 memory-mapped embeddings with exact or approximate numpy search."""
+
+    def __init__(self, embedder, store_dir: Path = None):
+        self.embedder = embedder
+        self.store_dir = Path(store_dir or STORE_DIR)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.store_dir / "embeddings.f16"
+        self.records_path = self.store_dir / "records.jsonl"
+        self.info_path = self.store_dir / "store.json"
+
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metas: List[Dict] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.id_to_row: Dict[str, int] = {}
+        self._mm = None
+        self._codes = None
+        self._planes = None
+        self._lock = threading.RLock()
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        if self.info_path.exists():
+            info = json.loads(self.info_path.read_text(encoding="utf-8"))
+            self.dim = info.get("dim")
+            if info.get("model") and info["model"] != getattr(self.embedder, "name", info["model"]):
+                logger.warning(f" [VectorStore] Store was built with {info['model']}; "
+                               f"embeddings from {self.embedder.name} are not comparable.")
+
+        records: Dict[int, Dict] = {}
+        deleted = set()
+        if self.records_path.exists():
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn final line after a crash
+                    if rec.get("deleted"):
+                        deleted.add(rec["row"])
+                    else:
+                        records[rec["row"]] = rec  # A later record for the same row is the one that counts
+
+        # Rows exist only where a record and a fully-written vector both do; a crash between
+        # writing vectors and their records leaves orphan vectors, one before fsync leaves records
+        n_vectors = self._vector_rows()
+        n_rows = min(max(records, default=-1) + 1, n_vectors)
+        repaired = n_vectors != n_rows or any(row >= n_rows for row in records)
+        if repaired:
+            logger.warning(f" [VectorStore] Recovering from an interrupted write: {n_vectors} vector rows, "
+                           f"{len(records)} records, keeping {n_rows} rows.")
+        alive = []
+        for row in range(n_rows):
+            rec = records.get(row)
+            self.ids.append(rec["id"] if rec else "")
+            self.texts.append(rec["text"] if rec else "")
+            self.metas.append(rec.get("meta", {}) if rec else {})
+            alive.append(rec is not None and row not in deleted)
+            if alive[row]:
+                old = self.id_to_row.get(rec["id"])
+                if old is not None:
+                    alive[old] = False
+                self.id_to_row[rec["id"]] = row
+        self.alive = np.array(alive, dtype=bool)
+        if n_vectors > n_rows:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(n_rows * self.dim * 2)
+        self._remap()
+        if repaired:
+            self.compact(force=True)  # Rewrite the log so row numbers and vectors line up again
+        else:
+            self._maybe_compact()
+
+    def _vector_rows(self) -> int:
+        if not self.dim or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (self.dim * 2)
+
+    def _remap(self):
+        n = len(self.ids)
+        self._mm = None
+        if n and self.dim:
+            self._mm = np.memmap(self.vectors_path, dtype="<f2", mode="r", shape=(n, self.dim))
+            if n > APPROX_THRESHOLD and self._codes is None:
+                self._codes = self._encode(self._mm)
+
+    def _append_records(self, records: List[Dict]):
+        with open(self.records_path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+    # --- Approximate search codes ---
+
+    def _encode(self, vectors) -> np.ndarray:
+        """64-bit sign-random-projection code per row (SimHash of the embedding)."""
+        if self._planes is None:
+            rng = np.random.default_rng(1337)
+            self._planes = rng.standard_normal((self.dim, CODE_BITS)).astype(np.float32)
+        codes = []
+        for start in range(0, len(vectors), SEARCH_BLOCK):
+            block = np.asarray(vectors[start:start + SEARCH_BLOCK], dtype=np.float32)
+            codes.append(np.packbits(block @ self._planes > 0, axis=1))
+        return np.concatenate(codes) if codes else np.zeros((0, CODE_BITS // 8), dtype=np.uint8)
+
+    # --- Public API ---
+
+    def add(self, texts: List[str], metadatas: List[Dict] = None, ids: List[str] = None) -> List[str]:
+        """Embed and append documents. Re-using an ID supersedes the old row."""
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        vectors = np.asarray(self.embedder.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.maximum(norms, 1e-12)).astype("<f2")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self.info_path.write_text(json.dumps({
+                    "dim": self.dim, "model": getattr(self.embedder, "name", "unknown"), "created": time.time()
+                }), encoding="utf-8")
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != store dim {self.dim}")
+
+            start = len(self.ids)
+            self._mm = None  # Windows refuses to resize a file that is still mapped
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(start * self.dim * 2)  # Drop vectors of an earlier add that failed before its records
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            records = []
+            alive = np.ones(len(texts), dtype=bool)
+            for i, (doc_id, text, meta) in enumerate(zip(ids, texts, metadatas)):
+                row = start + i
+                old = self.id_to_row.get(doc_id)
+                if old is not None:
+                    self.alive[old] = False
+                self.ids.append(doc_id)
+                self.texts.append(text)
+                self.metas.append(dict(meta or {}))
+                self.id_to_row[doc_id] = row
+                records.append({"row": row, "id": doc_id, "text": text, "meta": meta or {}})
+            self._append_records(records)
+            self.alive = np.concatenate([self.alive, alive])
+            if self._codes is not None:
+                self._codes = np.concatenate([self._codes, self._encode(vectors)])
+            self._remap()
+        return ids
+
+    def update_meta(self, ids: List[str], meta: Dict) -> int:
+        """Merge `meta` into the metadata of existing rows (no re-embedding). Returns rows updated."""
+        with self._lock:
+            records = []
+            for doc_id in ids:
+                row = self.id_to_row.get(doc_id)
+                if row is None:
+                    continue
+                self.metas[row] = {**self.metas[row], **meta}
+                records.append({"row": row, "id": doc_id, "text": self.texts[row], "meta": self.metas[row]})
+            if records:
+                self._append_records(records)  # A later record for a row supersedes the earlier one
+            return len(records)
+
+    def delete(self, ids: List[str] = None, where: Dict = None) -> int:
+        """Tombstone rows by ID or metadata filter."""
+        with self._lock:
+            rows = set()
+            for doc_id in ids or []:
+                if doc_id in self.id_to_row:
+                    rows.add(self.id_to_row[doc_id])
+            if where:
+                rows.update(r for r in np.flatnonzero(self.alive) if _matches(self.metas[r], where))
+            if not rows:
+                return 0
+            for r in rows:
+                self.alive[r] = False
+                self.id_to_row.pop(self.ids[r], None)
+            self._append_records([{"row": int(r), "deleted": True} for r in sorted(rows)])
+            self._maybe_compact()
+            return len(rows)
+
+    def query(self, text: str, n_results: int = 5, where: Dict = None) -> List[Dict]:
+        """Cosine search; exact below APPROX_THRESHOLD rows, SimHash-prefiltered above."""
+        if self._mm is None or not self.alive.any():
+            return []
+        q = np.asarray(self.embedder.embed([text])[0], dtype=np.float32)
+        q /= max(np.linalg.norm(q), 1e-12)
+
+        # Rows, texts and metas are resolved under the lock: compact() renumbers them and swaps
+        # the vectors file, which also must not happen while the memmap is being read
+        with self._lock:
+            return self._search(q, n_results, where)
+
+    def _search(self, q: np.ndarray, n_results: int, where: Dict = None) -> List[Dict]:
+        mm, codes = self._mm, self._codes
+        if mm is None:
+            return []
+        candidates = np.flatnonzero(self.alive[:len(mm)])
+        if where:
+            candidates = np.array([r for r in candidates if _matches(self.metas[r], where)], dtype=np.int64)
+        if not len(candidates):
+            return []
+
+        if codes is not None and len(candidates) > n_results * APPROX_CANDIDATES:
+            q_code = np.packbits((q @ self._planes) > 0)
+            hamming = np.unpackbits(codes[candidates] ^ q_code, axis=1).sum(axis=1)
+            keep = np.argpartition(hamming, n_results * APPROX_CANDIDATES)[:n_results * APPROX_CANDIDATES]
+            candidates = np.sort(candidates[keep])
+
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), SEARCH_BLOCK):
+            rows = candidates[start:start + SEARCH_BLOCK]
+            scores[start:start + len(rows)] = np.asarray(mm[rows], dtype=np.float32) @ q
+
+        k = min(n_results, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{
+            "text": self.texts[candidates[i]],
+            "meta": {**self.metas[candidates[i]], "similarity": float(scores[i])},
+        } for i in top]
+
+    def count(self) -> int:
+        return int(self.alive.sum())
+
+    def _maybe_compact(self):
+        dead = len(self.ids) - self.count()
+        if dead >= COMPACT_MIN_DEAD and dead > len(self.ids) * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self, force: bool = False):
+        """Rewrite the store without tombstoned rows (runs on its own once they pile up)."""
+        with self._lock:
+            keep = np.flatnonzero(self.alive)
+            if len(keep) == len(self.ids) and not force:
+                return
+            tmp_vectors = self.vectors_path.with_suffix(".tmp")
+            tmp_records = self.records_path.with_suffix(".tmp")
+            with open(tmp_vectors, "wb") as vf, open(tmp_records, "w", encoding="utf-8") as rf:
+                for new_row, old_row in enumerate(keep):
+                    vf.write(np.asarray(self._mm[old_row]).tobytes())
+                    rf.write(json.dumps({"row": new_row, "id": self.ids[old_row], "text": self.texts[old_row],
+                                         "meta": self.metas[old_row]}, ensure_ascii=False, default=str) + "\n")
+            self._mm = None
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_records, self.records_path)
+            self.ids = [self.ids[r] for r in keep]
+            self.texts = [self.texts[r] for r in keep]
+            self.metas = [self.metas[r] for r in keep]
+            self.alive = np.ones(len(keep), dtype=bool)
+            self.id_to_row = {doc_id: i for i, doc_id in enumerate(self.ids)}
+            self._codes = None
+            self._remap()
+            logger.info(f" [VectorStore] Compacted to {len(keep)} rows.")
@@ -0,0 +1,17 @@
+"""Shared fixtures: stores that write under a temporary directory instead of data/."""
+
+import pytest
+
+import core.conversation_store as conversation_store
+import core.conversation_summarizer as conversation_summarizer
+import core.session_archive as session_archive
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A ConversationStore whose sessions, summaries and archive all live in tmp_path."""
+    monkeypatch.setattr(conversation_summarizer, "_summarizer",
+                        conversation_summarizer.ConversationSummarizer(store_path=tmp_path / "summaries.json"))
+    monkeypatch.setattr(session_archive, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(conversation_store, "LEGACY_UNIFIED_HISTORY", tmp_path / "conversation_history.json")
+    return conversation_store.ConversationStore(tmp_path / "shared_memory.json")
@@ -0,0 +1,61 @@
+"""Conversation tree: branching, checkout and rewind (user-037)."""
+
+from core.conversation_store import ConversationStore
+
+
+def _contents(store, sid):
+    return [m["content"] for m in store.messages(sid)]
+
+
+def test_append_builds_a_parent_chain(store):
+    a = store.append("u", "user", "hi")
+    b = store.append("u", "assistant", "hello")
+
+    assert b["parent"] == a["id"]
+    assert _contents(store, "u") == ["hi", "hello"]
+
+
+def test_regeneration_creates_a_sibling_and_checkout_switches_branches(store):
+    store.append("u", "user", "hi")
+    first = store.append("u", "assistant", "hello")
+    store.append("u", "user", "how are you?")
+
+    assert store.fork_before("u", first["id"])
+    second = store.append("u", "assistant", "hey there")
+
+    assert store.siblings("u", first["id"]) == [first["id"], second["id"]]
+    assert _contents(store, "u") == ["hi", "hey there"]
+
+    assert store.checkout("u", first["id"], to_leaf=True)  # Back to the tip of the old branch
+    assert _contents(store, "u") == ["hi", "hello", "how are you?"]
+
+
+def test_rewind_keeps_later_turns_reachable(store):
+    turns = [store.append("u", "user", f"m{i}") for i in range(4)]
+
+    assert store.rewind("u", 2)
+    assert _contents(store, "u") == ["m0", "m1"]
+    assert not store.rewind("u", 5)
+
+    assert store.checkout("u", turns[3]["id"])
+    assert _contents(store, "u") == ["m0", "m1", "m2", "m3"]
+
+
+def test_checkout_rejects_unknown_messages(store):
+    store.append("u", "user", "hi")
+
+    assert not store.checkout("u", "no-such-id")
+    assert not store.checkout("nobody", None)
+    assert _contents(store, "u") == ["hi"]
+
+
+def test_tree_and_head_survive_a_reload(store):
+    store.append("u", "user", "hi")
+    first = store.append("u", "assistant", "hello")
+    store.fork_before("u", first["id"])
+    store.append("u", "assistant", "hey there")
+    store.flush()
+
+    reloaded = ConversationStore(store.path)
+    assert _contents(reloaded, "u") == ["hi", "hey there"]
+    assert len(reloaded.siblings("u", first["id"])) == 2
@@ -0,0 +1,59 @@
+"""SimHash near-duplicate index: matching, scopes and forgetting (user-040)."""
+
+from core.dedup import NearDuplicateIndex, dedup_scope, simhash, similarity
+
+TEXT = "the user prefers green tea in the morning and coffee after lunch on weekdays"
+SCOPE = dedup_scope({"user_id": "alice"}, room="preferences")
+
+
+def _index(tmp_path, threshold=0.9):
+    return NearDuplicateIndex(tmp_path / "dedup.db", threshold=threshold)
+
+
+def test_simhash_is_stable_and_close_for_small_edits():
+    assert simhash(TEXT) == simhash(TEXT)
+    assert similarity(simhash(TEXT), simhash(TEXT + " too")) > similarity(
+        simhash(TEXT), simhash("completely unrelated note about a dentist appointment next friday"))
+
+
+def test_repeat_is_reported_with_bumped_counter(tmp_path):
+    index = _index(tmp_path)
+    entry_id = index.add(TEXT, SCOPE, refs=["vec-1"])
+
+    hit = index.check(TEXT, SCOPE)
+    assert hit["id"] == entry_id
+    assert hit["refs"] == ["vec-1"]
+    assert hit["seen_count"] == 2
+    assert hit["similarity"] == 1.0
+    assert index.check(TEXT, SCOPE)["seen_count"] == 3
+
+
+def test_new_text_is_not_a_duplicate(tmp_path):
+    index = _index(tmp_path)
+    index.add(TEXT, SCOPE, refs=["vec-1"])
+    assert index.check("completely unrelated note about a dentist appointment next friday", SCOPE) is None
+    assert index.check("   ", SCOPE) is None
+
+
+def test_duplicates_are_scoped_per_user_and_room(tmp_path):
+    index = _index(tmp_path)
+    index.add(TEXT, SCOPE, refs=["vec-1"])
+    assert index.check(TEXT, dedup_scope({"user_id": "bob"}, room="preferences")) is None
+    assert index.check(TEXT, dedup_scope({"user_id": "alice", "room": "diary"})) is None
+    assert dedup_scope() == "general|"
+
+
+def test_forget_and_disabled_threshold(tmp_path):
+    index = _index(tmp_path)
+    entry_id = index.add(TEXT, SCOPE, refs=["vec-1"])
+    index.forget(entry_id)
+    assert index.check(TEXT, SCOPE) is None
+
+    disabled = _index(tmp_path, threshold=1.5)
+    disabled.add(TEXT, SCOPE)
+    assert disabled.check(TEXT, SCOPE) is None
+
+
+def test_fingerprints_survive_reopen(tmp_path):
+    _index(tmp_path).add(TEXT, SCOPE, refs=["vec-1", "vec-2"])
+    assert _index(tmp_path).check(TEXT, SCOPE)["refs"] == ["vec-1", "vec-2"]
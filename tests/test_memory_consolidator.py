@@ -0,0 +1,81 @@
+"""Checkpointed, patch-based profile consolidation (user-034)."""
+
+import asyncio
+import json
+
+import pytest
+
+import core.memory_consolidator as memory_consolidator
+from core.memory_consolidator import MemoryConsolidator, apply_patch, MAX_PATCH_FAILURES
+
+
+@pytest.fixture
+def consolidator(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_consolidator, "PROFILE_FILE", str(tmp_path / "master_profile.json"))
+    monkeypatch.setattr(memory_consolidator, "STATE_FILE", str(tmp_path / "consolidation_state.json"))
+    monkeypatch.setattr(memory_consolidator, "CHUNK_MESSAGES", 2)
+    return MemoryConsolidator()
+
+
+def _history(n):
+    return [{"role": "user", "content": f"m{i}", "timestamp": float(i)} for i in range(1, n + 1)]
+
+
+def _patch_per_message(chunks):
+    async def request_patch(chunk):
+        chunks.append([m["content"] for m in chunk])
+        return {"add": {"seen": [m["content"] for m in chunk]}}
+    return request_patch
+
+
+def test_apply_patch_adds_updates_and_removes():
+    profile = {"likes": ["coffee"], "old_job": "barista"}
+    changes = apply_patch(profile, {
+        "add": {"likes": ["matcha", "coffee"]},
+        "update": {"relationship.score": 7.5},
+        "remove": {"likes": ["coffee"], "old_job": None},
+    })
+
+    assert profile == {"likes": ["matcha"], "relationship": {"score": 7.5}}
+    assert changes == 4
+
+
+def test_checkpoint_advances_per_chunk_and_resumes(consolidator):
+    chunks = []
+    consolidator._request_patch = _patch_per_message(chunks)
+
+    assert asyncio.run(consolidator.consolidate(_history(5), "u", max_chunks=2)) is False
+    assert consolidator.checkpoint("u") == 4.0
+
+    assert asyncio.run(consolidator.consolidate(_history(5), "u")) is True
+    assert chunks == [["m1", "m2"], ["m3", "m4"], ["m5"]]  # Nothing sent twice
+    assert consolidator.profile_cache["seen"] == ["m1", "m2", "m3", "m4", "m5"]
+
+    reloaded = MemoryConsolidator()
+    assert reloaded.checkpoint("u") == 5.0
+
+
+def test_unavailable_llm_keeps_the_checkpoint(consolidator):
+    async def offline(chunk):
+        return None
+    consolidator._request_patch = offline
+
+    assert asyncio.run(consolidator.consolidate(_history(3), "u")) is False
+    assert consolidator.checkpoint("u") == 0.0
+
+
+def test_chunk_that_never_parses_is_skipped_after_max_failures(consolidator):
+    async def request_patch(chunk):
+        if chunk[0]["content"] == "m1":
+            raise json.JSONDecodeError("bad", "", 0)
+        return {"add": {"seen": [m["content"] for m in chunk]}}
+    consolidator._request_patch = request_patch
+
+    for _ in range(MAX_PATCH_FAILURES - 1):
+        assert asyncio.run(consolidator.consolidate(_history(3), "u")) is False
+        assert consolidator.checkpoint("u") == 0.0
+
+    assert asyncio.run(consolidator.consolidate(_history(3), "u")) is True
+    assert consolidator.checkpoint("u") == 3.0
+    assert consolidator.profile_cache["seen"] == ["m3"]
+    assert "failures" not in consolidator.state["u"]
@@ -0,0 +1,91 @@
+"""MessageQueue claims and leases (user-049)."""
+
+import threading
+import time
+
+from core.message_queue import MessageQueue, MAX_DELIVERIES
+
+
+def test_concurrent_consumers_claim_each_message_once(tmp_path):
+    db = tmp_path / "queue.db"
+    producer = MessageQueue(db)
+    for i in range(200):
+        producer.enqueue("discord_in", {"n": i})
+
+    claimed = []
+    lock = threading.Lock()
+
+    def consume(name):
+        queue = MessageQueue(db)  # One instance (and connection) per consumer, like separate processes
+        while True:
+            batch = queue.dequeue("discord_in", processor_id=name, batch_size=7)
+            if not batch:
+                return
+            with lock:
+                claimed.extend(m["payload"]["n"] for m in batch)
+
+    threads = [threading.Thread(target=consume, args=(f"c{i}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(claimed) == list(range(200))
+
+
+def test_claims_follow_priority_then_age(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db")
+    queue.enqueue("q", {"n": "low"}, priority=9)
+    queue.enqueue("q", {"n": "first"}, priority=1)
+    queue.enqueue("q", {"n": "second"}, priority=1)
+
+    assert [m["payload"]["n"] for m in queue.dequeue("q", batch_size=3)] == ["first", "second", "low"]
+
+
+def test_expired_lease_is_redelivered(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db", lease_seconds=0.05)
+    msg_id = queue.enqueue("q", {"n": 1})
+
+    first = queue.dequeue("q", processor_id="a")
+    assert [m["id"] for m in first] == [msg_id] and first[0]["retry_count"] == 0
+    assert queue.dequeue("q", processor_id="b") == []  # Invisible while leased
+
+    time.sleep(0.1)
+    assert queue.reclaim_expired() == 1
+    again = queue.dequeue("q", processor_id="b")
+    assert [m["id"] for m in again] == [msg_id] and again[0]["retry_count"] == 1
+
+
+def test_extended_lease_keeps_message_claimed(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db", lease_seconds=0.05)
+    msg_id = queue.enqueue("q", {"n": 1})
+    queue.dequeue("q", processor_id="a")
+
+    assert queue.extend_lease(msg_id, seconds=60, processor_id="a")
+    assert not queue.extend_lease(msg_id, seconds=60, processor_id="someone-else")
+    time.sleep(0.1)
+    assert queue.reclaim_expired() == 0
+    assert queue.dequeue("q", processor_id="b") == []
+
+
+def test_acknowledged_message_is_gone(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db", lease_seconds=0.05)
+    msg_id = queue.enqueue("q", {"n": 1})
+    queue.dequeue("q")
+    queue.acknowledge(msg_id)
+
+    time.sleep(0.1)
+    assert queue.reclaim_expired() == 0
+    assert queue.dequeue("q") == []
+
+
+def test_message_is_not_reclaimed_after_max_deliveries(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db", lease_seconds=0.01)
+    queue.enqueue("q", {"n": 1})
+
+    for _ in range(MAX_DELIVERIES):
+        assert len(queue.dequeue("q")) == 1
+        time.sleep(0.02)
+        queue.reclaim_expired()
+
+    assert queue.dequeue("q") == []
@@ -0,0 +1,90 @@
+"""ConsumerPool lanes: per-conversation order, retries and shutdown (user-050)."""
+
+import asyncio
+
+import core.queue_workers as queue_workers
+from core.message_queue import MessageQueue, MAX_DELIVERIES
+from core.queue_workers import ConsumerPool
+
+
+async def _drain(pool):
+    """Poll until nothing is left to claim and every lane has finished."""
+    while pool.poll() or pool._held:
+        await asyncio.sleep(0.01)
+
+
+def test_turns_of_one_conversation_run_in_order(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db")
+    for i in range(6):
+        for user in ("alice", "bob"):
+            queue.enqueue("discord_in", {"user_id": user, "n": i})
+    seen = {"alice": [], "bob": []}
+    running = set()
+    overlapped = []
+
+    async def handler(name, msg):
+        user = msg['payload']['user_id']
+        overlapped.append(user in running)
+        running.add(user)
+        await asyncio.sleep(0.005)
+        running.discard(user)
+        seen[user].append(msg['payload']['n'])
+
+    pool = ConsumerPool(queue, handler, ["discord_in"], max_concurrency=4)
+    asyncio.run(_drain(pool))
+    assert seen == {"alice": list(range(6)), "bob": list(range(6))}
+    assert not any(overlapped)
+    assert pool.stats()["queues"]["discord_in"]["processed"] == 12
+
+
+def test_failed_turn_is_retried_in_place_with_attempt_stamp(tmp_path, monkeypatch):
+    monkeypatch.setattr(queue_workers, "RETRY_DELAY", 0.01)
+    queue = MessageQueue(tmp_path / "queue.db")
+    queue.enqueue("discord_in", {"user_id": "alice", "n": 0})
+    queue.enqueue("discord_in", {"user_id": "alice", "n": 1})
+    calls = []
+
+    async def handler(name, msg):
+        calls.append((msg['payload']['n'], msg['attempt']))
+        if msg['payload']['n'] == 0 and msg['attempt'] < 2:
+            raise RuntimeError("transient")
+
+    pool = ConsumerPool(queue, handler, ["discord_in"])
+    asyncio.run(_drain(pool))
+    assert calls == [(0, 1), (0, 2), (1, 1)]
+    assert pool.stats()["queues"]["discord_in"]["failed"] == 1
+
+
+def test_message_is_dropped_after_max_deliveries(tmp_path, monkeypatch):
+    monkeypatch.setattr(queue_workers, "RETRY_DELAY", 0.001)
+    queue = MessageQueue(tmp_path / "queue.db")
+    queue.enqueue("discord_in", {"user_id": "alice"})
+    attempts = []
+
+    async def handler(name, msg):
+        attempts.append(msg['attempt'])
+        raise RuntimeError("always")
+
+    pool = ConsumerPool(queue, handler, ["discord_in"])
+    asyncio.run(_drain(pool))
+    assert attempts == list(range(1, MAX_DELIVERIES + 1))
+
+
+def test_close_cancels_running_lanes(tmp_path):
+    queue = MessageQueue(tmp_path / "queue.db")
+    queue.enqueue("discord_in", {"user_id": "alice"})
+    started = []
+
+    async def handler(name, msg):
+        started.append(msg['id'])
+        await asyncio.sleep(60)
+
+    async def run():
+        pool = ConsumerPool(queue, handler, ["discord_in"])
+        pool.poll()
+        await asyncio.sleep(0.01)
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert started and not pool._tasks and not pool._lanes
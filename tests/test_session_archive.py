@@ -0,0 +1,66 @@
+"""Cold-tier archive: archiving, restore and erasure (user-038)."""
+
+import time
+
+from core.session_archive import SessionArchive
+
+
+def _age(store, sid, days):
+    """Backdate every turn of a session so it counts as idle."""
+    for message in store.session(sid)["nodes"].values():
+        message["timestamp"] -= days * 86400
+
+
+def _segment_text(archive: SessionArchive) -> bytes:
+    return b"".join(archive._decompress(p) for p in archive.archive_dir.glob("sessions-*.jsonl.*"))
+
+
+def test_segments_are_encrypted(tmp_path):
+    archive = SessionArchive(tmp_path)
+    archive.archive({"u": {"nodes": {"1": {"content": "secret words"}}}}, {"u": {"lastActive": time.time()}})
+
+    raw = b"".join(p.read_bytes() for p in tmp_path.glob("sessions-*"))
+    assert b"secret words" not in raw
+    assert archive.read("u") == {"nodes": {"1": {"content": "secret words"}}}
+
+
+def test_idle_sessions_move_to_the_archive_and_restore_on_open(store):
+    store.append("old", "user", "from last year")
+    store.append("new", "user", "from today")
+    _age(store, "old", 60)
+
+    assert store.archive_idle(days=30) == 1
+    assert "old" not in store.load() and "old" in store.archive
+
+    assert [m["content"] for m in store.messages("old")] == ["from last year"]  # Restored transparently
+    assert "old" in store.load() and "old" not in store.archive
+    assert b"from last year" not in _segment_text(store.archive)  # Not duplicated in its old segment
+
+
+def test_deleting_an_archived_session_erases_its_bytes(store):
+    for sid in ("a", "b"):
+        store.append(sid, "user", f"secret of {sid}")
+        _age(store, sid, 60)
+    store.archive_idle(days=30)
+
+    assert store.delete("a")
+    assert "a" not in store.archive
+    text = _segment_text(store.archive)
+    assert b"secret of a" not in text and b"secret of b" in text
+
+    assert store.delete("b")
+    assert list(store.archive.archive_dir.glob("sessions-*")) == []  # Empty segments are removed
+
+
+def test_clear_archive_drops_everything_and_reports_sessions(store):
+    store.append("a", "user", "hello")
+    _age(store, "a", 60)
+    store.archive_idle(days=30)
+    changed = []
+    store.on_change.append(changed.append)
+
+    store.clear_archive()
+
+    assert changed == ["a"]
+    assert "a" not in store.archive
+    assert list(store.archive.archive_dir.glob("sessions-*")) == []
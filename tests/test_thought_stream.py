@@ -0,0 +1,86 @@
+"""ThoughtStream segments, sidecar index and retention (user-031)."""
+
+import json
+import threading
+import time
+
+from core.unified_memory import THOUGHT_INDEX_ENTRY, ThoughtStream
+
+
+def _index_matches_segment(stream, date_str):
+    """Every index record points at the start of the line holding its thought."""
+    segment, index = stream._segment_paths(date_str)
+    data, raw = segment.read_bytes(), index.read_bytes()
+    entries = [THOUGHT_INDEX_ENTRY.unpack_from(raw, i) for i in range(0, len(raw), THOUGHT_INDEX_ENTRY.size)]
+    assert len(entries) == data.count(b"\n")
+    for ts, offset in entries:
+        assert offset == 0 or data[offset - 1:offset] == b"\n"
+        assert json.loads(data[offset:data.index(b"\n", offset)])["timestamp"] == ts
+
+
+def test_concurrent_thinkers_keep_index_and_order(tmp_path):
+    stream = ThoughtStream(tmp_path)
+    stream.buffer_size = 3
+
+    def think(worker):
+        for i in range(50):
+            stream.think(f"worker {worker} thought {i}")
+
+    threads = [threading.Thread(target=think, args=(w,)) for w in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    thoughts = stream.query()
+    assert len(thoughts) == 300
+    assert [t["timestamp"] for t in thoughts] == sorted(t["timestamp"] for t in thoughts)
+    _index_matches_segment(stream, stream.current_date)
+
+
+def test_query_seeks_to_start_and_survives_reopen(tmp_path):
+    stream = ThoughtStream(tmp_path)
+    for i in range(30):
+        stream.think(f"thought {i}", category="memory" if i % 2 else "reflection", importance=i % 10)
+    middle = stream.query()[15]["timestamp"]
+
+    reopened = ThoughtStream(tmp_path)
+    assert [t["content"] for t in reopened.query(start=middle)] == [f"thought {i}" for i in range(15, 30)]
+    assert all(t["category"] == "memory" for t in reopened.query(category="memory"))
+    assert [t["content"] for t in reopened.tail(3)] == ["thought 27", "thought 28", "thought 29"]
+
+
+def test_truncated_index_is_rebuilt(tmp_path):
+    stream = ThoughtStream(tmp_path)
+    for i in range(12):
+        stream.think(f"thought {i}")
+    stream._flush_buffer()
+    _, index = stream._segment_paths(stream.current_date)
+    index.write_bytes(index.read_bytes()[:THOUGHT_INDEX_ENTRY.size * 4])  # Crash between segment and index write
+
+    reopened = ThoughtStream(tmp_path)
+    _index_matches_segment(reopened, reopened.current_date)
+    assert len(reopened.query()) == 12
+
+
+def _old_segment(tmp_path, date_str="2020-01-01"):
+    ts = time.mktime(time.strptime(date_str, "%Y-%m-%d")) + 3600
+    thought = {"timestamp": ts, "content": "long ago", "category": "memory", "related_files": [],
+               "related_memories": [], "emotion": "calm", "importance": 8}
+    (tmp_path / f"aiko_thoughts_{date_str}.jsonl").write_text(json.dumps(thought) + "\n", encoding="utf-8")
+
+
+def test_retention_zero_keeps_everything(tmp_path):
+    _old_segment(tmp_path)
+    ThoughtStream(tmp_path, retention_days=0)
+    assert (tmp_path / "aiko_thoughts_2020-01-01.jsonl").exists()
+    assert not (tmp_path / "thought_rollup.json").exists()
+
+
+def test_expired_days_are_rolled_up(tmp_path):
+    _old_segment(tmp_path)
+    ThoughtStream(tmp_path, retention_days=30)
+    assert not (tmp_path / "aiko_thoughts_2020-01-01.jsonl").exists()
+    day = json.loads((tmp_path / "thought_rollup.json").read_text(encoding="utf-8"))["2020-01-01"]
+    assert day["count"] == 1
+    assert day["highlights"][0]["content"] == "long ago"
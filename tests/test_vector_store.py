@@ -0,0 +1,98 @@
+"""LocalVectorStore persistence, crash recovery and compaction (user-030)."""
+
+import hashlib
+import threading
+
+import numpy as np
+
+import core.vector_store as vector_store
+from core.vector_store import LocalVectorStore
+
+
+class HashEmbedder:
+    """Deterministic embeddings: identical texts map to identical vectors."""
+    name = "hash-test"
+
+    def embed(self, texts):
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest()[:16], dtype=np.uint8).astype(np.float32) + 1
+                for t in texts]
+
+
+def _fill(store, start, stop):
+    store.add([f"text {i}" for i in range(start, stop)], [{"i": i} for i in range(start, stop)],
+              ids=[f"id{i}" for i in range(start, stop)])
+
+
+def test_rows_survive_reopen(tmp_path):
+    store = LocalVectorStore(HashEmbedder(), tmp_path)
+    _fill(store, 0, 20)
+    store.delete(ids=["id3"])
+    store.add(["text 5 again"], [{"i": 5}], ids=["id5"])  # Re-using an id supersedes the old row
+
+    reopened = LocalVectorStore(HashEmbedder(), tmp_path)
+    assert reopened.count() == 19
+    assert reopened.query("text 3", 1)[0]["text"] != "text 3"
+    assert reopened.query("text 5 again", 1)[0]["text"] == "text 5 again"
+    assert reopened.query("text 7", 1, where={"i": 7})[0]["text"] == "text 7"
+
+
+def test_orphan_vectors_from_an_interrupted_add_are_dropped(tmp_path):
+    store = LocalVectorStore(HashEmbedder(), tmp_path)
+    _fill(store, 0, 5)
+    with open(store.vectors_path, "ab") as f:  # Vectors written, records never were
+        f.write(np.zeros((3, store.dim), dtype="<f2").tobytes())
+
+    reopened = LocalVectorStore(HashEmbedder(), tmp_path)
+    assert reopened.count() == 5
+    assert reopened.vectors_path.stat().st_size == 5 * reopened.dim * 2
+    _fill(reopened, 5, 7)
+    assert reopened.query("text 6", 1)[0]["text"] == "text 6"
+
+
+def test_compaction_runs_once_tombstones_pile_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "COMPACT_MIN_DEAD", 10)
+    store = LocalVectorStore(HashEmbedder(), tmp_path)
+    _fill(store, 0, 40)
+    store.delete(ids=[f"id{i}" for i in range(0, 40, 2)])
+
+    assert len(store.ids) == store.count() == 20  # Rewritten without the dead rows
+    assert store.vectors_path.stat().st_size == 20 * store.dim * 2
+    assert store.query("text 9", 1)[0]["text"] == "text 9"
+    assert LocalVectorStore(HashEmbedder(), tmp_path).count() == 20
+
+
+def test_update_meta_is_persisted(tmp_path):
+    store = LocalVectorStore(HashEmbedder(), tmp_path)
+    _fill(store, 0, 3)
+    assert store.update_meta(["id1", "missing"], {"seen_count": 2}) == 1
+
+    reopened = LocalVectorStore(HashEmbedder(), tmp_path)
+    assert reopened.count() == 3
+    assert reopened.query("text 1", 1)[0]["meta"]["seen_count"] == 2
+
+
+def test_queries_stay_consistent_during_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "COMPACT_MIN_DEAD", 5)
+    store = LocalVectorStore(HashEmbedder(), tmp_path)
+    _fill(store, 0, 60)
+    mismatches = []
+
+    def search():
+        for _ in range(200):
+            for hit in store.query("text 7", 3):
+                if hit["text"] != f"text {hit['meta']['i']}":
+                    mismatches.append(hit)
+
+    def churn():
+        for i in range(0, 60, 2):
+            store.delete(ids=[f"id{i}"])
+        _fill(store, 60, 90)
+
+    threads = [threading.Thread(target=search) for _ in range(3)] + [threading.Thread(target=churn)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert mismatches == []
+    assert store.count() == 60